@@ -1,12 +1,27 @@
 import os
 import pytz
-from flask import url_for, redirect, flash, render_template
+from flask import url_for, redirect, flash, render_template, request
 from flask_login import current_user
 from flask_admin import Admin, AdminIndexView, expose
 from flask_admin.contrib.sqla import ModelView
 from markupsafe import Markup
 
 from models import User, MataKuliah, AttendanceRecord, db
+from storage import get_storage
+from thumbnails import image_url, thumbnail_url
+from pagination import decode_cursor, keyset_condition
+
+def evidence_image_urls(image_path):
+    """
+    Mengembalikan (url_thumbnail, url_gambar_penuh) untuk foto bukti presensi.
+    Foto di S3 disajikan sebagai thumbnail lewat presigned URL yang di-cache (tag <img> jatuh ke
+    gambar penuh lewat onerror jika thumbnail belum ada);
+    foto lama di folder static tetap memakai url_for('static').
+    """
+    if get_storage().key_from_url(image_path) is not None:
+        return thumbnail_url(image_path), image_url(image_path)
+    static_url = url_for('static', filename=image_path)
+    return static_url, static_url
 
 class MyAdminIndexView(AdminIndexView):
     @expose('/')
@@ -18,8 +33,15 @@ class MyAdminIndexView(AdminIndexView):
         wib = pytz.timezone('Asia/Jakarta')
         for record in recent_records:
             record.local_time = record.timestamp.replace(tzinfo=pytz.utc).astimezone(wib)
+            if record.image_path:
+                record.thumbnail_src, record.image_src = evidence_image_urls(record.image_path)
 
-        return self.render('admin/index.html', recent_records=recent_records)
+        # Ringkasan dari tabel agregat: waktu muat tetap walau tabel presensi terus bertambah
+        from attendance_stats import dashboard_summary
+        # Pilihan Parquet hanya ditampilkan jika pyarrow terpasang di server ini
+        from attendance_export import parquet_available
+        return self.render('admin/index.html', recent_records=recent_records, summary=dashboard_summary(),
+                           parquet_available=parquet_available())
 
     def is_accessible(self):
         return current_user.is_authenticated and current_user.is_admin
@@ -34,6 +56,18 @@ class AttendanceAdminView(ModelView):
     can_edit = False
     can_delete = True
     page_size = 50
+    # Keyset pagination: tanpa COUNT(*) dan OFFSET; halaman berikutnya lewat ?cursor=<timestamp>_<id>
+    simple_list_pager = True
+    column_default_sort = [('timestamp', True), ('id', True)]
+    list_template = 'admin/attendance_list.html'
+
+    def get_query(self):
+        query = super().get_query()
+        cursor = decode_cursor(request.args.get('cursor'))
+        # Cursor hanya berlaku untuk urutan default (terbaru dulu)
+        if cursor is not None and request.args.get('sort') is None:
+            query = query.filter(keyset_condition(AttendanceRecord.timestamp, AttendanceRecord.id, cursor))
+        return query
     column_list = ['user', 'matakuliah', 'timestamp', 'location', 'image_path']
     column_labels = {'user': 'Nama Mahasiswa', 'matakuliah': 'Mata Kuliah', 'timestamp': 'Waktu Presensi (UTC)', 'location': 'Lokasi (Peta)', 'image_path': 'Bukti Foto'}
 
@@ -45,7 +79,8 @@ class AttendanceAdminView(ModelView):
 
     def _list_thumbnail(self, context, model, name):
         if not model.image_path: return ''
-        return Markup(f'<img src="{url_for("static", filename=model.image_path)}" width="100" class="img-thumbnail">')
+        thumbnail_src, image_src = evidence_image_urls(model.image_path)
+        return Markup(f'<a href="{image_src}" target="_blank"><img src="{thumbnail_src}" width="100" class="img-thumbnail" loading="lazy" onerror="this.onerror=null; this.src=this.parentNode.href"></a>')
 
     column_formatters = {'image_path': _list_thumbnail, 'location': _location_formatter}
     
@@ -22,6 +22,27 @@ app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL')
 # Nonaktifkan pelacakan modifikasi SQLAlchemy yang tidak perlu (menghemat memori)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# --- Connection pool database (bisa diubah lewat environment variable) ---
+# Nilai per proses worker; total koneksi = jumlah worker x (DB_POOL_SIZE + DB_MAX_OVERFLOW),
+# sesuaikan dengan max_connections di RDS.
+# DB_POOL_SIZE: jumlah koneksi yang dipertahankan di pool
+# DB_MAX_OVERFLOW: koneksi tambahan sementara saat lonjakan (misalnya awal kelas)
+# DB_POOL_TIMEOUT: batas waktu (detik) menunggu koneksi bebas dari pool
+# DB_POOL_RECYCLE: koneksi yang lebih tua dari ini (detik) dibuka ulang (-1 = tidak pernah)
+# DB_POOL_PRE_PING: '1' = cek koneksi sebelum dipakai (aman setelah failover/idle timeout RDS)
+engine_options = {
+    'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') == '1',
+    'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', '1800')),
+}
+# SQLite (pengujian lokal, benchmark) memakai pool bawaan yang tidak menerima opsi ukuran
+if not (app.config['SQLALCHEMY_DATABASE_URI'] or '').startswith('sqlite'):
+    engine_options.update({
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', '10')),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', '20')),
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', '10')),
+    })
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
+
 # Konfigurasi S3 untuk penyimpanan gambar wajah
 # Pastikan ENVIRONMENT VARIABLES ini juga diset di EC2
 app.config['S3_BUCKET_NAME'] = os.environ.get('S3_BUCKET_NAME')
@@ -51,10 +72,55 @@ app.register_blueprint(main_blueprint)
 from models import User, Student, Course, Attendance, FaceData # Pastikan ini diimport
 
 # Tambahan: handler untuk user_loader Flask-Login
-@login_manager.user_loader
-def load_user(user_id):
-    # Asumsi User adalah model yang merepresentasikan user untuk login
-    return User.query.get(int(user_id))
+# Data ringkas pengguna di-cache per proses agar request yang login tidak selalu query ke DB (user_cache.py)
+from user_cache import load_user
+login_manager.user_loader(load_user)
+
+# --- Persiapan per proses worker (bisa diubah lewat environment variable) ---
+# Dipanggil dari post_fork gunicorn (gunicorn.conf.py) dan saat server development dijalankan,
+# sehingga presensi pertama di setiap worker tidak menunggu galeri wajah dimuat maupun
+# worker pool pengenalan di-spawn dan memuat model dlib. Worker antrean unggah juga langsung
+# dinyalakan (jika UPLOAD_QUEUE_WORKER) agar unggahan yang tertinggal saat restart ikut dikuras.
+# Persiapan berjalan di thread latar agar worker tetap mengirim heartbeat ke master gunicorn;
+# request yang datang lebih dulu menunggu pemuatan yang sama, bukan memulai yang baru.
+# WORKER_WARM_UP: '1' = siapkan galeri dan pool pengenalan saat worker start, '0' = saat presensi pertama
+WORKER_WARM_UP = os.environ.get('WORKER_WARM_UP', '1') == '1'
+
+def _warm_up_worker():
+    from face_gallery import get_gallery
+    from recognition_pool import recognition_pool
+    with app.app_context():
+        try:
+            get_gallery()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Gagal memuat galeri wajah saat startup: {e}")
+        finally:
+            db.session.remove()
+    try:
+        recognition_pool.start()
+    except Exception as e:
+        print(f"Gagal menyiapkan pool pengenalan wajah saat startup: {e}")
+
+def start_worker_services():
+    """
+    Menyalakan penulisan snapshot metrik (METRICS_DIR) dan worker antrean unggah, lalu di thread latar memuat galeri wajah proses ini
+    (dan memulai sinkronisasinya) dan menyalakan semua worker pool pengenalan (pre-warm,
+    lihat RecognitionPool.start).
+    """
+    from metrics import start_metrics_flush
+    from upload_queue import UPLOAD_QUEUE_WORKER, upload_worker
+    start_metrics_flush()
+    if UPLOAD_QUEUE_WORKER:
+        # Unggahan 'pending' atau 'in_progress' yang lease-nya habis sebelum restart diambil
+        # pada putaran pertama worker, tanpa menunggu presensi baru membangunkannya
+        upload_worker.start()
+    if not WORKER_WARM_UP:
+        return None
+    import threading
+    thread = threading.Thread(target=_warm_up_worker, name='worker-warm-up', daemon=True)
+    thread.start()
+    return thread
 
 # Anda mungkin perlu menambahkan rute atau error handler di sini jika ada
 # Contoh:
@@ -68,4 +134,7 @@ if __name__ == '__main__':
     with app.app_context():
         # db.create_all() # <-- Komentari atau hapus ini jika Anda menggunakan Flask-Migrate
         pass # Gunakan 'flask db upgrade' untuk membuat/mengupdate tabel
+    # Dengan debug=True, reloader menjalankan aplikasi di proses anak; hanya proses itu yang melayani request
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_worker_services()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
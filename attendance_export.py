@@ -0,0 +1,209 @@
+import argparse
+import csv
+import io
+import os
+import sys
+from datetime import datetime, time, timedelta
+import numpy as np
+import pytz
+from sqlalchemy import select
+
+from app import db
+from models import Attendance, Course, Student
+
+# --- Ekspor Presensi (bisa diubah lewat environment variable) ---
+# Ekspor membaca tabel Attendance lewat server-side cursor per batch dan langsung menulis
+# hasilnya (CSV atau Parquet), sehingga memori tetap datar berapa pun jumlah barisnya.
+# ATTENDANCE_EXPORT_BATCH_SIZE: jumlah baris yang diambil dari database per batch
+ATTENDANCE_EXPORT_BATCH_SIZE = int(os.environ.get('ATTENDANCE_EXPORT_BATCH_SIZE', '5000'))
+
+WIB = pytz.timezone('Asia/Jakarta')
+# WIB tidak mengenal daylight saving, jadi konversi UTC -> WIB cukup satu penjumlahan per batch
+WIB_OFFSET = np.timedelta64(7, 'h')
+
+EXPORT_COLUMNS = ['id', 'waktu_utc', 'waktu_wib', 'nim', 'nama', 'kode_mk', 'mata_kuliah',
+                  'status', 'latitude', 'longitude', 'foto']
+
+class ExportError(ValueError):
+    pass
+
+def wib_day_bounds(start_date=None, end_date=None):
+    """
+    Batas [awal, akhir) dalam UTC naive (sesuai kolom Attendance.timestamp) untuk rentang tanggal WIB inklusif.
+    """
+    def start_of(date):
+        return WIB.localize(datetime.combine(date, time.min)).astimezone(pytz.utc).replace(tzinfo=None)
+    return (start_of(start_date) if start_date else None,
+            start_of(end_date + timedelta(days=1)) if end_date else None)
+
+def export_statement(course_code=None, nim=None, start_date=None, end_date=None):
+    """
+    SELECT kolom ekspor dengan join ke Student dan Course dalam satu query (tanpa lazy load per baris),
+    diurutkan (timestamp, id) agar hasilnya stabil.
+    """
+    statement = (select(Attendance.id, Attendance.timestamp, Student.student_id, Student.name,
+                        Course.code, Course.name, Attendance.status, Attendance.latitude,
+                        Attendance.longitude, Attendance.face_image_s3_url)
+                 .join(Student, Attendance.student_id == Student.id)
+                 .join(Course, Attendance.course_id == Course.id))
+    if course_code:
+        course_id = db.session.execute(select(Course.id).where(Course.code == course_code)).scalar()
+        if course_id is None:
+            raise ExportError(f"Mata kuliah dengan kode '{course_code}' tidak ditemukan.")
+        statement = statement.where(Attendance.course_id == course_id)
+    if nim:
+        student_id = db.session.execute(select(Student.id).where(Student.student_id == nim)).scalar()
+        if student_id is None:
+            raise ExportError(f"Mahasiswa dengan NIM '{nim}' tidak ditemukan.")
+        statement = statement.where(Attendance.student_id == student_id)
+    start, end = wib_day_bounds(start_date, end_date)
+    if start is not None:
+        statement = statement.where(Attendance.timestamp >= start)
+    if end is not None:
+        statement = statement.where(Attendance.timestamp < end)
+    return statement.order_by(Attendance.timestamp, Attendance.id)
+
+def iter_batches(statement, batch_size=ATTENDANCE_EXPORT_BATCH_SIZE):
+    """
+    Baris hasil query per batch lewat server-side cursor (stream_results), bukan .all().
+    """
+    result = db.session.execute(statement.execution_options(stream_results=True, yield_per=batch_size))
+    for rows in result.partitions(batch_size):
+        yield rows
+
+def batch_columns(rows):
+    """
+    Mengubah satu batch baris menjadi kolom; waktu WIB dihitung sekaligus untuk seluruh batch.
+    """
+    columns = dict(zip(['id', 'timestamp', 'nim', 'nama', 'kode_mk', 'mata_kuliah', 'status',
+                        'latitude', 'longitude', 'foto'], zip(*rows)))
+    utc = np.array(columns.pop('timestamp'), dtype='datetime64[us]')
+    columns['waktu_utc'] = utc
+    columns['waktu_wib'] = utc + WIB_OFFSET
+    return columns
+
+def _timestamp_strings(values):
+    text = np.datetime_as_string(values, unit='s')
+    return np.where(np.isnat(values), '', np.char.replace(text, 'T', ' '))
+
+def iter_csv(statement, batch_size=ATTENDANCE_EXPORT_BATCH_SIZE):
+    """
+    Potongan teks CSV: header, lalu satu potongan per batch.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in iter_batches(statement, batch_size):
+        columns = batch_columns(rows)
+        columns['waktu_utc'] = _timestamp_strings(columns['waktu_utc'])
+        columns['waktu_wib'] = _timestamp_strings(columns['waktu_wib'])
+        writer.writerows(zip(*(columns[name] for name in EXPORT_COLUMNS)))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+class _StreamSink(io.RawIOBase):
+    """
+    File tujuan ParquetWriter yang menampung byte tertulis sampai diambil lewat drain().
+    tell() tetap menghitung total byte karena offset row group di footer Parquet bergantung padanya.
+    """
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def parquet_available():
+    try:
+        import pyarrow.parquet # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def iter_parquet(statement, batch_size=ATTENDANCE_EXPORT_BATCH_SIZE):
+    """
+    Potongan byte file Parquet: satu row group per batch (butuh paket pyarrow).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([('id', pa.int64()), ('waktu_utc', pa.timestamp('us')), ('waktu_wib', pa.timestamp('us')),
+                        ('nim', pa.string()), ('nama', pa.string()), ('kode_mk', pa.string()),
+                        ('mata_kuliah', pa.string()), ('status', pa.string()), ('latitude', pa.float64()),
+                        ('longitude', pa.float64()), ('foto', pa.string())])
+    sink = _StreamSink()
+    writer = pq.ParquetWriter(sink, schema)
+    for rows in iter_batches(statement, batch_size):
+        columns = batch_columns(rows)
+        writer.write_table(pa.table({name: columns[name] for name in EXPORT_COLUMNS}, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+EXPORT_FORMATS = {
+    # format -> (generator, mimetype, ekstensi)
+    'csv': (iter_csv, 'text/csv', 'csv'),
+    'parquet': (iter_parquet, 'application/vnd.apache.parquet', 'parquet'),
+}
+
+def export_filename(fmt, course_code=None, nim=None, start_date=None, end_date=None):
+    parts = ['presensi'] + [str(part) for part in (course_code, nim, start_date, end_date) if part]
+    return f"{'_'.join(parts)}.{EXPORT_FORMATS[fmt][2]}"
+
+def export_attendance(output, fmt='csv', course_code=None, nim=None, start_date=None, end_date=None,
+                      batch_size=ATTENDANCE_EXPORT_BATCH_SIZE):
+    """
+    Script command-line: menulis ekspor presensi ke file (atau '-' untuk stdout, khusus CSV).
+    """
+    from app import app
+    with app.app_context():
+        if fmt == 'parquet' and not parquet_available():
+            print("Ekspor Parquet membutuhkan paket pyarrow (pip install pyarrow).")
+            return
+        try:
+            statement = export_statement(course_code, nim, start_date, end_date)
+        except ExportError as e:
+            print(e)
+            return
+        output = output or export_filename(fmt, course_code, nim, start_date, end_date)
+        generator = EXPORT_FORMATS[fmt][0]
+        if output == '-' and fmt == 'csv':
+            for chunk in generator(statement, batch_size):
+                sys.stdout.write(chunk)
+            return
+        mode, encoding = ('w', 'utf-8') if fmt == 'csv' else ('wb', None)
+        with open(output, mode, encoding=encoding, newline='' if fmt == 'csv' else None) as f:
+            for chunk in generator(statement, batch_size):
+                f.write(chunk)
+        print(f"Ekspor presensi ditulis ke {output}.")
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Ekspor presensi ke CSV/Parquet secara streaming.")
+    parser.add_argument('--course', help="Kode mata kuliah")
+    parser.add_argument('--nim', help="NIM mahasiswa")
+    parser.add_argument('--start', type=parse_date, help="Tanggal awal (WIB), YYYY-MM-DD")
+    parser.add_argument('--end', type=parse_date, help="Tanggal akhir (WIB, inklusif), YYYY-MM-DD")
+    parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+    parser.add_argument('--output', help="File tujuan ('-' = stdout); default dari filter yang dipakai")
+    parser.add_argument('--batch-size', type=int, default=ATTENDANCE_EXPORT_BATCH_SIZE)
+    args = parser.parse_args()
+    export_attendance(args.output, args.format, args.course, args.nim, args.start, args.end, args.batch_size)
@@ -0,0 +1,171 @@
+from collections import Counter
+from datetime import datetime, timedelta
+import pytz
+from sqlalchemy import case, event, func, insert, update
+
+from app import db
+from models import Attendance, Course, Student, CourseDailyAttendance, StudentCourseAttendance
+
+WIB = pytz.timezone('Asia/Jakarta')
+
+def attendance_date(timestamp):
+    """
+    Tanggal WIB dari Attendance.timestamp (UTC naive).
+    """
+    return timestamp.replace(tzinfo=pytz.utc).astimezone(WIB).date()
+
+def today_wib():
+    return datetime.now(WIB).date()
+
+
+# --- Pembaruan agregat di transaksi yang sama dengan insert/delete Attendance ---
+def _upsert_increment(connection, table, keys, delta, latest=None):
+    """
+    INSERT baris agregat dengan count=delta, atau tambahkan delta jika baris sudah ada.
+    Kolom di 'latest' hanya diganti jika nilai baru lebih besar (misalnya waktu presensi terakhir).
+    Memakai upsert bawaan database agar aman dari presensi bersamaan untuk kunci yang sama.
+    """
+    latest = latest or {}
+    values = dict(keys, count=delta, **latest)
+    changes = {'count': table.c.count + delta}
+    for name, value in latest.items():
+        changes[name] = case((table.c[name] > value, table.c[name]), else_=value)
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect in ('mysql', 'mariadb'):
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+        connection.execute(dialect_insert(table).values(**values).on_duplicate_key_update(**changes))
+        return
+    else:
+        # Database lain: UPDATE dulu, INSERT jika belum ada baris
+        conditions = [table.c[name] == value for name, value in keys.items()]
+        if connection.execute(update(table).where(*conditions).values(**changes)).rowcount == 0:
+            connection.execute(insert(table).values(**values))
+        return
+    connection.execute(dialect_insert(table).values(**values)
+                       .on_conflict_do_update(index_elements=list(keys), set_=changes))
+
+def _decrement(connection, table, keys):
+    conditions = [table.c[name] == value for name, value in keys.items()]
+    connection.execute(update(table).where(*conditions).values(count=table.c.count - 1))
+
+@event.listens_for(Attendance, 'after_insert')
+def _count_new_attendance(mapper, connection, target):
+    timestamp = target.timestamp or datetime.utcnow()
+    _upsert_increment(connection, CourseDailyAttendance.__table__,
+                      {'course_id': target.course_id, 'attendance_date': attendance_date(timestamp)}, 1)
+    _upsert_increment(connection, StudentCourseAttendance.__table__,
+                      {'student_id': target.student_id, 'course_id': target.course_id}, 1,
+                      latest={'last_attended_at': timestamp})
+
+@event.listens_for(Attendance, 'after_delete')
+def _uncount_deleted_attendance(mapper, connection, target):
+    _decrement(connection, CourseDailyAttendance.__table__,
+               {'course_id': target.course_id, 'attendance_date': attendance_date(target.timestamp)})
+    _decrement(connection, StudentCourseAttendance.__table__,
+               {'student_id': target.student_id, 'course_id': target.course_id})
+
+
+# --- Query ringkasan (hanya membaca tabel agregat) ---
+def course_counts_for_date(date):
+    """
+    Jumlah presensi per mata kuliah pada satu tanggal WIB.
+    """
+    rows = (db.session.query(Course.id, Course.code, Course.name, CourseDailyAttendance.count)
+            .join(CourseDailyAttendance, CourseDailyAttendance.course_id == Course.id)
+            .filter(CourseDailyAttendance.attendance_date == date, CourseDailyAttendance.count > 0)
+            .order_by(CourseDailyAttendance.count.desc())
+            .all())
+    return [{'course_id': id_, 'code': code, 'name': name, 'count': count} for id_, code, name, count in rows]
+
+def daily_totals(start_date, end_date, course_id=None):
+    """
+    Total presensi per tanggal WIB dalam rentang [start_date, end_date], opsional untuk satu mata kuliah.
+    """
+    query = (db.session.query(CourseDailyAttendance.attendance_date, func.sum(CourseDailyAttendance.count))
+             .filter(CourseDailyAttendance.attendance_date.between(start_date, end_date)))
+    if course_id is not None:
+        query = query.filter(CourseDailyAttendance.course_id == course_id)
+    totals = dict(query.group_by(CourseDailyAttendance.attendance_date).all())
+    days = (end_date - start_date).days + 1
+    return [{'date': (start_date + timedelta(days=i)).isoformat(),
+             'count': int(totals.get(start_date + timedelta(days=i), 0))} for i in range(days)]
+
+def student_attendance_rates(course_id):
+    """
+    Jumlah dan persentase kehadiran setiap mahasiswa di satu mata kuliah.
+    Jumlah pertemuan = jumlah hari dengan minimal satu presensi di mata kuliah tersebut.
+    """
+    meetings = CourseDailyAttendance.query.filter(CourseDailyAttendance.course_id == course_id,
+                                                  CourseDailyAttendance.count > 0).count()
+    rows = (db.session.query(Student.id, Student.student_id, Student.name,
+                             StudentCourseAttendance.count, StudentCourseAttendance.last_attended_at)
+            .join(StudentCourseAttendance, StudentCourseAttendance.student_id == Student.id)
+            .filter(StudentCourseAttendance.course_id == course_id, StudentCourseAttendance.count > 0)
+            .order_by(Student.student_id)
+            .all())
+    return {
+        'course_id': course_id,
+        'meetings': meetings,
+        'students': [{
+            'id': id_, 'nim': nim, 'name': name, 'count': count,
+            'rate': round(count / meetings, 4) if meetings else 0.0,
+            'last_attended_at': last_attended_at.isoformat() if last_attended_at else None,
+        } for id_, nim, name, count, last_attended_at in rows],
+    }
+
+def dashboard_summary(days=7):
+    """
+    Ringkasan untuk dashboard admin: presensi hari ini (total dan per mata kuliah) dan tren beberapa hari terakhir.
+    """
+    today = today_wib()
+    per_course = course_counts_for_date(today)
+    return {
+        'date': today.isoformat(),
+        'today_total': sum(row['count'] for row in per_course),
+        'today_per_course': per_course,
+        'recent_days': daily_totals(today - timedelta(days=days - 1), today),
+    }
+
+
+def rebuild_attendance_stats(batch_size=10000):
+    """
+    Script command-line: menghitung ulang seluruh tabel agregat dari tabel Attendance
+    (untuk backfill pertama kali atau setelah perubahan data manual).
+    """
+    from app import app
+    with app.app_context():
+        course_daily, student_course, last_attended = Counter(), Counter(), {}
+        rows = (db.session.query(Attendance.student_id, Attendance.course_id, Attendance.timestamp)
+                .execution_options(yield_per=batch_size))
+        for index, (student_id, course_id, timestamp) in enumerate(rows, start=1):
+            course_daily[(course_id, attendance_date(timestamp))] += 1
+            student_course[(student_id, course_id)] += 1
+            if timestamp > last_attended.get((student_id, course_id), timestamp.min):
+                last_attended[(student_id, course_id)] = timestamp
+            if index % batch_size == 0:
+                print(f"{index} baris presensi dibaca...")
+
+        # Ganti isi tabel agregat dalam satu transaksi
+        CourseDailyAttendance.query.delete()
+        StudentCourseAttendance.query.delete()
+        if course_daily:
+            db.session.execute(insert(CourseDailyAttendance.__table__), [
+                {'course_id': course_id, 'attendance_date': date, 'count': count}
+                for (course_id, date), count in course_daily.items()
+            ])
+        if student_course:
+            db.session.execute(insert(StudentCourseAttendance.__table__), [
+                {'student_id': student_id, 'course_id': course_id, 'count': count,
+                 'last_attended_at': last_attended[(student_id, course_id)]}
+                for (student_id, course_id), count in student_course.items()
+            ])
+        db.session.commit()
+        print(f"Selesai: {len(course_daily)} baris per mata kuliah per hari, "
+              f"{len(student_course)} baris per mahasiswa per mata kuliah.")
+
+if __name__ == '__main__':
+    rebuild_attendance_stats()
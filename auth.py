@@ -6,6 +6,12 @@ import os
 
 auth = Blueprint('auth', __name__)
 
+def find_user(name):
+    """
+    Mencari akun berdasarkan nama login lewat kolom User.username (unik, sehingga ter-index).
+    """
+    return User.query.filter(User.username == name).first()
+
 @auth.route('/login', methods=['GET', 'POST'])
 def login():
     # Jika pengguna sudah login, langsung arahkan ke halaman utama
@@ -16,9 +22,9 @@ def login():
         name = request.form.get('name')
         password = request.form.get('password')
         
-        user = User.query.filter_by(name=name).first()
+        user = find_user(name)
 
-        if not user or not check_password_hash(user.password, password):
+        if not user or not check_password_hash(user.password_hash, password):
             flash('Nama atau password salah. Silakan coba lagi.', 'danger')
             return redirect(url_for('auth.login'))
 
@@ -36,14 +42,14 @@ def signup():
         name = request.form.get('name')
         password = request.form.get('password')
 
-        user = User.query.filter_by(name=name).first()
+        user = find_user(name)
         if user:
             flash('Nama tersebut sudah terdaftar.', 'warning')
             return redirect(url_for('auth.signup'))
         
         new_user = User(
-            name=name,
-            password=generate_password_hash(password, method='pbkdf2:sha256'),
+            username=name,
+            password_hash=generate_password_hash(password, method='pbkdf2:sha256'),
             is_admin=False
         )
         db.session.add(new_user)
@@ -0,0 +1,53 @@
+from app import app, db
+from models import FaceData
+from face_utils import (download_bytes_from_s3, get_face_encoding, encoding_to_bytes,
+                        s3_key_from_url, FACE_ENCODING_FORMAT)
+import os
+import pickle
+
+BATCH_SIZE = 100 # Jumlah baris per commit
+
+def load_legacy_pickle(face_data_entry):
+    """
+    Mencari file .pkl lama yang dulu diunggah oleh save_face_encoding_file.
+    File tersebut disimpan di 'face_encodings/<nama file gambar tanpa ekstensi>.pkl'.
+    """
+    image_key = s3_key_from_url(face_data_entry.face_image_s3_url)
+    encoding_filename = f"{os.path.splitext(os.path.basename(image_key))[0]}.pkl"
+    buffer = download_bytes_from_s3(f"face_encodings/{encoding_filename}")
+    if buffer is None:
+        return None
+    return pickle.load(buffer)
+
+def backfill_face_encodings():
+    """
+    Script command-line untuk mengisi kolom FaceData.face_encoding dari pickle lama di S3.
+    Jika pickle tidak ditemukan, encoding dihitung ulang dari gambar wajah di S3.
+    """
+    with app.app_context():
+        pending = FaceData.query.filter(FaceData.face_encoding.is_(None)).order_by(FaceData.id).all()
+        print(f"--- Backfill encoding wajah: {len(pending)} baris ---")
+
+        converted, failed = 0, []
+        for index, face_data_entry in enumerate(pending, start=1):
+            encoding = load_legacy_pickle(face_data_entry)
+            if encoding is None:
+                encoding = get_face_encoding(face_data_entry.face_image_s3_url)
+            if encoding is None:
+                failed.append(face_data_entry.id)
+                continue
+
+            face_data_entry.face_encoding = encoding_to_bytes(encoding)
+            face_data_entry.face_encoding_format = FACE_ENCODING_FORMAT
+            converted += 1
+            if index % BATCH_SIZE == 0:
+                db.session.commit()
+                print(f"{index}/{len(pending)} baris diproses...")
+
+        db.session.commit()
+        print(f"\nSelesai: {converted} encoding disimpan ke database.")
+        if failed:
+            print(f"Gagal memproses {len(failed)} baris FaceData: {failed}")
+
+if __name__ == '__main__':
+    backfill_face_encodings()
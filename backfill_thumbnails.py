@@ -0,0 +1,52 @@
+from app import app, db
+from models import Attendance, FaceData, PendingUpload
+from storage import get_storage, StorageError
+from thumbnails import thumbnail_key, create_thumbnail
+
+BATCH_SIZE = 500 # Jumlah URL yang dibaca dari database per langkah
+
+def backfill_one(s3_object_key):
+    """
+    Membuat thumbnail untuk satu objek jika belum ada. Mengembalikan 'created', 'skipped', atau 'failed'.
+    """
+    storage = get_storage()
+    try:
+        if storage.exists(thumbnail_key(s3_object_key)):
+            return 'skipped'
+        image_bytes, _ = storage.get_bytes(s3_object_key)
+    except StorageError as e:
+        print(f"Gagal membaca '{s3_object_key}': {e}")
+        return 'failed'
+    return 'created' if create_thumbnail(s3_object_key, image_bytes, storage) else 'failed'
+
+def backfill_thumbnails():
+    """
+    Script command-line untuk membuat thumbnail foto wajah dan foto bukti presensi yang
+    diunggah sebelum pipeline thumbnail ada. Aman dijalankan ulang: thumbnail yang sudah
+    ada dilewati. Objek yang masih di antrean unggah dilewati (worker membuatkan thumbnailnya).
+    """
+    with app.app_context():
+        storage = get_storage()
+        pending_keys = {key for (key,) in db.session.query(PendingUpload.s3_key)}
+        counts = {'created': 0, 'skipped': 0, 'failed': 0}
+
+        for model in (Attendance, FaceData):
+            last_id = 0
+            while True:
+                rows = (db.session.query(model.id, model.face_image_s3_url)
+                        .filter(model.id > last_id, model.face_image_s3_url.isnot(None))
+                        .order_by(model.id).limit(BATCH_SIZE).all())
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                keys = [storage.key_from_url(url) for _, url in rows]
+                keys = [key for key in keys if key is not None and key not in pending_keys]
+                for result in storage.executor().map(backfill_one, keys):
+                    counts[result] += 1
+                print(f"{model.__tablename__}: sampai id {last_id}, {counts}")
+
+        print(f"\nSelesai: {counts['created']} thumbnail dibuat, {counts['skipped']} sudah ada, "
+              f"{counts['failed']} gagal.")
+
+if __name__ == '__main__':
+    backfill_thumbnails()
@@ -0,0 +1,6 @@
+# Benchmark offline untuk pipeline pengenalan wajah dan presensi.
+# Semua benchmark memakai SQLite dan penyimpanan lokal (pengganti S3) di folder sementara,
+# sehingga bisa dijalankan tanpa AWS dan hasilnya (JSON) bisa dibandingkan antar commit:
+#   python -m benchmarks.pipeline --images sampel_wajah/ --output hasil_pipeline.json
+#   python -m benchmarks.load --images sampel_wajah/ --concurrency 60 --output hasil_load.json
+#   python -m benchmarks.startup --baseline HEAD~1 --output hasil_startup.json
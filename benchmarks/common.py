@@ -0,0 +1,94 @@
+import os
+import sys
+import json
+import platform
+import subprocess
+import tempfile
+from datetime import datetime
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+def setup_environment(workdir=None, upload_worker=False, recognition_workers='0'):
+    """
+    Mengarahkan aplikasi ke SQLite dan penyimpanan lokal di folder sementara.
+    HARUS dipanggil sebelum mengimpor app/face_utils karena konfigurasi dibaca saat import.
+    """
+    workdir = workdir or tempfile.mkdtemp(prefix='hadirku-bench-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}?timeout=30"
+    os.environ['STORAGE_BACKEND'] = 'local'
+    os.environ['LOCAL_STORAGE_DIR'] = os.path.join(workdir, 'storage')
+    os.environ['STORAGE_CACHE_DIR'] = ''
+    os.environ['UPLOAD_QUEUE_WORKER'] = '1' if upload_worker else '0'
+    os.environ.setdefault('RECOGNITION_WORKERS', str(recognition_workers))
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    return workdir
+
+def create_tables():
+    from app import app, db
+    with app.app_context():
+        db.create_all()
+
+def summarize(samples, elapsed=None):
+    """
+    Ringkasan latensi (ms) dan throughput (operasi/detik) dari daftar durasi dalam detik.
+    elapsed = waktu dinding total jika operasi berjalan paralel.
+    """
+    if not samples:
+        return {'count': 0}
+    values = np.asarray(samples, dtype=np.float64) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    total = elapsed if elapsed is not None else values.sum() / 1000
+    return {
+        'count': len(values),
+        'mean_ms': round(float(values.mean()), 3),
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'max_ms': round(float(values.max()), 3),
+        'throughput_per_s': round(len(values) / total, 2) if total > 0 else None,
+    }
+
+def synthetic_encodings(count, seed=0):
+    """
+    Encoding acak float32 dengan sebaran mirip encoding dlib (norma sekitar 1).
+    """
+    rng = np.random.default_rng(seed)
+    return rng.normal(scale=0.09, size=(count, 128)).astype(np.float32)
+
+def load_sample_images(image_dir, limit=None):
+    """
+    Membaca bytes semua foto di folder (diurutkan menurut nama). Mengembalikan list (nama, bytes).
+    """
+    if not image_dir:
+        return []
+    names = sorted(name for name in os.listdir(image_dir) if name.lower().endswith(IMAGE_EXTENSIONS))[:limit]
+    images = []
+    for name in names:
+        with open(os.path.join(image_dir, name), 'rb') as f:
+            images.append((name, f.read()))
+    return images
+
+def run_metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'env': {key: value for key, value in os.environ.items()
+                if key.startswith(('FACE_', 'RECOGNITION_', 'STORAGE_', 'UPLOAD_QUEUE_'))},
+    }
+
+def write_results(path, results):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nHasil disimpan ke {path}")
@@ -0,0 +1,156 @@
+from benchmarks.common import (setup_environment, create_tables, summarize, load_sample_images,
+                               run_metadata, write_results)
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import base64
+import os
+import threading
+import time
+
+def prepare_students(images, courses):
+    """
+    Satu mahasiswa (dan akun login) per foto sampel, dengan encoding dari foto tersebut sebagai
+    data wajah terdaftar, plus beberapa mata kuliah agar setiap foto bisa presensi lebih dari sekali.
+    Mengembalikan (list (user_id, data_url), list course_id).
+    """
+    from app import app, db
+    from models import User, Student, Course, FaceData
+    from face_utils import decode_image, get_face_encoding, encoding_to_bytes, FACE_ENCODING_FORMAT
+
+    with app.app_context():
+        students = []
+        for index, (name, image_bytes) in enumerate(images):
+            encoding = get_face_encoding(decode_image(image_bytes))
+            if encoding is None:
+                print(f"Lewati {name}: wajah tidak terdeteksi.")
+                continue
+            nim = f"LOAD{index:05d}"
+            user = User(username=nim, password_hash='-')
+            student = Student(name=os.path.splitext(name)[0], student_id=nim)
+            db.session.add_all([user, student])
+            db.session.flush()
+            db.session.add(FaceData(student_id=student.id, face_image_s3_url=f"bench/faces/{name}",
+                                    face_encoding=encoding_to_bytes(encoding),
+                                    face_encoding_format=FACE_ENCODING_FORMAT))
+            data_url = 'data:image/jpeg;base64,' + base64.b64encode(image_bytes).decode('ascii')
+            students.append((user.id, data_url))
+        course_list = [Course(name=f"Beban {i}", code=f"LOAD-{i}") for i in range(courses)]
+        db.session.add_all(course_list)
+        db.session.commit()
+        return students, [course.id for course in course_list]
+
+def check_in(client, mode, image_data, course_id):
+    """
+    Satu presensi lewat HTTP (test client Flask). Mengembalikan (status akhir, durasi detik).
+    """
+    payload = {'image_data': image_data, 'matakuliah_id': course_id, 'location': {}}
+    start = time.perf_counter()
+    if mode == 'sync':
+        response = client.post('/mark_attendance', json=payload)
+        status = response.get_json().get('status') if response.is_json else str(response.status_code)
+        return (status if response.status_code < 500 else str(response.status_code)), time.perf_counter() - start
+
+    response = client.post('/attendance_jobs', json=payload)
+    if response.status_code != 202:
+        return str(response.status_code), time.perf_counter() - start
+    poll_url = response.get_json()['poll_url']
+    while True:
+        result = client.get(f"{poll_url}?wait=20").get_json()
+        if result.get('status') != 'pending':
+            return result.get('status'), time.perf_counter() - start
+
+class QueryCounter:
+    """
+    Menghitung statement SQL yang dikirim ke database selama lonjakan (semua thread).
+    """
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        with self._lock:
+            self.count += 1
+
+def run_load_benchmark(image_dir, requests=None, concurrency=60, mode='sync', courses=None, user_cache=True):
+    """
+    Mensimulasikan lonjakan presensi di awal kelas: `concurrency` klien mengirim presensi
+    bersamaan ke aplikasi Flask (pool pengenalan, galeri, DB SQLite, antrean unggah).
+    Jumlah query DB per presensi ikut dicatat; user_cache=False mematikan cache user_loader
+    sebagai pembanding.
+    """
+    if not user_cache:
+        os.environ['USER_CACHE_TTL'] = '0'
+    setup_environment(upload_worker=True, recognition_workers=str(os.cpu_count() or 1))
+    create_tables()
+    images = load_sample_images(image_dir)
+    if not images:
+        raise SystemExit("Benchmark beban membutuhkan --images berisi foto wajah.")
+
+    requests = requests or concurrency
+    courses = courses or max(1, -(-requests // len(images)))
+    students, course_ids = prepare_students(images, courses)
+    if not students:
+        raise SystemExit("Tidak ada foto sampel dengan wajah yang terdeteksi.")
+
+    from app import app, db
+    from sqlalchemy import event
+    from recognition_pool import recognition_pool
+    recognition_pool.start() # Pre-warm seperti di produksi; tidak ikut diukur
+    queries = QueryCounter()
+    with app.app_context():
+        engine = db.engine
+
+    local = threading.local() # Test client per thread per mahasiswa (test client tidak thread-safe)
+
+    def one_request(i):
+        user_id, image_data = students[i % len(students)]
+        clients = local.__dict__.setdefault('clients', {})
+        if user_id not in clients:
+            clients[user_id] = app.test_client()
+            with clients[user_id].session_transaction() as session:
+                session['_user_id'] = str(user_id)
+                session['_fresh'] = True
+        course_id = course_ids[(i // len(students)) % len(course_ids)]
+        return check_in(clients[user_id], mode, image_data, course_id)
+
+    print(f"--- Beban {mode}: {requests} presensi, {concurrency} klien bersamaan, "
+          f"{len(students)} mahasiswa, {len(course_ids)} mata kuliah ---")
+    event.listen(engine, 'before_cursor_execute', queries)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(one_request, range(requests)))
+    elapsed = time.perf_counter() - start
+    event.remove(engine, 'before_cursor_execute', queries)
+    recognition_pool.shutdown()
+
+    statuses = Counter(status for status, _ in outcomes)
+    latency = summarize([duration for _, duration in outcomes], elapsed=elapsed)
+    queries_per_check_in = round(queries.count / requests, 2)
+    print(f"Selesai dalam {elapsed:.2f} s: p50 {latency['p50_ms']} ms, p99 {latency['p99_ms']} ms, "
+          f"{queries_per_check_in} query DB per presensi, {dict(statuses)}")
+    return {
+        'meta': run_metadata(),
+        'config': {'mode': mode, 'requests': requests, 'concurrency': concurrency,
+                   'students': len(students), 'courses': len(course_ids),
+                   'recognition_workers': recognition_pool.workers, 'user_cache': user_cache},
+        'elapsed_s': round(elapsed, 3),
+        'latency': latency,
+        'db_queries': queries.count,
+        'db_queries_per_check_in': queries_per_check_in,
+        'statuses': dict(statuses),
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Simulasi lonjakan presensi di awal kelas terhadap aplikasi Flask.")
+    parser.add_argument('--images', required=True, help="Folder foto wajah sampel (satu mahasiswa per foto)")
+    parser.add_argument('--requests', type=int, help="Jumlah presensi total (default: sama dengan --concurrency)")
+    parser.add_argument('--concurrency', type=int, default=60, help="Jumlah klien bersamaan")
+    parser.add_argument('--mode', choices=['sync', 'jobs'], default='sync',
+                        help="sync = /mark_attendance, jobs = /attendance_jobs + long-poll")
+    parser.add_argument('--no-user-cache', action='store_true',
+                        help="Matikan cache user_loader (pembanding jumlah query DB per presensi)")
+    parser.add_argument('--output', default='benchmark_load.json', help="File JSON hasil")
+    args = parser.parse_args()
+    write_results(args.output, run_load_benchmark(args.images, args.requests, args.concurrency, args.mode,
+                                                  user_cache=not args.no_user_cache))
@@ -0,0 +1,192 @@
+from benchmarks.common import (setup_environment, create_tables, summarize, synthetic_encodings,
+                               load_sample_images, run_metadata, write_results)
+import argparse
+import pickle
+import time
+import uuid
+
+import numpy as np
+
+def timed(function, items):
+    """
+    Menjalankan function untuk setiap item dan mengembalikan (durasi per item, hasil).
+    """
+    samples, results = [], []
+    for item in items:
+        start = time.perf_counter()
+        results.append(function(item))
+        samples.append(time.perf_counter() - start)
+    return samples, results
+
+
+def bench_image_stages(images, repeat):
+    """
+    Decode, deteksi, encoding, dan get_face_encoding lengkap pada foto sampel.
+    """
+    from face_utils import decode_image, detect_largest_face, encode_face, get_face_encoding
+
+    image_bytes = [data for _, data in images] * repeat
+    decode_samples, decoded = timed(decode_image, image_bytes)
+    decoded = [image for image in decoded if image is not None]
+    detect_samples, locations = timed(detect_largest_face, decoded)
+    with_face = [(image, location) for image, location in zip(decoded, locations) if location is not None]
+    encode_samples, _ = timed(lambda pair: encode_face(*pair), with_face)
+    full_samples, _ = timed(get_face_encoding, decoded)
+    return {
+        'decode': summarize(decode_samples),
+        'detect': summarize(detect_samples),
+        'encode': summarize(encode_samples),
+        'get_face_encoding': summarize(full_samples),
+        'faces_found': len(with_face),
+        'images': len(decoded),
+    }
+
+def bench_match(sizes, backends, queries, classroom_faces):
+    """
+    Pencocokan satu wajah (FaceGallery.match) dan satu frame kelas (match_many) pada galeri sintetis.
+    """
+    from face_gallery import FaceGallery
+
+    results = {}
+    rng = np.random.default_rng(1)
+    for size in sizes:
+        encodings = synthetic_encodings(size, seed=size)
+        probe_rows = rng.integers(0, size, queries)
+        probes = encodings[probe_rows] + rng.normal(scale=0.01, size=(queries, 128)).astype(np.float32)
+        for backend in backends:
+            gallery = FaceGallery(backend=backend)
+            start = time.perf_counter()
+            gallery.replace(np.arange(size), np.arange(size), encodings)
+            build_seconds = time.perf_counter() - start
+
+            match_samples, matches = timed(gallery.match, probes)
+            correct = sum(student_id == row for (student_id, _), row in zip(matches, probe_rows))
+            frames = [probes[i:i + classroom_faces] for i in range(0, queries, classroom_faces)]
+            many_samples, _ = timed(gallery.match_many, frames)
+            results[f"{backend}_{size}"] = {
+                'build_ms': round(build_seconds * 1000, 3),
+                'match': summarize(match_samples),
+                'match_accuracy': round(correct / queries, 4),
+                'match_many_frame': summarize(many_samples),
+                'faces_per_frame': classroom_faces,
+            }
+            print(f"match {backend:5s} {size:>7d}: p50 {results[f'{backend}_{size}']['match']['p50_ms']} ms")
+    return results
+
+def bench_db_and_upload(count, image_bytes):
+    """
+    Commit satu baris Attendance, unggahan langsung ke penyimpanan, dan unggahan write-behind (antrean).
+    """
+    from app import app, db
+    from models import Student, Course, Attendance
+    from storage import get_storage
+    from upload_queue import enqueue_upload, process_batch
+
+    with app.app_context():
+        student = Student(name='Benchmark', student_id=f"bench-{uuid.uuid4().hex[:8]}")
+        course = Course(name='Benchmark', code=f"BENCH-{uuid.uuid4().hex[:8]}")
+        db.session.add_all([student, course])
+        db.session.commit()
+
+        def write_attendance(_):
+            db.session.add(Attendance(student_id=student.id, course_id=course.id))
+            db.session.commit()
+        db_samples, _ = timed(write_attendance, range(count))
+
+        storage = get_storage()
+        upload_samples, _ = timed(lambda i: storage.put_bytes(f"bench/direct/{i}.jpg", image_bytes, 'image/jpeg'),
+                                  range(count))
+
+        def write_behind(i):
+            enqueue_upload(f"bench/queued/{i}.jpg", image_bytes)
+            db.session.add(Attendance(student_id=student.id, course_id=course.id))
+            db.session.commit()
+        queued_samples, _ = timed(write_behind, range(count))
+
+        start = time.perf_counter()
+        while sum(process_batch()) > 0:
+            pass
+        drain_seconds = time.perf_counter() - start
+
+    return {
+        'db_write': summarize(db_samples),
+        'upload_direct': summarize(upload_samples),
+        'upload_write_behind_request': summarize(queued_samples),
+        'upload_queue_drain': summarize([drain_seconds / count] * count, elapsed=drain_seconds),
+        'payload_bytes': len(image_bytes),
+    }
+
+def bench_gallery_load(count):
+    """
+    Membandingkan pemuatan encoding lama (satu pickle per wajah dari S3) dengan
+    pemuatan galeri dari kolom FaceData.face_encoding (satu query).
+    """
+    from app import app, db
+    from models import Student, FaceData
+    from storage import get_storage
+    from face_utils import encoding_to_bytes, load_all_known_face_encodings_from_s3, FACE_ENCODING_FORMAT
+    from face_gallery import FaceGallery
+
+    with app.app_context():
+        storage = get_storage()
+        FaceData.query.delete()
+        student = Student(name='Benchmark', student_id=f"bench-{uuid.uuid4().hex[:8]}")
+        db.session.add(student)
+        db.session.flush()
+        encodings = synthetic_encodings(count, seed=7)
+        storage.put_many([(f"bench/legacy/{i}.pkl", pickle.dumps(encoding)) for i, encoding in enumerate(encodings)])
+        db.session.add_all([FaceData(student_id=student.id,
+                                     face_image_s3_url=storage.url_for(f"bench/legacy/{i}.pkl"),
+                                     face_encoding=encoding_to_bytes(encoding),
+                                     face_encoding_format=FACE_ENCODING_FORMAT)
+                            for i, encoding in enumerate(encodings)])
+        db.session.commit()
+
+        start = time.perf_counter()
+        load_all_known_face_encodings_from_s3()
+        legacy_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        FaceGallery().load()
+        gallery_seconds = time.perf_counter() - start
+
+    return {
+        'faces': count,
+        'legacy_pickle_per_face_ms': round(legacy_seconds * 1000, 3),
+        'gallery_single_query_ms': round(gallery_seconds * 1000, 3),
+    }
+
+
+def run_pipeline_benchmark(image_dir=None, sizes=(1000, 10000, 100000), backends=('brute', 'ivf'),
+                           queries=200, classroom_faces=60, writes=300, legacy_faces=1000, repeat=3):
+    setup_environment()
+    create_tables()
+    images = load_sample_images(image_dir)
+
+    results = {'meta': run_metadata(), 'stages': {}}
+    if images:
+        results['stages']['image'] = bench_image_stages(images, repeat)
+        sample_bytes = images[0][1]
+    else:
+        print("Tanpa --images: tahap decode/deteksi/encoding dilewati.")
+        import cv2
+        sample_bytes = cv2.imencode('.jpg', np.zeros((480, 640, 3), dtype=np.uint8))[1].tobytes()
+    results['stages']['match'] = bench_match(sizes, backends, queries, classroom_faces)
+    results['stages']['db_and_upload'] = bench_db_and_upload(writes, sample_bytes)
+    results['stages']['gallery_load'] = bench_gallery_load(legacy_faces)
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark tiap tahap pipeline pengenalan wajah dan presensi.")
+    parser.add_argument('--images', help="Folder foto wajah sampel (untuk tahap decode/deteksi/encoding)")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help="Ukuran galeri sintetis")
+    parser.add_argument('--backends', nargs='+', default=['brute', 'ivf'], help="Backend index yang diuji")
+    parser.add_argument('--queries', type=int, default=200, help="Jumlah wajah yang dicocokkan per ukuran galeri")
+    parser.add_argument('--classroom-faces', type=int, default=60, help="Wajah per frame untuk match_many")
+    parser.add_argument('--writes', type=int, default=300, help="Jumlah commit DB / unggahan yang diukur")
+    parser.add_argument('--legacy-faces', type=int, default=1000, help="Jumlah wajah untuk perbandingan pemuatan galeri")
+    parser.add_argument('--repeat', type=int, default=3, help="Pengulangan foto sampel")
+    parser.add_argument('--output', default='benchmark_pipeline.json', help="File JSON hasil")
+    args = parser.parse_args()
+    write_results(args.output, run_pipeline_benchmark(args.images, args.sizes, args.backends, args.queries,
+                                                      args.classroom_faces, args.writes, args.legacy_faces,
+                                                      args.repeat))
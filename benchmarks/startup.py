@@ -0,0 +1,95 @@
+from benchmarks.common import setup_environment, REPO_ROOT, run_metadata, write_results
+import argparse
+import json
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Setiap skenario dijalankan di interpreter baru agar waktu import dan RSS tidak terpengaruh
+# modul yang sudah dimuat skenario lain. Warm-up memakai _warm_up_worker yang ada di semua versi.
+PROBE = r"""
+import json, resource, sys, time
+sys.path.insert(0, sys.argv[1])
+start = time.perf_counter()
+for name in filter(None, sys.argv[2].split(',')):
+    __import__(name)
+import_seconds = time.perf_counter() - start
+warm_up_seconds = None
+if sys.argv[3] == '1':
+    start = time.perf_counter()
+    from recognition_pool import _warm_up_worker
+    _warm_up_worker()
+    warm_up_seconds = time.perf_counter() - start
+max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({
+    'import_s': import_seconds,
+    'warm_up_s': warm_up_seconds,
+    'max_rss_mb': max_rss / (1024 * 1024 if sys.platform == 'darwin' else 1024),
+    'heavy_modules': sorted(name for name in ('cv2', 'face_recognition', 'dlib', 'boto3', 'numpy')
+                            if name in sys.modules),
+}))
+"""
+
+# nama skenario -> (modul yang di-import, jalankan warm-up model)
+SCENARIOS = {
+    'interpreter': ('', False),
+    'cli_app_models': ('app,models', False),  # script CLI, migrasi, worker login/admin
+    'face_utils': ('face_utils', False),
+    'recognition_warm': ('app,models', True),  # worker yang memang mengenali wajah
+}
+
+def probe(source_dir, modules, warm_up):
+    completed = subprocess.run([sys.executable, '-c', PROBE, source_dir, modules, '1' if warm_up else '0'],
+                               cwd=source_dir, capture_output=True, text=True)
+    if completed.returncode != 0:
+        print(completed.stderr.strip().splitlines()[-1] if completed.stderr else 'probe gagal')
+        return None
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def measure_tree(source_dir, repeat):
+    results = {}
+    for name, (modules, warm_up) in SCENARIOS.items():
+        samples = [sample for sample in (probe(source_dir, modules, warm_up) for _ in range(repeat)) if sample]
+        if not samples:
+            results[name] = None
+            continue
+        results[name] = {
+            'import_ms': round(statistics.median(s['import_s'] for s in samples) * 1000, 1),
+            'warm_up_ms': round(statistics.median(s['warm_up_s'] for s in samples) * 1000, 1) if warm_up else None,
+            'max_rss_mb': round(statistics.median(s['max_rss_mb'] for s in samples), 1),
+            'heavy_modules': samples[-1]['heavy_modules'],
+        }
+        print(f"{name:18s} import {results[name]['import_ms']:>8} ms  RSS {results[name]['max_rss_mb']:>7} MB  "
+              f"{', '.join(results[name]['heavy_modules']) or '-'}")
+    return results
+
+def run_startup_benchmark(baseline=None, repeat=3):
+    """
+    Waktu start dan memori proses untuk tiap skenario pada tree saat ini,
+    dan (opsional) pada commit pembanding lewat git worktree sementara.
+    """
+    setup_environment()
+    report = {'meta': run_metadata(), 'current': None, 'baseline': None}
+    print("--- Tree saat ini ---")
+    report['current'] = measure_tree(REPO_ROOT, repeat)
+    if baseline:
+        worktree = tempfile.mkdtemp(prefix='hadirku-baseline-')
+        subprocess.run(['git', 'worktree', 'add', '--detach', worktree, baseline], cwd=REPO_ROOT,
+                       check=True, capture_output=True)
+        try:
+            print(f"--- Pembanding: {baseline} ---")
+            report['baseline'] = {'ref': baseline, 'results': measure_tree(worktree, repeat)}
+        finally:
+            subprocess.run(['git', 'worktree', 'remove', '--force', worktree], cwd=REPO_ROOT, capture_output=True)
+            shutil.rmtree(worktree, ignore_errors=True)
+    return report
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Waktu start dan memori proses (import aplikasi, warm-up model).")
+    parser.add_argument('--baseline', help="Commit/branch pembanding, misalnya HEAD~1")
+    parser.add_argument('--repeat', type=int, default=3, help="Pengulangan per skenario (diambil median)")
+    parser.add_argument('--output', default='benchmark_startup.json', help="File JSON hasil")
+    args = parser.parse_args()
+    write_results(args.output, run_startup_benchmark(args.baseline, args.repeat))
@@ -0,0 +1,187 @@
+from app import app, db
+from models import Student, FaceData
+from face_utils import decode_image, get_face_encoding, upload_bytes_to_s3, encoding_to_bytes, FACE_ENCODING_FORMAT
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from werkzeug.utils import secure_filename
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import uuid
+import zipfile
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+CONTENT_TYPES = {'.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.png': 'image/png'}
+
+def nim_from_filename(filename):
+    """
+    Foto diberi nama sesuai NIM: '2021001.jpg'. Beberapa foto untuk satu mahasiswa
+    boleh diberi akhiran: '2021001_2.jpg' atau '2021001-2.jpg'.
+    """
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    return stem.replace('-', '_').split('_')[0]
+
+def encode_image(item):
+    """
+    Dijalankan di proses worker: decode bytes gambar lalu hitung encoding wajah.
+    Mengembalikan (nama_file, encoding_bytes atau None, keterangan_error).
+    """
+    filename, image_bytes = item
+    image = decode_image(image_bytes)
+    if image is None:
+        return filename, None, 'gambar tidak valid'
+    face_encoding = get_face_encoding(image)
+    if face_encoding is None:
+        return filename, None, 'wajah tidak terdeteksi'
+    return filename, encoding_to_bytes(face_encoding), None
+
+
+class PhotoSource:
+    """
+    Membaca foto dari folder atau file zip dengan antarmuka yang sama.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.zip = zipfile.ZipFile(path) if zipfile.is_zipfile(path) else None
+
+    def names(self):
+        if self.zip:
+            names = [info.filename for info in self.zip.infolist() if not info.is_dir()]
+        else:
+            names = [os.path.relpath(os.path.join(root, name), self.path)
+                     for root, _, files in os.walk(self.path) for name in files]
+        return sorted(name for name in names if name.lower().endswith(IMAGE_EXTENSIONS))
+
+    def read(self, name):
+        if self.zip:
+            return self.zip.read(name)
+        with open(os.path.join(self.path, name), 'rb') as f:
+            return f.read()
+
+
+def load_progress(progress_path):
+    if os.path.exists(progress_path):
+        with open(progress_path) as f:
+            return json.load(f)
+    return {'done': [], 'failed': {}}
+
+def save_progress(progress_path, progress):
+    # Tulis ke file sementara lalu rename agar progres tidak rusak jika proses terhenti
+    temp_path = f"{progress_path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(progress, f)
+    os.replace(temp_path, progress_path)
+
+def load_names(names_csv):
+    """
+    Membaca CSV opsional berisi kolom 'nim,nama' untuk nama lengkap mahasiswa baru.
+    """
+    if not names_csv:
+        return {}
+    with open(names_csv, newline='', encoding='utf-8') as f:
+        return {row[0].strip(): row[1].strip() for row in csv.reader(f) if len(row) >= 2}
+
+def upload_photo(item):
+    filename, image_bytes = item
+    extension = os.path.splitext(filename)[1].lower()
+    s3_object_key = f"student_faces/{nim_from_filename(filename)}/{uuid.uuid4().hex}_{secure_filename(os.path.basename(filename))}"
+    return filename, upload_bytes_to_s3(image_bytes, s3_object_key, CONTENT_TYPES.get(extension, 'image/jpeg'))
+
+def insert_batch(encoded, uploaded_urls, names):
+    """
+    Menyimpan satu batch Student/FaceData dalam SATU transaksi.
+    """
+    nims = {nim_from_filename(filename) for filename in encoded}
+    students = {student.student_id: student
+                for student in Student.query.filter(Student.student_id.in_(nims)).all()}
+    for nim in nims - set(students):
+        students[nim] = Student(student_id=nim, name=names.get(nim, nim))
+        db.session.add(students[nim])
+    db.session.flush() # Dapatkan id untuk mahasiswa baru
+
+    db.session.add_all([
+        FaceData(
+            student_id=students[nim_from_filename(filename)].id,
+            face_image_s3_url=uploaded_urls[filename],
+            face_encoding=encoding_blob,
+            face_encoding_format=FACE_ENCODING_FORMAT,
+        )
+        for filename, encoding_blob in encoded.items()
+    ])
+    db.session.commit()
+
+def bulk_enroll(source_path, names_csv=None, batch_size=200, workers=None, upload_threads=16,
+                progress_path=None, report_path='bulk_enroll_report.csv'):
+    """
+    Script command-line untuk mendaftarkan wajah banyak mahasiswa sekaligus.
+    Encoding dihitung paralel di semua core, foto diunggah paralel, dan baris database
+    disimpan per batch. Progres dicatat sehingga proses yang terhenti bisa dilanjutkan.
+    """
+    source = PhotoSource(source_path)
+    progress_path = progress_path or f"{source_path.rstrip(os.sep)}.progress.json"
+    progress = load_progress(progress_path)
+    names = load_names(names_csv)
+
+    done = set(progress['done'])
+    pending = [name for name in source.names() if name not in done]
+    print(f"--- Pendaftaran Massal: {len(pending)} foto ({len(done)} sudah selesai sebelumnya) ---")
+
+    with app.app_context(), \
+            ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as encoders, \
+            ThreadPoolExecutor(max_workers=upload_threads) as uploaders:
+        for start in range(0, len(pending), batch_size):
+            batch = [(name, source.read(name)) for name in pending[start:start + batch_size]]
+            photos = dict(batch)
+
+            # --- Langkah 1: Encoding paralel di semua core ---
+            encoded = {}
+            for filename, encoding_blob, error in encoders.map(encode_image, batch, chunksize=8):
+                if encoding_blob is None:
+                    progress['failed'][filename] = error
+                else:
+                    encoded[filename] = encoding_blob
+
+            # --- Langkah 2: Unggah foto yang berhasil di-encode secara paralel ---
+            uploaded_urls = {}
+            for filename, s3_url in uploaders.map(upload_photo, [(f, photos[f]) for f in encoded]):
+                if s3_url:
+                    uploaded_urls[filename] = s3_url
+                else:
+                    progress['failed'][filename] = 'gagal unggah ke S3'
+            encoded = {f: blob for f, blob in encoded.items() if f in uploaded_urls}
+
+            # --- Langkah 3: Simpan batch ke database dalam satu transaksi ---
+            if encoded:
+                insert_batch(encoded, uploaded_urls, names)
+
+            # Foto yang gagal diunggah tidak ditandai selesai agar dicoba lagi saat dilanjutkan
+            for filename, _ in batch:
+                if filename in encoded:
+                    progress['failed'].pop(filename, None)
+                if progress['failed'].get(filename) != 'gagal unggah ke S3':
+                    progress['done'].append(filename)
+            save_progress(progress_path, progress)
+            print(f"{min(start + batch_size, len(pending))}/{len(pending)} foto diproses "
+                  f"({len(encoded)} berhasil di batch ini)")
+
+    with open(report_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['file', 'nim', 'keterangan'])
+        for filename, error in sorted(progress['failed'].items()):
+            writer.writerow([filename, nim_from_filename(filename), error])
+
+    print(f"\nSelesai. {len(progress['failed'])} foto gagal, lihat {report_path}.")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Pendaftaran wajah massal dari folder atau zip foto bernama NIM.")
+    parser.add_argument('source', help="Folder atau file .zip berisi foto (nama file = NIM)")
+    parser.add_argument('--names', help="CSV opsional 'nim,nama' untuk nama mahasiswa baru")
+    parser.add_argument('--batch-size', type=int, default=200, help="Jumlah foto per transaksi database")
+    parser.add_argument('--workers', type=int, default=None, help="Jumlah proses encoding (default: semua core)")
+    parser.add_argument('--upload-threads', type=int, default=16, help="Jumlah unggahan S3 paralel")
+    parser.add_argument('--progress', help="File progres untuk melanjutkan proses yang terhenti")
+    parser.add_argument('--report', default='bulk_enroll_report.csv', help="CSV laporan foto yang gagal")
+    args = parser.parse_args()
+    bulk_enroll(args.source, args.names, args.batch_size, args.workers, args.upload_threads,
+                args.progress, args.report)
@@ -0,0 +1,89 @@
+import os
+import sys
+import time
+import cv2
+import face_recognition
+import numpy as np
+
+from face_utils import FACE_DETECTION_MAX_WIDTH, FACE_DETECTION_UPSAMPLE, detect_largest_face, encode_face
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+def full_resolution_encoding(image):
+    """
+    Jalur lama: deteksi HOG pada gambar resolusi penuh dengan pengaturan default,
+    lalu encoding wajah pertama.
+    """
+    rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    face_locations = face_recognition.face_locations(rgb_image)
+    if not face_locations:
+        return None
+    return face_recognition.face_encodings(rgb_image, face_locations)[0]
+
+def fast_encoding(image):
+    """
+    Jalur cepat yang dipakai get_face_encoding: deteksi pada salinan kecil, encoding pada potongan wajah.
+    """
+    face_location = detect_largest_face(image)
+    if face_location is None:
+        return None
+    return encode_face(image, face_location)
+
+def compare_detection(image_dir, tolerance=0.6):
+    """
+    Script command-line untuk membandingkan waktu CPU dan hasil encoding jalur cepat
+    dengan jalur resolusi penuh pada kumpulan foto wajah.
+    """
+    paths = sorted(os.path.join(image_dir, name) for name in os.listdir(image_dir)
+                   if name.lower().endswith(IMAGE_EXTENSIONS))
+    full_times, fast_times, distances = [], [], []
+    both_found = only_full = only_fast = neither = 0
+
+    for path in paths:
+        image = cv2.imread(path)
+        if image is None:
+            print(f"Lewati {path}: tidak dapat dibaca.")
+            continue
+
+        start = time.process_time()
+        full = full_resolution_encoding(image)
+        full_times.append(time.process_time() - start)
+
+        start = time.process_time()
+        fast = fast_encoding(image)
+        fast_times.append(time.process_time() - start)
+
+        if full is not None and fast is not None:
+            both_found += 1
+            distances.append(float(np.linalg.norm(full - fast)))
+        elif full is not None:
+            only_full += 1
+            print(f"Wajah hanya terdeteksi di resolusi penuh: {path}")
+        elif fast is not None:
+            only_fast += 1
+        else:
+            neither += 1
+
+    if not full_times:
+        print("Tidak ada gambar yang bisa diproses.")
+        return
+
+    full_ms = np.mean(full_times) * 1000
+    fast_ms = np.mean(fast_times) * 1000
+    print(f"\n--- Perbandingan Deteksi ({len(full_times)} gambar) ---")
+    print(f"Resolusi penuh : {full_ms:.1f} ms CPU/gambar")
+    print(f"Jalur cepat    : {fast_ms:.1f} ms CPU/gambar (lebar deteksi maks "
+          f"{FACE_DETECTION_MAX_WIDTH} px, upsample {FACE_DETECTION_UPSAMPLE})")
+    print(f"Percepatan     : {full_ms / max(fast_ms, 1e-9):.1f}x")
+    print(f"Wajah terdeteksi di keduanya: {both_found}, hanya resolusi penuh: {only_full}, "
+          f"hanya jalur cepat: {only_fast}, tidak keduanya: {neither}")
+    if distances:
+        distances = np.asarray(distances)
+        print(f"Jarak encoding antar jalur: rata-rata {distances.mean():.4f}, maks {distances.max():.4f}")
+        print(f"Pasangan dengan jarak > tolerance {tolerance}: {(distances > tolerance).sum()}")
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Penggunaan: python compare_detection.py <folder_foto_wajah>")
+        sys.exit(1)
+    compare_detection(sys.argv[1])
@@ -0,0 +1,388 @@
+import os
+import threading
+from time import monotonic
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from app import db
+from models import FaceData, Enrollment
+from face_utils import encodings_from_bytes
+from face_index import make_index, BruteForceIndex, IVFIndex, ENCODING_DIM
+from face_templates import TemplateSet, FACE_TEMPLATES
+from gallery_store import (get_store, changes_since, current_face_rows, read_gallery_snapshot,
+                           FACE_GALLERY_SYNC_INTERVAL)
+import metrics
+
+# --- Pengaturan pencocokan per mata kuliah (bisa diubah lewat environment variable) ---
+# FACE_MATCH_GLOBAL_FALLBACK: '1' = jika tidak cocok di peserta mata kuliah (termasuk mata kuliah yang
+#                             belum punya peserta), cari di seluruh galeri
+# FACE_ROSTER_TTL: detik sebelum daftar peserta yang di-cache dibaca ulang dari database
+#                  (perubahan dari proses lain terlihat paling lambat setelah TTL ini)
+FACE_MATCH_GLOBAL_FALLBACK = os.environ.get('FACE_MATCH_GLOBAL_FALLBACK', '0') == '1'
+FACE_ROSTER_TTL = float(os.environ.get('FACE_ROSTER_TTL', '300'))
+
+# --- Galeri Encoding Wajah di Memori Proses ---
+# Semua encoding yang terdaftar dimuat SEKALI ke matriks float32 N x 128 yang kontigu,
+# beserta array id FaceData dan id siswa yang paralel dengan baris matriks.
+# Matriks disimpan di dalam index pencocokan (lihat face_index.py) yang bisa brute-force
+# eksak atau IVF aproksimasi. Pencocokan presensi tidak butuh I/O jaringan sama sekali.
+# Jika FACE_GALLERY_DIR diisi, matriks tidak dimuat ke memori proses melainkan di-mmap dari
+# galeri bersama per host (gallery_store.py). Dalam kedua mode, perubahan dari proses atau
+# server lain ditarik berkala dari change log FaceDataChange oleh GallerySync.
+class FaceGallery:
+    def __init__(self, backend=None):
+        self._lock = threading.RLock()
+        self._backend = backend
+        # Snapshot (index, face_ids, student_ids) selalu diganti utuh, tidak diubah di tempat,
+        # sehingga pencocokan yang sedang berjalan tetap konsisten tanpa perlu memegang lock.
+        self._snapshot = (make_index(None, backend),
+                          np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+        self._loaded = False
+        self.high_water_mark = 0 # id FaceDataChange terakhir yang sudah diterapkan
+        self.gaps = {} # Celah id change log yang masih ditunggu (lihat gallery_store.py)
+        self.version = None # Versi manifest galeri bersama yang sedang dipakai
+        # Cache per mata kuliah: course_id -> (roster student_id, waktu dimuat) dan
+        # course_id -> (snapshot galeri asal, snapshot subset peserta)
+        self._rosters = {}
+        self._course_snapshots = {}
+        # Template per mahasiswa untuk snapshot global: (snapshot asal, TemplateSet), lihat face_templates.py
+        self._templates = None
+
+    def __len__(self):
+        # Baris tombstone di galeri bersama punya student_id -1 dan tidak dihitung
+        return int(np.count_nonzero(self._snapshot[2] >= 0))
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    @property
+    def index(self):
+        return self._snapshot[0]
+
+    def load(self):
+        """
+        Memuat ulang seluruh galeri dari kolom FaceData.face_encoding dengan satu query
+        (atau memetakan galeri bersama jika FACE_GALLERY_DIR diisi).
+        Dipanggil sekali saat worker start (start_worker_services di app.py) atau otomatis pada pencocokan pertama.
+        """
+        store = get_store()
+        if store is not None:
+            self._use_manifest(store, store.sync())
+            print(f"Galeri wajah bersama dipetakan: {len(self)} encoding (versi {self.version}).")
+            return
+
+        # Isi galeri, high-water mark, dan celah change log dibaca dari satu snapshot database
+        rows, high_water_mark, gaps = read_gallery_snapshot()
+        face_ids = [row[0] for row in rows]
+        student_ids = [row[1] for row in rows]
+        self.replace(face_ids, student_ids, encodings_from_bytes(row[2] for row in rows))
+        self.high_water_mark, self.gaps = high_water_mark, gaps
+
+        missing = FaceData.query.filter(FaceData.face_encoding.is_(None)).count()
+        if missing:
+            print(f"Peringatan: {missing} data wajah belum punya encoding di DB. Jalankan backfill_face_encodings.py.")
+        print(f"Galeri wajah dimuat: {len(self)} encoding (index {self.index.backend}).")
+
+    def replace(self, face_ids, student_ids, encodings):
+        """
+        Mengganti seluruh isi galeri dengan data yang diberikan.
+        """
+        index = make_index(encodings, self._backend)
+        with self._lock:
+            self._snapshot = (index, np.asarray(face_ids, dtype=np.int64),
+                              np.asarray(student_ids, dtype=np.int64))
+            self._loaded = True
+        self._update_templates()
+
+    def apply(self, changed_face_ids, rows):
+        """
+        Mengganti baris wajah yang berubah dengan keadaan terbarunya. rows berisi
+        (id, student_id, encoding) dari current_face_rows; wajah yang sudah dihapus tidak ada di rows.
+        """
+        with self._lock:
+            index, face_ids, student_ids = self._snapshot
+            keep = ~np.isin(face_ids, changed_face_ids)
+            if not keep.all():
+                index, face_ids, student_ids = index.filtered(keep), face_ids[keep], student_ids[keep]
+            if rows:
+                index = index.added(encodings_from_bytes(row[2] for row in rows))
+                face_ids = np.concatenate([face_ids, np.asarray([row[0] for row in rows], dtype=np.int64)])
+                student_ids = np.concatenate([student_ids, np.asarray([row[1] for row in rows], dtype=np.int64)])
+            self._snapshot = (index, face_ids, student_ids)
+        self._update_templates()
+
+    def _use_manifest(self, store, manifest):
+        for attempt in range(2):
+            try:
+                index, face_ids, student_ids, version = store.snapshot(manifest)
+                break
+            except FileNotFoundError:
+                # Segmen baru saja dipadatkan oleh penulis; baca manifest terbaru lalu coba lagi
+                if attempt:
+                    raise
+                manifest = store.read_manifest()
+        with self._lock:
+            self._snapshot = (index, face_ids, student_ids)
+            self.version = version
+            self.high_water_mark = manifest['high_water_mark']
+            self._loaded = True
+        self._update_templates()
+
+    def _update_templates(self):
+        """
+        Menghitung ulang template hanya untuk mahasiswa yang fotonya berubah sejak snapshot sebelumnya.
+        """
+        if not FACE_TEMPLATES:
+            return
+        snapshot = self._snapshot
+        previous = self._templates[1] if self._templates is not None else None
+        templates = TemplateSet.build(*snapshot, previous=previous, backend=self._backend)
+        with self._lock:
+            self._templates = (snapshot, templates)
+
+    def _templates_for(self, snapshot):
+        cached = self._templates
+        return cached[1] if cached is not None and cached[0] is snapshot else None
+
+    def refresh(self):
+        """
+        Menerapkan perubahan FaceData dari proses atau server lain (lewat change log).
+        Dipanggil berkala oleh GallerySync dan segera setelah commit yang mengubah FaceData.
+        """
+        store = get_store()
+        if store is not None:
+            manifest = store.sync()
+            if manifest['version'] != self.version:
+                self._use_manifest(store, manifest)
+            return
+
+        changed_face_ids, high_water_mark, gaps = changes_since(self.high_water_mark, self.gaps)
+        if changed_face_ids:
+            self.apply(changed_face_ids, current_face_rows(changed_face_ids))
+        self.high_water_mark, self.gaps = high_water_mark, gaps
+
+    # --- Subset kandidat per mata kuliah ---
+    def _roster(self, course_id):
+        cached = self._rosters.get(course_id)
+        if cached is not None and monotonic() - cached[1] < FACE_ROSTER_TTL:
+            return cached[0]
+        roster = np.fromiter((student_id for (student_id,) in db.session.query(Enrollment.student_id)
+                              .filter(Enrollment.course_id == course_id)), dtype=np.int64)
+        with self._lock:
+            self._rosters[course_id] = (roster, monotonic())
+            self._course_snapshots.pop(course_id, None)
+        return roster
+
+    def course_snapshot(self, course_id):
+        """
+        Snapshot (index, face_ids, student_ids) yang hanya berisi wajah mahasiswa peserta mata kuliah.
+        Dibangun sekali lalu di-cache sampai galeri atau daftar peserta berubah.
+        Mata kuliah tanpa peserta menghasilkan snapshot kosong: tidak ada wajah yang cocok
+        kecuali pencarian diulang di seluruh galeri (fallback).
+        """
+        roster = self._roster(course_id)
+        snapshot = self._snapshot
+        cached = self._course_snapshots.get(course_id)
+        if cached is not None and cached[0] is snapshot:
+            return cached[1]
+
+        index, face_ids, student_ids = snapshot
+        keep = np.isin(student_ids, roster)
+        if keep.sum() < IVFIndex.MIN_TRAIN_SIZE:
+            # Satu kelas biasanya kecil: brute-force eksak pada subset sudah paling cepat
+            course_index = BruteForceIndex(index.filtered(keep).vectors)
+        else:
+            course_index = index.filtered(keep)
+        course_snapshot = (course_index, face_ids[keep], student_ids[keep])
+        with self._lock:
+            self._course_snapshots[course_id] = (snapshot, course_snapshot)
+        return course_snapshot
+
+    def invalidate_course(self, course_id):
+        """
+        Membuang cache peserta mata kuliah (dipanggil setelah Enrollment berubah).
+        """
+        with self._lock:
+            self._rosters.pop(course_id, None)
+            self._course_snapshots.pop(course_id, None)
+
+    def match(self, encoding, tolerance=0.6, course_id=None, fallback=FACE_MATCH_GLOBAL_FALLBACK):
+        """
+        Mencari encoding terdekat di galeri (jarak Euclidean, sama seperti face_recognition).
+        Jika course_id diberikan, hanya wajah peserta mata kuliah tersebut yang dibandingkan;
+        dengan fallback=True pencarian diulang di seluruh galeri jika tidak ada yang cocok.
+        Mengembalikan (student_id, jarak) jika jarak <= tolerance, (None, jarak) jika tidak,
+        dan (None, None) jika galeri kosong.
+        """
+        with metrics.span('match'):
+            if course_id is None:
+                student_id, distance = self._match_in(self._snapshot, encoding, tolerance)
+            else:
+                student_id, distance = self._match_in(self.course_snapshot(course_id), encoding, tolerance)
+                if student_id is None and fallback:
+                    student_id, distance = self._match_in(self._snapshot, encoding, tolerance)
+        metrics.match_outcomes.inc('empty' if distance is None else ('match' if student_id is not None else 'no_match'))
+        return student_id, distance
+
+    def _match_in(self, snapshot, encoding, tolerance):
+        index, _, student_ids = snapshot
+        templates = self._templates_for(snapshot)
+        if templates is not None:
+            nearest = templates.nearest_students(index, encoding)[0]
+            if not nearest:
+                return None, None
+            student_id, best_distance = nearest[0]
+            return (student_id, best_distance) if best_distance <= tolerance else (None, best_distance)
+
+        positions, distances = index.search(encoding, k=1)
+        if len(positions) == 0:
+            return None, None
+
+        best_distance = float(distances[0])
+        if best_distance <= tolerance:
+            return int(student_ids[positions[0]]), best_distance
+        return None, best_distance
+
+    def match_many(self, encodings, tolerance=0.6, k=5, course_id=None, fallback=FACE_MATCH_GLOBAL_FALLBACK):
+        """
+        Mencocokkan banyak wajah dari satu frame sekaligus (satu perhitungan matriks jarak),
+        hanya terhadap peserta mata kuliah jika course_id diberikan; dengan fallback=True wajah
+        yang tidak cocok dicari lagi di seluruh galeri, seperti match.
+        Konflik diselesaikan secara greedy dari pasangan dengan jarak terkecil: satu mahasiswa
+        per wajah dan satu wajah per mahasiswa. Mengembalikan list (student_id atau None, jarak
+        atau None) dengan urutan yang sama dengan encodings.
+        """
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        snapshot = self.course_snapshot(course_id) if course_id is not None else self._snapshot
+        results = [(None, None)] * len(encodings)
+        assigned_students = set()
+        self._assign_many(snapshot, encodings, np.arange(len(encodings)), tolerance, k, results, assigned_students)
+        if course_id is not None and fallback:
+            unmatched = np.array([face for face, (student_id, _) in enumerate(results) if student_id is None],
+                                 dtype=np.int64)
+            if len(unmatched):
+                self._assign_many(self._snapshot, encodings[unmatched], unmatched, tolerance, k,
+                                  results, assigned_students)
+        metrics.match_outcomes.inc('match', len(assigned_students))
+        metrics.match_outcomes.inc('no_match', len(results) - len(assigned_students))
+        return results
+
+    def _assign_many(self, snapshot, encodings, faces, tolerance, k, results, assigned_students):
+        """
+        Satu putaran match_many pada snapshot: mengisi results[faces[i]] dan assigned_students di tempat.
+        Mahasiswa yang sudah ada di assigned_students tidak diberikan ke wajah lain.
+        """
+        index, _, student_ids = snapshot
+        templates = self._templates_for(snapshot)
+        with metrics.span('match_many'):
+            if templates is not None:
+                nearest = [students[:k] for students in templates.nearest_students(index, encodings)]
+            else:
+                positions, distances = index.search_many(encodings, k=k)
+                nearest = [[(int(student_ids[position]), float(distance))
+                            for position, distance in zip(row_positions, row_distances) if position >= 0]
+                           for row_positions, row_distances in zip(positions, distances)]
+        for face, students in zip(faces, nearest):
+            if students and (results[face][1] is None or students[0][1] < results[face][1]):
+                results[face] = (None, students[0][1])
+
+        candidates = sorted(
+            (distance, face, student_id)
+            for face, students in zip(faces.tolist(), nearest)
+            for student_id, distance in students
+            if distance <= tolerance
+        )
+        for distance, face, student_id in candidates:
+            if results[face][0] is None and student_id not in assigned_students:
+                results[face] = (student_id, distance)
+                assigned_students.add(student_id)
+
+
+# Satu galeri per proses worker
+gallery = FaceGallery()
+_load_lock = threading.Lock()
+
+# Setiap worker punya galeri sendiri: posisi change log dilaporkan dari worker yang paling tertinggal
+metrics.register_gauge('hadirku_gallery_faces', 'Jumlah encoding wajah di galeri (terbanyak di antara worker).',
+                       lambda: len(gallery), aggregate='max')
+metrics.register_gauge('hadirku_gallery_change_log_position', 'id change log FaceData terakhir yang diterapkan (worker paling tertinggal).',
+                       lambda: gallery.high_water_mark, aggregate='min')
+
+# --- Sinkronisasi berkala dengan change log (thread latar per proses) ---
+class GallerySync:
+    def __init__(self, interval=FACE_GALLERY_SYNC_INTERVAL):
+        self.interval = interval
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='gallery-sync', daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        from app import app
+        with app.app_context():
+            while True:
+                self._wake.wait(self.interval)
+                self._wake.clear()
+                try:
+                    gallery.refresh()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Error saat sinkronisasi galeri wajah: {e}")
+                finally:
+                    db.session.remove()
+
+gallery_sync = GallerySync()
+
+def get_gallery():
+    """
+    Mengembalikan galeri proses ini, memuatnya terlebih dahulu jika belum pernah dimuat.
+    """
+    if not gallery.loaded:
+        with _load_lock:
+            if not gallery.loaded:
+                gallery.load()
+                gallery_sync.start()
+    return gallery
+
+
+# --- Sinkronisasi galeri saat baris FaceData berubah ---
+# Perubahan FaceData dicatat di change log oleh gallery_store.py dalam transaksi yang sama.
+# Setelah commit, GallerySync dibangunkan agar galeri proses ini langsung menariknya;
+# rollback tidak mengubah apa pun karena change log ikut dibatalkan.
+@event.listens_for(FaceData, 'after_insert')
+@event.listens_for(FaceData, 'after_update')
+@event.listens_for(FaceData, 'after_delete')
+def _queue_face_change(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info['gallery_faces_changed'] = True
+
+@event.listens_for(Enrollment, 'after_insert')
+@event.listens_for(Enrollment, 'after_delete')
+def _queue_roster_change(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('gallery_changed_courses', set()).add(target.course_id)
+
+@event.listens_for(Session, 'after_commit')
+def _apply_gallery_changes(session):
+    if session.info.pop('gallery_faces_changed', False) and gallery.loaded:
+        gallery_sync.start()
+        gallery_sync.wake()
+    for course_id in session.info.pop('gallery_changed_courses', ()):
+        gallery.invalidate_course(course_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_gallery_changes(session):
+    session.info.pop('gallery_faces_changed', None)
+    session.info.pop('gallery_changed_courses', None)
@@ -0,0 +1,428 @@
+import os
+import time
+import numpy as np
+
+ENCODING_DIM = 128 # Panjang vektor encoding dari face_recognition/dlib
+RERANK_CANDIDATES = 8 # Kandidat terdekat yang jaraknya dihitung ulang secara eksak
+
+# Backend default bisa diatur lewat environment variable:
+# FACE_INDEX_BACKEND=brute (eksak) atau ivf (aproksimasi), FACE_INDEX_NPROBE, FACE_INDEX_PATH
+FACE_INDEX_BACKEND = os.environ.get('FACE_INDEX_BACKEND', 'brute')
+FACE_INDEX_NPROBE = int(os.environ.get('FACE_INDEX_NPROBE', '8'))
+FACE_INDEX_PATH = os.environ.get('FACE_INDEX_PATH') # Contoh: /var/lib/hadirku/face_index.npz
+
+def _as_matrix(vectors):
+    if vectors is None:
+        return np.empty((0, ENCODING_DIM), dtype=np.float32)
+    return np.ascontiguousarray(np.asarray(vectors, dtype=np.float32).reshape(-1, ENCODING_DIM))
+
+def _squared_norms(vectors):
+    return np.einsum('ij,ij->i', vectors, vectors)
+
+def _top_k(vectors, sq_norms, query, k, candidates=None):
+    """
+    Mencari k vektor terdekat dari query.
+    Jarak dihitung SEKALI dengan ||x||^2 - 2x.q + ||q||^2 (satu perkalian matriks-vektor),
+    lalu beberapa kandidat teratas dihitung ulang secara eksak agar semantik tolerance
+    sama dengan face_recognition.face_distance.
+    Mengembalikan (posisi, jarak) terurut dari yang paling dekat.
+    """
+    q = np.asarray(query, dtype=np.float32).reshape(ENCODING_DIM)
+    if candidates is not None:
+        vectors, sq_norms = vectors[candidates], sq_norms[candidates]
+    if len(vectors) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+    approx = sq_norms - 2.0 * (vectors @ q) + float(q @ q)
+    shortlist = min(len(approx), max(k, RERANK_CANDIDATES))
+    if shortlist < len(approx):
+        top = np.argpartition(approx, shortlist - 1)[:shortlist]
+    else:
+        top = np.arange(len(approx))
+
+    diff = vectors[top].astype(np.float64) - q
+    exact = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+    order = np.argsort(exact)[:k]
+    positions = top[order] if candidates is None else candidates[top[order]]
+    return positions.astype(np.int64), exact[order]
+
+def _top_k_many(vectors, sq_norms, queries, k):
+    """
+    Versi batch dari _top_k: jarak semua query ke semua vektor dihitung dalam SATU
+    perkalian matriks (M x N), lalu kandidat teratas tiap query dihitung ulang secara eksak.
+    Mengembalikan (posisi, jarak) berbentuk (M, k) terurut dari yang paling dekat.
+    """
+    queries = _as_matrix(queries)
+    k = min(k, len(vectors))
+    if len(vectors) == 0 or len(queries) == 0:
+        return np.empty((len(queries), 0), dtype=np.int64), np.empty((len(queries), 0), dtype=np.float64)
+
+    approx = sq_norms[None, :] - 2.0 * (queries @ vectors.T) + _squared_norms(queries)[:, None]
+    shortlist = min(vectors.shape[0], max(k, RERANK_CANDIDATES))
+    if shortlist < vectors.shape[0]:
+        top = np.argpartition(approx, shortlist - 1, axis=1)[:, :shortlist]
+    else:
+        top = np.broadcast_to(np.arange(vectors.shape[0]), (len(queries), shortlist))
+
+    diff = vectors[top].astype(np.float64) - queries[:, None, :]
+    exact = np.sqrt(np.einsum('mij,mij->mi', diff, diff))
+    order = np.argsort(exact, axis=1)[:, :k]
+    return (np.take_along_axis(top, order, axis=1).astype(np.int64),
+            np.take_along_axis(exact, order, axis=1))
+
+
+# --- Backend 1: Brute-force eksak (vektorisasi penuh) ---
+# Index bersifat immutable: added()/filtered() mengembalikan index baru sehingga
+# pencarian yang sedang berjalan di thread lain tidak pernah melihat state setengah jadi.
+class BruteForceIndex:
+    backend = 'brute'
+
+    def __init__(self, vectors=None, sq_norms=None):
+        self.vectors = _as_matrix(vectors)
+        self._sq_norms = _squared_norms(self.vectors) if sq_norms is None else sq_norms
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def added(self, vectors):
+        """
+        Mengembalikan index baru dengan vektor tambahan di akhir.
+        """
+        new_vectors = _as_matrix(vectors)
+        return BruteForceIndex(np.vstack([self.vectors, new_vectors]),
+                               np.concatenate([self._sq_norms, _squared_norms(new_vectors)]))
+
+    def filtered(self, keep):
+        """
+        Mengembalikan index baru yang hanya berisi baris dengan keep == True.
+        """
+        return BruteForceIndex(self.vectors[keep], self._sq_norms[keep])
+
+    def take(self, positions):
+        return self.vectors[positions]
+
+    def squared_norms(self):
+        return self._sq_norms
+
+    def search(self, query, k=1):
+        return _top_k(self.vectors, self._sq_norms, query, k)
+
+    def search_many(self, queries, k=1):
+        return _top_k_many(self.vectors, self._sq_norms, queries, k)
+
+    def save(self, path):
+        np.savez(path, backend=self.backend, vectors=self.vectors)
+
+
+# --- Backend 2: IVF (inverted file) aproksimasi ---
+# Vektor dikelompokkan dengan k-means ke nlist cluster. Pencarian hanya memeriksa
+# nprobe cluster terdekat, lalu jarak eksak dihitung untuk kandidat di cluster tersebut.
+class IVFIndex:
+    backend = 'ivf'
+    MIN_TRAIN_SIZE = 1024 # Di bawah ukuran ini brute-force sudah cukup cepat
+
+    def __init__(self, vectors=None, centroids=None, assignments=None, nprobe=FACE_INDEX_NPROBE, sq_norms=None):
+        self.vectors = _as_matrix(vectors)
+        self._sq_norms = _squared_norms(self.vectors) if sq_norms is None else sq_norms
+        self.nprobe = nprobe
+        self.centroids = centroids
+        if centroids is not None and assignments is None:
+            assignments = _nearest_centroid(self.vectors, centroids)
+        self.assignments = assignments
+        if centroids is not None:
+            # Daftar anggota tiap cluster: posisi terurut per cluster + offset awal tiap cluster
+            self._order = np.argsort(assignments, kind='stable')
+            counts = np.bincount(assignments, minlength=len(centroids))
+            self._offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    @classmethod
+    def train(cls, vectors, nlist=None, nprobe=FACE_INDEX_NPROBE, iterations=10, seed=0):
+        """
+        Membangun index IVF baru dengan melatih centroid k-means dari vektor yang diberikan.
+        """
+        vectors = _as_matrix(vectors)
+        if len(vectors) < cls.MIN_TRAIN_SIZE:
+            return cls(vectors, nprobe=nprobe)
+        nlist = nlist or max(8, int(np.sqrt(len(vectors))))
+        centroids = _kmeans(vectors, nlist, iterations, seed)
+        return cls(vectors, centroids, nprobe=nprobe)
+
+    def added(self, vectors):
+        new_vectors = _as_matrix(vectors)
+        all_vectors = np.vstack([self.vectors, new_vectors])
+        sq_norms = np.concatenate([self._sq_norms, _squared_norms(new_vectors)])
+        if not self.trained:
+            if len(all_vectors) >= self.MIN_TRAIN_SIZE:
+                return IVFIndex.train(all_vectors, nprobe=self.nprobe)
+            return IVFIndex(all_vectors, nprobe=self.nprobe, sq_norms=sq_norms)
+        # Centroid tidak dilatih ulang; vektor baru cukup dimasukkan ke cluster terdekat
+        assignments = np.concatenate([self.assignments, _nearest_centroid(new_vectors, self.centroids)])
+        return IVFIndex(all_vectors, self.centroids, assignments, self.nprobe, sq_norms)
+
+    def filtered(self, keep):
+        if not self.trained:
+            return IVFIndex(self.vectors[keep], nprobe=self.nprobe, sq_norms=self._sq_norms[keep])
+        return IVFIndex(self.vectors[keep], self.centroids, self.assignments[keep],
+                        self.nprobe, self._sq_norms[keep])
+
+    def take(self, positions):
+        return self.vectors[positions]
+
+    def squared_norms(self):
+        return self._sq_norms
+
+    def rebuilt(self, vectors):
+        """
+        Membuat index untuk vektor baru dengan memakai ulang centroid yang sudah dilatih.
+        """
+        if not self.trained:
+            return IVFIndex.train(vectors, nprobe=self.nprobe)
+        return IVFIndex(vectors, self.centroids, nprobe=self.nprobe)
+
+    def search(self, query, k=1):
+        if not self.trained:
+            return _top_k(self.vectors, self._sq_norms, query, k)
+
+        q = np.asarray(query, dtype=np.float32).reshape(ENCODING_DIM)
+        centroid_distances = _squared_norms(self.centroids) - 2.0 * (self.centroids @ q)
+        nprobe = min(self.nprobe, len(self.centroids))
+        probe = np.argpartition(centroid_distances, nprobe - 1)[:nprobe]
+        candidates = np.concatenate([self._order[self._offsets[c]:self._offsets[c + 1]] for c in probe])
+        return _top_k(self.vectors, self._sq_norms, q, k, candidates)
+
+    def search_many(self, queries, k=1):
+        if not self.trained:
+            return _top_k_many(self.vectors, self._sq_norms, queries, k)
+        # Setiap query memeriksa cluster yang berbeda, jadi dicari satu per satu
+        results = [self.search(query, k) for query in _as_matrix(queries)]
+        width = min(k, len(self.vectors))
+        positions = np.full((len(results), width), -1, dtype=np.int64)
+        distances = np.full((len(results), width), np.inf)
+        for row, (found, found_distances) in enumerate(results):
+            positions[row, :len(found)] = found
+            distances[row, :len(found)] = found_distances
+        return positions, distances
+
+    def save(self, path):
+        if not self.trained:
+            np.savez(path, backend=self.backend, vectors=self.vectors, nprobe=self.nprobe)
+            return
+        np.savez(path, backend=self.backend, vectors=self.vectors, centroids=self.centroids,
+                 assignments=self.assignments, nprobe=self.nprobe)
+
+
+# --- Gabungan segmen (galeri bersama yang di-mmap, lihat gallery_store.py) ---
+# Setiap segmen adalah index biasa di atas vektornya sendiri, sehingga segmen yang di-mmap
+# tidak pernah disalin. Baris yang sudah dihapus (tombstone) tetap ada di segmen tetapi
+# ditandai di mask dead dan tidak pernah dikembalikan oleh pencarian.
+class SegmentedIndex:
+    backend = 'segmented'
+
+    def __init__(self, segments, dead=None):
+        self.segments = list(segments)
+        self._offsets = np.concatenate([[0], np.cumsum([len(s) for s in self.segments])]).astype(np.int64)
+        self.dead = np.zeros(self._offsets[-1], dtype=bool) if dead is None else np.asarray(dead, dtype=bool)
+        self._dead_counts = [int(self.dead[start:end].sum())
+                             for start, end in zip(self._offsets[:-1], self._offsets[1:])]
+
+    def __len__(self):
+        return int(self._offsets[-1])
+
+    @property
+    def vectors(self):
+        """
+        Salinan semua vektor dalam satu matriks (hanya untuk subset kecil, misalnya hasil filtered()).
+        """
+        if not self.segments:
+            return _as_matrix(None)
+        return np.vstack([segment.vectors for segment in self.segments])
+
+    def take(self, positions):
+        """
+        Vektor pada posisi global tertentu, diambil langsung dari segmennya masing-masing.
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        rows = np.empty((len(positions), ENCODING_DIM), dtype=np.float32)
+        owners = np.searchsorted(self._offsets, positions, side='right') - 1
+        for owner in np.unique(owners):
+            selected = owners == owner
+            rows[selected] = self.segments[owner].take(positions[selected] - self._offsets[owner])
+        return rows
+
+    def squared_norms(self):
+        """
+        Kuadrat norma semua baris (termasuk tombstone), sudah dihitung oleh setiap segmen.
+        """
+        if not self.segments:
+            return np.empty(0, dtype=np.float32)
+        return np.concatenate([segment.squared_norms() for segment in self.segments])
+
+    def added(self, vectors):
+        new_segment = BruteForceIndex(vectors)
+        return SegmentedIndex(self.segments + [new_segment],
+                              np.concatenate([self.dead, np.zeros(len(new_segment), dtype=bool)]))
+
+    def filtered(self, keep):
+        segments = [segment.filtered(keep[start:end])
+                    for segment, start, end in zip(self.segments, self._offsets[:-1], self._offsets[1:])]
+        return SegmentedIndex(segments, self.dead[keep])
+
+    def search(self, query, k=1):
+        found_positions, found_distances = [], []
+        for segment, start, dead_count in zip(self.segments, self._offsets, self._dead_counts):
+            # Ambil kandidat lebih banyak sebanyak tombstone di segmen agar tetap tersisa k yang hidup
+            positions, distances = segment.search(query, k + dead_count)
+            positions = positions + start
+            alive = ~self.dead[positions]
+            found_positions.append(positions[alive])
+            found_distances.append(distances[alive])
+        if not found_positions:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        positions, distances = np.concatenate(found_positions), np.concatenate(found_distances)
+        order = np.argsort(distances)[:k]
+        return positions[order], distances[order]
+
+    def search_many(self, queries, k=1):
+        queries = _as_matrix(queries)
+        width = min(k, len(self) - int(self.dead.sum()))
+        if width <= 0:
+            return np.empty((len(queries), 0), dtype=np.int64), np.empty((len(queries), 0), dtype=np.float64)
+
+        blocks_positions, blocks_distances = [], []
+        for segment, start, dead_count in zip(self.segments, self._offsets, self._dead_counts):
+            positions, distances = segment.search_many(queries, k + dead_count)
+            valid = positions >= 0
+            positions = np.where(valid, positions + start, -1)
+            alive = valid & ~self.dead[np.where(valid, positions, 0)]
+            blocks_positions.append(np.where(alive, positions, -1))
+            blocks_distances.append(np.where(alive, distances, np.inf))
+        positions, distances = np.hstack(blocks_positions), np.hstack(blocks_distances)
+        order = np.argsort(distances, axis=1)[:, :width]
+        return np.take_along_axis(positions, order, axis=1), np.take_along_axis(distances, order, axis=1)
+
+
+def _nearest_centroid(vectors, centroids, chunk_size=65536):
+    """
+    Mengembalikan indeks centroid terdekat untuk setiap vektor (diproses per blok agar hemat memori).
+    """
+    centroid_sq_norms = _squared_norms(centroids)
+    labels = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), chunk_size):
+        block = vectors[start:start + chunk_size]
+        distances = centroid_sq_norms[None, :] - 2.0 * (block @ centroids.T)
+        labels[start:start + chunk_size] = np.argmin(distances, axis=1)
+    return labels
+
+def _kmeans(vectors, nlist, iterations, seed, max_sample=50000):
+    """
+    K-means sederhana berbasis numpy, dilatih pada sampel vektor.
+    """
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), max(nlist * 64, 1), max_sample)
+    sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        labels = _nearest_centroid(sample, centroids)
+        order = np.argsort(labels, kind='stable')
+        counts = np.bincount(labels, minlength=nlist)
+        nonempty = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts)])[nonempty]
+        sums = np.add.reduceat(sample[order], starts, axis=0)
+        centroids[nonempty] = sums / counts[nonempty, None]
+        # Cluster kosong diisi ulang dengan titik acak dari sampel
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = sample[rng.choice(len(sample), len(empty))]
+    return centroids
+
+
+# --- Pembuatan, penyimpanan, dan evaluasi index ---
+def make_index(vectors, backend=None):
+    """
+    Membuat index sesuai backend yang dikonfigurasi ('brute' atau 'ivf').
+    Untuk IVF, centroid dimuat dari FACE_INDEX_PATH jika ada agar tidak perlu dilatih ulang,
+    dan disimpan ke sana setelah pelatihan baru.
+    """
+    backend = backend or FACE_INDEX_BACKEND
+    if backend == 'brute':
+        return BruteForceIndex(vectors)
+    if backend != 'ivf':
+        raise ValueError(f"Backend index tidak dikenal: {backend}")
+
+    if FACE_INDEX_PATH and os.path.exists(FACE_INDEX_PATH):
+        saved = load_index(FACE_INDEX_PATH)
+        if isinstance(saved, IVFIndex) and saved.trained:
+            return saved.rebuilt(_as_matrix(vectors))
+
+    index = IVFIndex.train(vectors)
+    if FACE_INDEX_PATH and index.trained:
+        index.save(FACE_INDEX_PATH)
+    return index
+
+def load_index(path):
+    """
+    Memuat index yang disimpan dengan save().
+    """
+    with np.load(path, allow_pickle=False) as data:
+        backend = str(data['backend'])
+        if backend == 'brute':
+            return BruteForceIndex(data['vectors'])
+        if 'centroids' in data:
+            return IVFIndex(data['vectors'], data['centroids'], data['assignments'], int(data['nprobe']))
+        return IVFIndex(data['vectors'], nprobe=int(data['nprobe']))
+
+def evaluate_index(index, queries, k=1, reference=None):
+    """
+    Mengukur recall@k (dibandingkan brute-force eksak) dan latensi pencarian sebuah index.
+    Mengembalikan dictionary yang siap dicetak atau disimpan sebagai JSON.
+    """
+    reference = reference or BruteForceIndex(index.vectors, index._sq_norms)
+    hits, latencies = 0, []
+    for query in queries:
+        start = time.perf_counter()
+        positions, _ = index.search(query, k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        truth, _ = reference.search(query, k)
+        hits += len(set(positions.tolist()) & set(truth.tolist()))
+
+    latencies = np.asarray(latencies)
+    return {
+        'backend': index.backend,
+        'size': len(index),
+        'queries': len(queries),
+        'k': k,
+        'recall': hits / max(1, len(queries) * k),
+        'latency_ms': {
+            'mean': float(latencies.mean()),
+            'p50': float(np.percentile(latencies, 50)),
+            'p95': float(np.percentile(latencies, 95)),
+            'p99': float(np.percentile(latencies, 99)),
+        },
+    }
+
+
+if __name__ == '__main__':
+    # Evaluasi cepat dengan galeri sintetis: python face_index.py [jumlah_encoding] [jumlah_query]
+    import json
+    import sys
+
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    rng = np.random.default_rng(42)
+    vectors = rng.normal(0, 0.1, (size, ENCODING_DIM)).astype(np.float32)
+    queries = vectors[rng.choice(size, n_queries, replace=False)] + rng.normal(0, 0.02, (n_queries, ENCODING_DIM))
+
+    brute = BruteForceIndex(vectors)
+    start = time.perf_counter()
+    ivf = IVFIndex.train(vectors)
+    print(f"Pelatihan IVF: {time.perf_counter() - start:.2f} detik")
+    for index in (brute, ivf):
+        print(json.dumps(evaluate_index(index, queries, reference=brute), indent=2))
@@ -0,0 +1,185 @@
+import os
+import numpy as np
+
+from face_index import make_index, ENCODING_DIM
+
+# --- Template Wajah per Mahasiswa (bisa diubah lewat environment variable) ---
+# Mahasiswa boleh mendaftarkan banyak foto, tetapi pencarian di galeri global tidak memeriksa
+# setiap foto: setiap mahasiswa diwakili beberapa template (centroid + perwakilan yang saling
+# berjauhan, tanpa foto outlier). Template terdekat menentukan kandidat mahasiswa, lalu jarak
+# eksak dihitung terhadap semua foto (inlier) kandidat tersebut. Biaya pencocokan jadi
+# sebanding jumlah mahasiswa, bukan jumlah foto.
+#
+# FACE_TEMPLATES: '1' = aktifkan pencocokan lewat template, '0' = bandingkan setiap foto
+# FACE_TEMPLATES_PER_STUDENT: jumlah template maksimum per mahasiswa (termasuk centroid)
+# FACE_TEMPLATE_OUTLIER_DISTANCE: foto yang jaraknya ke median foto-foto mahasiswa itu melebihi
+#                                 nilai ini dianggap outlier (misalnya foto orang lain) dan diabaikan
+# FACE_TEMPLATE_CANDIDATES: jumlah template terdekat yang diperiksa sebelum diperhalus
+FACE_TEMPLATES = os.environ.get('FACE_TEMPLATES', '1') == '1'
+FACE_TEMPLATES_PER_STUDENT = int(os.environ.get('FACE_TEMPLATES_PER_STUDENT', '3'))
+FACE_TEMPLATE_OUTLIER_DISTANCE = float(os.environ.get('FACE_TEMPLATE_OUTLIER_DISTANCE', '0.5'))
+FACE_TEMPLATE_CANDIDATES = int(os.environ.get('FACE_TEMPLATE_CANDIDATES', '10'))
+
+def student_templates(encodings, max_templates=FACE_TEMPLATES_PER_STUDENT,
+                      outlier_distance=FACE_TEMPLATE_OUTLIER_DISTANCE):
+    """
+    Template satu mahasiswa dari encoding semua fotonya.
+    Mengembalikan (template K x 128, mask inlier per foto).
+    """
+    encodings = np.asarray(encodings, dtype=np.float32)
+    inlier = np.ones(len(encodings), dtype=bool)
+    if len(encodings) >= 3:
+        # Median tahan terhadap satu-dua foto yang salah, rata-rata tidak
+        center = np.median(encodings, axis=0)
+        inlier = np.linalg.norm(encodings - center, axis=1) <= outlier_distance
+        if not inlier.any():
+            inlier[:] = True
+    members = encodings[inlier]
+    if len(members) <= max_templates:
+        return members, inlier
+
+    # Centroid ditambah perwakilan farthest-point: setiap template berikutnya adalah foto
+    # yang paling jauh dari semua template yang sudah dipilih, sehingga sebaran pose/cahaya tercakup
+    centroid = members.mean(axis=0)
+    templates = [centroid]
+    nearest = np.linalg.norm(members - centroid, axis=1)
+    for _ in range(max_templates - 1):
+        farthest = int(np.argmax(nearest))
+        templates.append(members[farthest])
+        nearest = np.minimum(nearest, np.linalg.norm(members - members[farthest], axis=1))
+    return np.vstack(templates), inlier
+
+# Resolusi fixed-point kuadrat norma encoding di tanda tangan (penjumlahan integer tidak bergantung urutan baris)
+SIGNATURE_NORM_SCALE = 1e9
+
+def _group_by_student(face_ids, student_ids, sq_norms):
+    """
+    Mengelompokkan posisi baris galeri per mahasiswa (baris dengan student_id < 0 dilewati).
+    Mengembalikan (student unik, offset, posisi terurut per mahasiswa, tanda tangan per mahasiswa)
+    dengan tanda tangan = (jumlah foto, jumlah id, jumlah id^2, jumlah kuadrat norma encoding)
+    untuk mendeteksi perubahan. Kolom terakhir menangkap encoding yang diperbarui di tempat
+    (id foto sama, vektor berbeda) tanpa membaca ulang vektornya.
+    """
+    valid = np.flatnonzero(student_ids >= 0)
+    order = valid[np.argsort(student_ids[valid], kind='stable')]
+    students, starts, counts = np.unique(student_ids[order], return_index=True, return_counts=True)
+    offsets = np.append(starts, len(order)).astype(np.int64)
+    if len(order) == 0:
+        return students, offsets, order, np.empty((0, 4), dtype=np.int64)
+    ids = face_ids[order].astype(np.int64)
+    norms = np.round(np.asarray(sq_norms, dtype=np.float64)[order] * SIGNATURE_NORM_SCALE).astype(np.int64)
+    signature = np.stack([counts, np.add.reduceat(ids, starts), np.add.reduceat(ids * ids, starts),
+                          np.add.reduceat(norms, starts)], axis=1)
+    return students, offsets, order, signature
+
+
+class TemplateSet:
+    """
+    Template semua mahasiswa untuk satu snapshot galeri, beserta index pencarian template-nya.
+    Immutable seperti index: perubahan galeri menghasilkan TemplateSet baru lewat build(previous=...).
+    """
+    def __init__(self, index, template_students, students, offsets, order, signature, outlier_face_ids, face_ids):
+        self.index = index
+        self.template_students = template_students
+        self.students = students
+        self.offsets = offsets
+        self.order = order
+        self.signature = signature
+        self.outlier_face_ids = outlier_face_ids
+        self._outlier_rows = np.isin(face_ids, outlier_face_ids)
+
+    def __len__(self):
+        return len(self.template_students)
+
+    @classmethod
+    def build(cls, gallery_index, face_ids, student_ids, previous=None, backend=None):
+        """
+        Membangun template dari snapshot galeri. Dengan previous, hanya mahasiswa yang kumpulan
+        fotonya atau encoding fotonya berubah yang dihitung ulang; template mahasiswa lain dipakai kembali.
+        """
+        students, offsets, order, signature = _group_by_student(face_ids, student_ids,
+                                                                gallery_index.squared_norms())
+        if previous is None:
+            changed = students
+            removed = np.empty(0, dtype=np.int64)
+        else:
+            at = np.clip(np.searchsorted(previous.students, students), 0, max(len(previous.students) - 1, 0))
+            same = np.zeros(len(students), dtype=bool)
+            if len(previous.students):
+                same = (previous.students[at] == students) & (previous.signature[at] == signature).all(axis=1)
+            changed = students[~same]
+            removed = previous.students[~np.isin(previous.students, students)]
+
+        # Mahasiswa dengan satu foto (kasus terbanyak) cukup memakai foto itu sebagai template
+        counts = np.diff(offsets)
+        changed_at = np.searchsorted(students, changed)
+        single = counts[changed_at] == 1
+        new_templates = [gallery_index.take(order[offsets[changed_at[single]]])]
+        new_owners = [changed[single]]
+        new_outliers = []
+        for at in changed_at[~single]:
+            positions = order[offsets[at]:offsets[at + 1]]
+            templates, inlier = student_templates(gallery_index.take(positions))
+            new_templates.append(templates)
+            new_owners.append(np.full(len(templates), students[at], dtype=np.int64))
+            new_outliers.append(face_ids[positions[~inlier]])
+        new_templates = np.vstack(new_templates).astype(np.float32)
+        new_owners = np.concatenate(new_owners).astype(np.int64)
+        new_outliers = np.concatenate(new_outliers) if new_outliers else np.empty(0, dtype=np.int64)
+
+        if previous is None:
+            index = make_index(new_templates, backend)
+            template_students = new_owners
+            outlier_face_ids = new_outliers
+        else:
+            stale = np.concatenate([changed, removed])
+            keep = ~np.isin(previous.template_students, stale)
+            index = previous.index
+            if not keep.all():
+                index = index.filtered(keep)
+            if len(new_owners):
+                index = index.added(new_templates)
+            template_students = np.concatenate([previous.template_students[keep], new_owners])
+            # Outlier lama milik mahasiswa yang berubah sudah dihitung ulang di new_outliers
+            stale_faces = face_ids[np.isin(student_ids, stale)]
+            old_outliers = previous.outlier_face_ids[~np.isin(previous.outlier_face_ids, stale_faces)]
+            outlier_face_ids = np.concatenate([old_outliers, new_outliers])
+        return cls(index, template_students, students, offsets, order, signature,
+                   np.unique(outlier_face_ids), face_ids)
+
+    def candidate_rows(self, candidate_students):
+        """
+        Posisi baris galeri (tanpa outlier) milik setiap kandidat, digabung dengan array pemiliknya.
+        """
+        at = np.searchsorted(self.students, candidate_students)
+        rows = [self.order[self.offsets[i]:self.offsets[i + 1]] for i in at]
+        owners = [np.full(len(r), student, dtype=np.int64) for r, student in zip(rows, candidate_students)]
+        rows, owners = np.concatenate(rows), np.concatenate(owners)
+        keep = ~self._outlier_rows[rows]
+        return rows[keep], owners[keep]
+
+    def nearest_students(self, gallery_index, queries, candidates=FACE_TEMPLATE_CANDIDATES):
+        """
+        Untuk setiap query: kandidat mahasiswa dari template terdekat, lalu jarak eksak ke semua foto
+        inlier kandidat tersebut (jarak terkecil per mahasiswa).
+        Mengembalikan list per query berisi (student_id, jarak) terurut dari yang paling dekat.
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        if len(self) == 0:
+            return [[] for _ in queries]
+        positions, _ = self.index.search_many(queries, k=candidates)
+        results = []
+        for query, row_positions in zip(queries, positions):
+            candidate_students = list(dict.fromkeys(self.template_students[row_positions[row_positions >= 0]]))
+            if not candidate_students:
+                results.append([])
+                continue
+            rows, owners = self.candidate_rows(np.asarray(candidate_students, dtype=np.int64))
+            diff = gallery_index.take(rows).astype(np.float64) - query
+            distances = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+            best = {}
+            for owner, distance in zip(owners.tolist(), distances.tolist()):
+                if distance < best.get(owner, np.inf):
+                    best[owner] = distance
+            results.append(sorted(best.items(), key=lambda item: item[1]))
+        return results
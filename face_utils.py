@@ -1,21 +1,41 @@
 import os
-import cv2
-import face_recognition
+import io
+import base64
 import numpy as np
 import pickle # Untuk menyimpan dan memuat encoding jika Anda tetap ingin file
-import boto3 # Untuk interaksi dengan AWS S3
-from botocore.exceptions import NoCredentialsError, ClientError
+from storage import get_storage, StorageError, ObjectNotFound # Lapisan penyimpanan S3/lokal + cache
+from metrics import span # Timing per tahap untuk /metrics dan header Server-Timing
 
 # --- Ambil konfigurasi S3 dari app ---
-# Pastikan app sudah terimport atau dilewatkan sebagai parameter
-# Jika app diimport, pastikan lingkaran impor tidak terjadi.
-# Cara terbaik adalah meneruskan config S3 atau inisialisasi client di sini
-# atau mengambil dari environment variables langsung.
-S3_BUCKET_NAME = os.environ.get('S3_BUCKET_NAME')
-S3_REGION = os.environ.get('S3_REGION', 'ap-southeast-1') # Default region
-# Inisialisasi klien S3. Jika Anda menggunakan IAM Role di EC2, kredensial tidak perlu diset di kode.
-# Jika tidak, Anda perlu: aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'), aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY')
-s3_client = boto3.client('s3', region_name=S3_REGION)
+# Konfigurasi bucket, region, connection pool, dan cache disk diambil dari environment
+# variables oleh storage.py. Klien S3 dibuat sekali per proses saat pertama kali dipakai.
+# Jika Anda menggunakan IAM Role di EC2, kredensial tidak perlu diset di kode.
+
+# --- Pemuatan pustaka pengenalan secara malas ---
+# cv2 dan face_recognition (dlib beserta modelnya, ratusan MB) baru di-import di dalam fungsi
+# yang memakainya, sehingga script CLI, migrasi, dan halaman admin/login tidak ikut memuatnya.
+# Proses yang memang mengenali wajah bisa memuatnya di muka lewat warm_up_models().
+
+# --- Format penyimpanan encoding di database ---
+# 128 angka float32 little-endian mentah (512 byte). Versi format ikut disimpan di kolom
+# FaceData.face_encoding_format supaya perubahan format di masa depan bisa dideteksi.
+FACE_ENCODING_FORMAT = 'f32le-v1'
+FACE_ENCODING_DTYPE = np.dtype('<f4')
+FACE_ENCODING_DIM = 128
+
+def encoding_to_bytes(face_encoding):
+    """
+    Mengubah encoding wajah (numpy array float64 dari face_recognition) menjadi 512 byte float32.
+    """
+    return np.asarray(face_encoding, dtype=FACE_ENCODING_DTYPE).reshape(FACE_ENCODING_DIM).tobytes()
+
+def encodings_from_bytes(blobs):
+    """
+    Menggabungkan banyak blob encoding menjadi satu matriks float32 N x 128.
+    Blob digabung sekali, lalu dibaca dengan np.frombuffer tanpa salinan tambahan per baris.
+    """
+    buffer = b''.join(blobs)
+    return np.frombuffer(buffer, dtype=FACE_ENCODING_DTYPE).reshape(-1, FACE_ENCODING_DIM)
 
 # --- Fungsi untuk mengunggah file ke S3 ---
 def upload_file_to_s3(file_path, s3_object_key):
@@ -24,23 +44,12 @@ def upload_file_to_s3(file_path, s3_object_key):
     Mengembalikan URL publik S3 jika berhasil, None jika gagal.
     """
     try:
-        s3_client.upload_file(file_path, S3_BUCKET_NAME, s3_object_key)
-        # Bentuk URL publik S3
-        s3_url = f"https://{S3_BUCKET_NAME}.s3.{S3_REGION}.amazonaws.com/{s3_object_key}"
-        print(f"File {file_path} berhasil diunggah ke {s3_url}")
-        return s3_url
+        with open(file_path, 'rb') as f:
+            data = f.read()
     except FileNotFoundError:
         print(f"Error: File '{file_path}' tidak ditemukan.")
         return None
-    except NoCredentialsError:
-        print("Error: Kredensial AWS tidak ditemukan.")
-        return None
-    except ClientError as e:
-        print(f"Error S3 client: {e}")
-        return None
-    except Exception as e:
-        print(f"Error tak terduga saat mengunggah ke S3: {e}")
-        return None
+    return upload_bytes_to_s3(data, s3_object_key, 'application/octet-stream')
 
 # --- Fungsi untuk mendownload file dari S3 ---
 def download_file_from_s3(s3_object_key, local_path):
@@ -48,63 +57,340 @@ def download_file_from_s3(s3_object_key, local_path):
     Mendownload file dari bucket S3 ke path lokal sementara.
     Mengembalikan True jika berhasil, False jika gagal.
     """
-    try:
-        s3_client.download_file(S3_BUCKET_NAME, s3_object_key, local_path)
-        print(f"File {s3_object_key} berhasil diunduh ke {local_path}")
-        return True
-    except ClientError as e:
-        if e.response['Error']['Code'] == '404':
-            print(f"Error: Objek S3 '{s3_object_key}' tidak ditemukan.")
-        else:
-            print(f"Error S3 client saat mengunduh: {e}")
-        return False
-    except NoCredentialsError:
-        print("Error: Kredensial AWS tidak ditemukan.")
+    buffer = download_bytes_from_s3(s3_object_key)
+    if buffer is None:
         return False
+    with open(local_path, 'wb') as f:
+        f.write(buffer.getbuffer())
+    print(f"File {s3_object_key} berhasil diunduh ke {local_path}")
+    return True
+
+# --- Fungsi untuk mengunggah bytes di memori ke S3 (tanpa file sementara) ---
+def upload_bytes_to_s3(data, s3_object_key, content_type='image/jpeg'):
+    """
+    Mengunggah bytes langsung dari memori ke bucket S3.
+    Mengembalikan URL publik S3 jika berhasil, None jika gagal.
+    """
+    try:
+        storage = get_storage()
+        storage.put_bytes(s3_object_key, data, content_type)
+        s3_url = storage.url_for(s3_object_key)
+        print(f"{len(data)} byte berhasil diunggah ke {s3_url}")
+        return s3_url
+    except StorageError as e:
+        print(f"Error S3 saat mengunggah: {e}")
+        return None
+    except Exception as e:
+        print(f"Error tak terduga saat mengunggah ke S3: {e}")
+        return None
+
+# --- Fungsi untuk mendownload objek S3 langsung ke memori ---
+def download_bytes_from_s3(s3_object_key):
+    """
+    Mengambil objek S3 ke BytesIO di memori (lewat cache disk jika diaktifkan).
+    Mengembalikan BytesIO jika berhasil, None jika gagal.
+    """
+    try:
+        data, _ = get_storage().get_bytes(s3_object_key)
+        return io.BytesIO(data)
+    except ObjectNotFound:
+        print(f"Error: Objek S3 '{s3_object_key}' tidak ditemukan.")
+        return None
+    except StorageError as e:
+        print(f"Error S3 saat mengunduh: {e}")
+        return None
     except Exception as e:
         print(f"Error tak terduga saat mengunduh dari S3: {e}")
-        return False
+        return None
+
+def s3_key_from_url(s3_url):
+    """
+    Mengambil object key dari URL S3 (path setelah nama host bucket).
+    """
+    key = get_storage().key_from_url(s3_url)
+    return key if key is not None else '/'.join(s3_url.split('/')[3:])
+
+# --- Fungsi untuk membaca dan men-decode gambar langsung dari memori ---
+def read_image_bytes(source):
+    """
+    Mengambil bytes mentah gambar dari FileStorage/file-like, data URL base64
+    (seperti yang dikirim static/js/main.js), string base64, atau bytes.
+    """
+    if hasattr(source, 'read'):
+        return source.read()
+    if isinstance(source, str):
+        if source.startswith('data:'):
+            source = source.split(',', 1)[1] # Buang prefix 'data:image/jpeg;base64,'
+        return base64.b64decode(source)
+    return source
+
+def decode_image(image_bytes):
+    """
+    Men-decode bytes gambar (JPEG/PNG) menjadi array BGR dengan cv2.imdecode.
+    Buffer dibaca lewat memoryview sehingga tidak ada salinan atau file sementara.
+    Mengembalikan None jika bytes bukan gambar yang valid.
+    """
+    import cv2
+    if not image_bytes:
+        return None
+    buffer = np.frombuffer(memoryview(image_bytes), dtype=np.uint8)
+    with span('decode'):
+        return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+def warm_up_models():
+    """
+    Memuat cv2, dlib, dan model deteksi/encoding sekarang juga (bukan saat presensi pertama),
+    lalu menjalankan satu deteksi dan encoding pada gambar kosong.
+    Dipanggil oleh worker pool pengenalan dan oleh hook preload gunicorn (gunicorn.conf.py).
+    """
+    import face_recognition
+    blank = np.zeros((150, 150, 3), dtype=np.uint8)
+    face_recognition.face_locations(blank)
+    face_recognition.face_encodings(blank, [(25, 125, 125, 25)])
+
+# --- Pengaturan Deteksi Wajah (bisa diubah lewat environment variable) ---
+# FACE_DETECTION_MODEL: 'hog' (CPU, cepat) atau 'cnn' (lebih akurat, butuh GPU)
+# FACE_DETECTION_MAX_WIDTH: lebar maksimum salinan gambar untuk deteksi (0 = resolusi penuh)
+# FACE_DETECTION_UPSAMPLE: berapa kali gambar deteksi di-upsample oleh dlib
+# FACE_DETECTION_MIN_FACE: lebar wajah terkecil (piksel resolusi asli) yang harus tetap terdeteksi;
+#   salinan deteksi tidak diperkecil melebihi batas ini meskipun FACE_DETECTION_MAX_WIDTH lebih kecil
+# FACE_ENCODING_JITTERS: jumlah re-sampling saat encoding (lebih besar = lebih stabil, lebih lambat)
+# Detektor HOG dlib hanya menemukan wajah selebar minimal ~80 piksel pada gambar yang diperiksanya;
+# setiap upsample menurunkan batas itu setengahnya dengan biaya ~4x piksel. Dengan default
+# (lebar 320, upsample 1) frame 640 px dari browser tetap menangkap wajah selebar 80 px.
+FACE_DETECTION_MODEL = os.environ.get('FACE_DETECTION_MODEL', 'hog')
+FACE_DETECTION_MAX_WIDTH = int(os.environ.get('FACE_DETECTION_MAX_WIDTH', '320'))
+FACE_DETECTION_UPSAMPLE = int(os.environ.get('FACE_DETECTION_UPSAMPLE', '1'))
+FACE_DETECTION_MIN_FACE = int(os.environ.get('FACE_DETECTION_MIN_FACE', '80'))
+HOG_MIN_FACE_SIZE = 80 # Ukuran jendela deteksi HOG dlib (piksel)
+FACE_ENCODING_JITTERS = int(os.environ.get('FACE_ENCODING_JITTERS', '1'))
+FACE_CROP_MARGIN = 0.5 # Margin potongan wajah relatif terhadap ukuran kotak wajah
+
+# Mode kamera kelas: wajah di foto satu ruangan jauh lebih kecil, jadi deteksi memakai
+# salinan yang lebih besar dan upsample dlib (lebih lambat, tapi hanya sekali per frame)
+# FACE_CLASSROOM_MAX_WIDTH: lebar maksimum salinan gambar untuk deteksi (0 = resolusi penuh)
+# FACE_CLASSROOM_UPSAMPLE: berapa kali gambar deteksi di-upsample oleh dlib
+# FACE_CLASSROOM_MAX_FACES: batas jumlah wajah yang diproses per frame
+FACE_CLASSROOM_MAX_WIDTH = int(os.environ.get('FACE_CLASSROOM_MAX_WIDTH', '1600'))
+FACE_CLASSROOM_UPSAMPLE = int(os.environ.get('FACE_CLASSROOM_UPSAMPLE', '1'))
+FACE_CLASSROOM_MAX_FACES = int(os.environ.get('FACE_CLASSROOM_MAX_FACES', '100'))
+
+def detection_scale(width, max_width=FACE_DETECTION_MAX_WIDTH, upsample=FACE_DETECTION_UPSAMPLE,
+                    min_face=FACE_DETECTION_MIN_FACE):
+    """
+    Faktor pengecilan gambar untuk deteksi: sekecil mungkin sampai lebar max_width, tetapi wajah
+    selebar min_face piksel harus tetap sebesar jendela HOG setelah upsample.
+    """
+    if not max_width or width <= max_width:
+        return 1.0
+    scale = max_width / width
+    if min_face:
+        scale = max(scale, HOG_MIN_FACE_SIZE / (2 ** upsample) / min_face)
+    return min(1.0, scale)
+
+def detect_faces(image, max_width=FACE_DETECTION_MAX_WIDTH, upsample=FACE_DETECTION_UPSAMPLE,
+                 min_face=FACE_DETECTION_MIN_FACE):
+    """
+    Mendeteksi semua wajah pada salinan gambar BGR yang diperkecil lalu memetakan
+    kotaknya kembali ke resolusi penuh. Mengembalikan list (top, right, bottom, left).
+    """
+    import cv2
+    import face_recognition
+    height, width = image.shape[:2]
+    scale = detection_scale(width, max_width, upsample, min_face)
+    small_image = image
+    if scale < 1.0:
+        small_image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    # Konversi gambar dari BGR (OpenCV) ke RGB (face_recognition), hanya untuk salinan kecil
+    small_rgb = cv2.cvtColor(small_image, cv2.COLOR_BGR2RGB)
+    with span('detect'):
+        face_locations = face_recognition.face_locations(
+            small_rgb, number_of_times_to_upsample=upsample, model=FACE_DETECTION_MODEL)
+    return [(max(0, int(top / scale)), min(width, int(right / scale)),
+             min(height, int(bottom / scale)), max(0, int(left / scale)))
+            for top, right, bottom, left in face_locations]
+
+def detect_largest_face(image):
+    """
+    Mendeteksi wajah pada salinan gambar BGR yang diperkecil, memilih wajah terbesar,
+    lalu memetakan kotaknya kembali ke resolusi penuh.
+    Mengembalikan (top, right, bottom, left) atau None jika tidak ada wajah.
+    """
+    face_locations = detect_faces(image)
+    if not face_locations:
+        return None
+    return max(face_locations, key=lambda box: (box[2] - box[0]) * (box[1] - box[3]))
+
+def encode_face(image, face_location):
+    """
+    Memotong area wajah (plus margin) dari gambar BGR resolusi penuh lalu menghitung encoding-nya.
+    """
+    import cv2
+    import face_recognition
+    height, width = image.shape[:2]
+    top, right, bottom, left = face_location
+    margin_y = int((bottom - top) * FACE_CROP_MARGIN)
+    margin_x = int((right - left) * FACE_CROP_MARGIN)
+    y0, y1 = max(0, top - margin_y), min(height, bottom + margin_y)
+    x0, x1 = max(0, left - margin_x), min(width, right + margin_x)
+
+    face_crop = np.ascontiguousarray(cv2.cvtColor(image[y0:y1, x0:x1], cv2.COLOR_BGR2RGB))
+    crop_location = (top - y0, right - x0, bottom - y0, left - x0)
+    with span('encode'):
+        face_encodings = face_recognition.face_encodings(face_crop, [crop_location], num_jitters=FACE_ENCODING_JITTERS)
+    return face_encodings[0] if face_encodings else None
+
+def encode_faces(image, face_locations):
+    """
+    Menghitung encoding semua wajah dalam SATU panggilan face_encodings pada gambar resolusi penuh
+    (konversi ke RGB dilakukan sekali untuk seluruh frame). Mengembalikan array float32 M x 128.
+    """
+    import cv2
+    import face_recognition
+    if not face_locations:
+        return np.empty((0, FACE_ENCODING_DIM), dtype=np.float32)
+    rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    with span('encode'):
+        face_encodings = face_recognition.face_encodings(rgb_image, face_locations, num_jitters=FACE_ENCODING_JITTERS)
+    return np.asarray(face_encodings, dtype=np.float32).reshape(-1, FACE_ENCODING_DIM)
+
+def get_all_face_encodings(image):
+    """
+    Mode kamera kelas: mendeteksi dan meng-encode semua wajah dalam satu frame BGR.
+    Wajah terbesar diproses lebih dulu jika jumlahnya melebihi FACE_CLASSROOM_MAX_FACES.
+    Mengembalikan (list lokasi wajah, array encoding M x 128).
+    """
+    face_locations = detect_faces(image, FACE_CLASSROOM_MAX_WIDTH, FACE_CLASSROOM_UPSAMPLE, min_face=0)
+    face_locations = sorted(face_locations, key=lambda box: (box[2] - box[0]) * (box[1] - box[3]),
+                            reverse=True)[:FACE_CLASSROOM_MAX_FACES]
+    return face_locations, encode_faces(image, face_locations)
+
+# --- Pemeriksaan Kualitas Frame (bisa diubah lewat environment variable) ---
+# Dijalankan sebelum encoding dlib agar frame yang pasti gagal (buram, gelap, tanpa wajah,
+# wajah terlalu jauh) ditolak dengan pesan yang jelas tanpa membuang CPU dlib.
+# Semua ukuran dihitung pada salinan grayscale selebar FACE_DETECTION_MAX_WIDTH.
+# FACE_QUALITY_GATE: '1' = aktifkan pemeriksaan, '0' = langsung ke dlib
+# FACE_MIN_BRIGHTNESS / FACE_MAX_BRIGHTNESS: batas rata-rata kecerahan frame (0-255)
+# FACE_MIN_SHARPNESS: batas bawah variansi Laplacian di area wajah (makin kecil = makin buram)
+# FACE_MIN_FACE_SIZE: lebar minimum kotak wajah dalam piksel resolusi asli
+# Trade-off penolakan palsu: Haar cascade (minNeighbors=4) melewatkan wajah yang masih terdeteksi
+# dlib (miring, berkacamata, cahaya dari samping). Karena itu cascade hanya sinyal murah: jika ia
+# tidak menemukan wajah, deteksi dlib (detect_faces) tetap dijalankan sebelum frame ditolak 'no_face'.
+# Frame yang memang tanpa wajah tetap membayar satu deteksi dlib, sedangkan wajah yang dapat dikenali
+# dlib tidak pernah ditolak oleh gate ini. Batas FACE_MIN_* yang terlalu ketat juga menolak frame yang
+# sebenarnya masih bisa dikenali; longgarkan jika pesan 'buram'/'terlalu gelap' sering muncul.
+FACE_QUALITY_GATE = os.environ.get('FACE_QUALITY_GATE', '1') == '1'
+FACE_MIN_BRIGHTNESS = float(os.environ.get('FACE_MIN_BRIGHTNESS', '40'))
+FACE_MAX_BRIGHTNESS = float(os.environ.get('FACE_MAX_BRIGHTNESS', '225'))
+FACE_MIN_SHARPNESS = float(os.environ.get('FACE_MIN_SHARPNESS', '30'))
+FACE_MIN_FACE_SIZE = int(os.environ.get('FACE_MIN_FACE_SIZE', '60'))
+
+# Ukuran dan kualitas JPEG yang diminta dari browser (lihat static/js/main.js); frame yang lebih
+# besar dari ini tidak menambah akurasi karena deteksi tetap memakai salinan selebar FACE_DETECTION_MAX_WIDTH
+# FACE_UPLOAD_MAX_WIDTH: lebar maksimum frame yang dikirim browser
+# FACE_UPLOAD_JPEG_QUALITY: kualitas JPEG dari browser (0-1)
+FACE_UPLOAD_MAX_WIDTH = int(os.environ.get('FACE_UPLOAD_MAX_WIDTH', '640'))
+FACE_UPLOAD_JPEG_QUALITY = float(os.environ.get('FACE_UPLOAD_JPEG_QUALITY', '0.8'))
+
+_face_cascade = None
+
+def _get_face_cascade():
+    """
+    Detektor Haar cascade bawaan OpenCV (jauh lebih murah dari HOG dlib), dimuat sekali per proses.
+    Mengembalikan False jika build OpenCV tidak menyertakannya (misalnya OpenCV 5 tanpa contrib);
+    pemeriksaan wajah lalu diserahkan ke deteksi dlib.
+    """
+    global _face_cascade
+    if _face_cascade is None:
+        import cv2
+        cascade_dir = getattr(getattr(cv2, 'data', None), 'haarcascades', None)
+        _face_cascade = False
+        if hasattr(cv2, 'CascadeClassifier') and cascade_dir:
+            cascade = cv2.CascadeClassifier(os.path.join(cascade_dir, 'haarcascade_frontalface_default.xml'))
+            if not cascade.empty():
+                _face_cascade = cascade
+    return _face_cascade
+
+def check_frame_quality(image):
+    """
+    Pemeriksaan murah sebelum dlib: kecerahan, ada wajah yang cukup besar (Haar cascade, dengan
+    deteksi dlib sebagai cadangan sebelum menolak 'no_face'), dan ketajaman area wajah (variansi Laplacian).
+    Mengembalikan None jika frame layak diproses, atau kode error
+    'too_dark', 'too_bright', 'no_face', 'face_too_small', atau 'blurry'.
+    """
+    import cv2
+    with span('quality'):
+        original = image
+        height, width = image.shape[:2]
+        scale = 1.0
+        if FACE_DETECTION_MAX_WIDTH and width > FACE_DETECTION_MAX_WIDTH:
+            scale = FACE_DETECTION_MAX_WIDTH / width
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+        brightness = float(gray.mean())
+        if brightness < FACE_MIN_BRIGHTNESS:
+            return 'too_dark'
+        if brightness > FACE_MAX_BRIGHTNESS:
+            return 'too_bright'
+
+        cascade = _get_face_cascade()
+        if cascade:
+            faces = cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=4)
+            if len(faces) == 0:
+                # Kotak dlib (resolusi asli) dipetakan ke salinan grayscale yang diperkecil
+                faces = [(int(left * scale), int(top * scale), int((right - left) * scale), int((bottom - top) * scale))
+                         for top, right, bottom, left in detect_faces(original)]
+            if len(faces) == 0:
+                return 'no_face'
+            x, y, w, h = max(faces, key=lambda box: box[2] * box[3])
+            if w / scale < FACE_MIN_FACE_SIZE:
+                return 'face_too_small'
+            region = gray[y:y + h, x:x + w]
+        else:
+            # Tanpa detektor cepat, ketajaman diukur di tengah frame (posisi wajah saat presensi)
+            height, width = gray.shape
+            region = gray[height // 4:height * 3 // 4, width // 4:width * 3 // 4]
+        if cv2.Laplacian(region, cv2.CV_64F).var() < FACE_MIN_SHARPNESS:
+            return 'blurry'
+    return None
 
 # --- Fungsi Utama untuk Mendapatkan Encoding dari Gambar ---
 def get_face_encoding(image_path):
     """
     Mengambil encoding wajah dari sebuah gambar.
-    image_path bisa berupa path lokal (jika sudah diunduh) atau URL/data stream.
-    Untuk deployment S3, Anda mungkin perlu mengunduh sementara atau memproses stream.
+    image_path bisa berupa array BGR yang sudah di-decode (lihat decode_image),
+    URL S3 (dialirkan ke memori, tanpa file sementara), atau path lokal.
     """
     try:
-        # Jika image_path adalah URL S3, Anda perlu mendownloadnya terlebih dahulu
-        # Atau jika Anda mengunggah bytes langsung, gunakan bytes langsung
-        if image_path.startswith("https://") and "s3.amazonaws.com" in image_path:
-            # Ekstrak object_key dari URL S3
-            s3_object_key = '/'.join(image_path.split('/')[3:]) # Dapatkan path setelah bucket
-            temp_local_path = os.path.join('/tmp', os.path.basename(s3_object_key))
-            if not download_file_from_s3(s3_object_key, temp_local_path):
+        if isinstance(image_path, np.ndarray):
+            # Gambar sudah di-decode dari bytes request, langsung dipakai
+            image = image_path
+        elif get_storage().key_from_url(image_path) is not None:
+            # Ambil objek S3 ke memori (atau dari cache disk) lalu decode langsung dari buffer
+            buffer = download_bytes_from_s3(get_storage().key_from_url(image_path))
+            if buffer is None:
                 print(f"Gagal mengunduh gambar wajah dari S3: {image_path}")
                 return None
-            image = cv2.imread(temp_local_path)
-            os.remove(temp_local_path) # Hapus file sementara
+            image = decode_image(buffer.getbuffer())
         else:
             # Asumsi image_path adalah path lokal
+            import cv2
             image = cv2.imread(image_path)
 
         if image is None:
-            print(f"Error: Tidak dapat membaca gambar dari {image_path}")
+            print("Error: Tidak dapat membaca gambar.")
             return None
 
-        # Konversi gambar dari BGR (OpenCV) ke RGB (face_recognition)
-        rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        
-        # Temukan semua wajah dalam gambar
-        face_locations = face_recognition.face_locations(rgb_image)
-        
-        if len(face_locations) == 0:
+        # Deteksi pada salinan yang diperkecil; keluar lebih awal jika tidak ada wajah
+        face_location = detect_largest_face(image)
+        if face_location is None:
             print("Tidak ada wajah yang terdeteksi dalam gambar.")
             return None
-        
-        # Ambil encoding wajah pertama (asumsi satu wajah per gambar registrasi)
-        face_encodings = face_recognition.face_encodings(rgb_image, face_locations)
-        return face_encodings[0] # Mengembalikan encoding wajah pertama
+
+        # Encoding hanya untuk wajah terbesar (asumsi satu wajah per gambar registrasi/presensi)
+        return encode_face(image, face_location)
 
     except Exception as e:
         print(f"Error saat mendapatkan encoding wajah: {e}")
@@ -130,6 +416,19 @@ def save_face_encoding_file(face_encoding, filename):
     os.remove(temp_local_path) # Hapus file sementara
     return s3_url
 
+# --- Fungsi untuk Memuat Satu Encoding dari S3 ---
+def load_face_encoding_from_s3(face_data_entry):
+    """
+    Mengunduh dan memuat encoding milik satu baris FaceData dari S3.
+    Mengembalikan numpy array encoding, None jika gagal.
+    """
+    s3_url = face_data_entry.face_image_s3_url
+    buffer = download_bytes_from_s3(s3_key_from_url(s3_url))
+    if buffer is None:
+        print(f"Gagal memuat encoding dari S3: {s3_url}")
+        return None
+    return pickle.load(buffer)
+
 # --- Fungsi untuk Memuat Semua Encoding yang Tersimpan dari S3 (untuk perbandingan) ---
 # Ini adalah bagian kritis untuk deteksi kehadiran.
 # Anda perlu memuat semua encoding yang sudah terdaftar.
@@ -148,40 +447,39 @@ def load_all_known_face_encodings_from_s3():
     all_face_data = FaceData.query.all() # Asumsi ini mengambil data wajah dari DB
     
     for face_data_entry in all_face_data:
-        s3_url = face_data_entry.face_image_s3_url
-        # Ekstrak object_key dari URL S3
-        s3_object_key = '/'.join(s3_url.split('/')[3:])
-        
-        temp_encoding_path = os.path.join('/tmp', os.path.basename(s3_object_key))
-        if download_file_from_s3(s3_object_key, temp_encoding_path):
-            with open(temp_encoding_path, 'rb') as f:
-                encoding = pickle.load(f)
+        encoding = load_face_encoding_from_s3(face_data_entry)
+        if encoding is not None:
             known_encodings.append(encoding)
             known_student_ids.append(face_data_entry.student_id) # Atau ID/nama yang sesuai
-            os.remove(temp_encoding_path) # Hapus file sementara
-        else:
-            print(f"Gagal memuat encoding dari S3: {s3_url}")
 
     return known_encodings, known_student_ids
 
 # --- Fungsi Verifikasi Wajah ---
-def verify_face(current_face_encoding, known_face_encodings, tolerance=0.6):
+def verify_face(current_face_encoding, known_face_encodings=None, tolerance=0.6, course_id=None):
     """
     Membandingkan encoding wajah saat ini dengan encoding yang diketahui.
     Mengembalikan True jika cocok, False jika tidak.
+    Jika known_face_encodings tidak diberikan, pencocokan dilakukan terhadap galeri
+    di memori (face_gallery) dan nilai kedua yang dikembalikan adalah student_id pemilik wajah.
+    Dengan course_id, hanya wajah mahasiswa peserta mata kuliah tersebut yang dibandingkan.
     """
-    if not known_face_encodings:
+    if known_face_encodings is None:
+        from face_gallery import get_gallery
+        student_id, _ = get_gallery().match(current_face_encoding, tolerance, course_id=course_id)
+        if student_id is None:
+            return False, None
+        return True, student_id
+
+    if len(known_face_encodings) == 0:
         return False, None # Tidak ada encoding yang diketahui untuk dibandingkan
 
-    # Bandingkan encoding wajah saat ini dengan semua encoding yang diketahui
-    matches = face_recognition.compare_faces(known_face_encodings, current_face_encoding, tolerance)
-    
-    # Ambil jarak wajah (semakin kecil semakin mirip)
-    face_distances = face_recognition.face_distance(known_face_encodings, current_face_encoding)
+    # Hitung jarak wajah SEKALI (semakin kecil semakin mirip); kecocokan = jarak <= tolerance,
+    # sama seperti face_recognition.compare_faces (jarak Euclidean) tanpa menghitung jarak dua kali.
+    face_distances = np.linalg.norm(np.asarray(known_face_encodings) - current_face_encoding, axis=1)
     
-    best_match_index = np.argmin(face_distances) if len(face_distances) > 0 else -1
+    best_match_index = int(np.argmin(face_distances)) if len(face_distances) > 0 else -1
 
-    if best_match_index != -1 and matches[best_match_index]:
+    if best_match_index != -1 and face_distances[best_match_index] <= tolerance:
         return True, best_match_index
     else:
         return False, None
@@ -189,11 +487,9 @@ def verify_face(current_face_encoding, known_face_encodings, tolerance=0.6):
 # --- Fungsi untuk memproses gambar dari kamera/upload ---
 def process_uploaded_image_for_recognition(image_file):
     """
-    Menerima FileStorage object, menyimpan sementara, dan mengembalikan encoding.
+    Menerima FileStorage object (atau data URL/bytes), men-decode di memori, dan mengembalikan encoding.
     """
-    temp_path = os.path.join('/tmp', image_file.filename)
-    image_file.save(temp_path) # Simpan sementara file yang diupload
-
-    encoding = get_face_encoding(temp_path)
-    os.remove(temp_path) # Hapus file sementara
-    return encoding
\ No newline at end of file
+    image = decode_image(read_image_bytes(image_file))
+    if image is None:
+        return None
+    return get_face_encoding(image)
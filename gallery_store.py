@@ -0,0 +1,409 @@
+import os
+import json
+import time
+import argparse
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import event, func, insert, inspect, or_, select
+
+from app import db
+from models import FaceData, FaceDataChange
+from face_utils import FACE_ENCODING_FORMAT, FACE_ENCODING_DIM, encodings_from_bytes
+from face_index import make_index, BruteForceIndex, SegmentedIndex, FACE_INDEX_BACKEND
+
+try:
+    import fcntl # Lock file antar proses (Linux/macOS)
+except ImportError:
+    fcntl = None
+
+# --- Galeri Wajah Bersama per Host (bisa diubah lewat environment variable) ---
+# Galeri disimpan sebagai file float32 yang di-mmap read-only oleh semua worker di satu server,
+# sehingga hanya ada SATU salinan fisik encoding per host (page cache), bukan satu per worker.
+# Isi folder:
+#   manifest.json                     versi, high-water mark change log, daftar segmen + tombstone
+#   seg-<versi>.vectors.npy           matriks float32 N x 128
+#   seg-<versi>.norms.npy             ||x||^2 setiap baris (agar tidak dihitung ulang per worker)
+#   seg-<versi>.ids.npy               pasangan (id FaceData, id siswa) int64 N x 2
+# Segmen tidak pernah diubah setelah ditulis: perubahan baru masuk ke segmen tambahan, baris lama
+# ditandai tombstone, dan pemadatan (compaction) sesekali menggabungkan semuanya jadi satu segmen.
+# Hanya satu proses per host (pemegang gallery.lock) yang menarik perubahan dari DB dan menulis.
+#
+# FACE_GALLERY_DIR: folder galeri bersama (kosong = galeri di memori masing-masing proses)
+# FACE_GALLERY_SYNC_INTERVAL: detik antar pengecekan change log / manifest
+# FACE_GALLERY_PULL_LIMIT: jumlah maksimum baris change log yang diterapkan per sinkronisasi
+# FACE_GALLERY_COMPACT_SEGMENTS: jumlah segmen yang memicu pemadatan
+# FACE_GALLERY_COMPACT_TOMBSTONES: rasio baris tombstone yang memicu pemadatan
+# FACE_GALLERY_GAP_TIMEOUT: detik sebuah celah id change log ditunggu sebelum dianggap rollback
+# FACE_GALLERY_MAX_GAPS: jumlah maksimum celah id yang dilacak sekaligus
+FACE_GALLERY_DIR = os.environ.get('FACE_GALLERY_DIR', '')
+FACE_GALLERY_SYNC_INTERVAL = float(os.environ.get('FACE_GALLERY_SYNC_INTERVAL', '2'))
+FACE_GALLERY_PULL_LIMIT = int(os.environ.get('FACE_GALLERY_PULL_LIMIT', '5000'))
+FACE_GALLERY_COMPACT_SEGMENTS = int(os.environ.get('FACE_GALLERY_COMPACT_SEGMENTS', '16'))
+FACE_GALLERY_COMPACT_TOMBSTONES = float(os.environ.get('FACE_GALLERY_COMPACT_TOMBSTONES', '0.1'))
+FACE_GALLERY_GAP_TIMEOUT = float(os.environ.get('FACE_GALLERY_GAP_TIMEOUT', '600'))
+FACE_GALLERY_MAX_GAPS = int(os.environ.get('FACE_GALLERY_MAX_GAPS', '1000'))
+
+MANIFEST_NAME = 'manifest.json'
+LOCK_NAME = 'gallery.lock'
+
+
+# --- Change log: setiap perubahan FaceData dicatat di transaksi yang sama ---
+def _log_change(connection, face_data_id, action):
+    connection.execute(insert(FaceDataChange.__table__).values(
+        face_data_id=face_data_id, action=action, created_at=datetime.utcnow()))
+
+@event.listens_for(FaceData, 'after_insert')
+def _log_face_insert(mapper, connection, target):
+    _log_change(connection, target.id, 'upsert')
+
+@event.listens_for(FaceData, 'after_update')
+def _log_face_update(mapper, connection, target):
+    # Misalnya backfill_face_encodings.py mengisi encoding pada baris lama
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes()
+           for name in ('face_encoding', 'face_encoding_format', 'student_id')):
+        _log_change(connection, target.id, 'upsert')
+
+@event.listens_for(FaceData, 'after_delete')
+def _log_face_delete(mapper, connection, target):
+    _log_change(connection, target.id, 'delete')
+
+def latest_change_id():
+    return db.session.query(func.max(FaceDataChange.id)).scalar() or 0
+
+# --- Celah id change log ---
+# Id autoincrement dibagikan saat INSERT, bukan saat commit: transaksi yang memegang id N bisa
+# commit SETELAH id N+1 sudah terbaca dan high-water mark melewatinya. Id yang belum terlihat di
+# bawah high-water mark dicatat sebagai celah (id -> waktu pertama terlihat) dan ikut dibaca ulang
+# di setiap sinkronisasi sampai terisi, atau kedaluwarsa setelah FACE_GALLERY_GAP_TIMEOUT
+# (id milik transaksi yang di-rollback tidak akan pernah muncul).
+def _track_gaps(gaps, seen_ids, start, end, now):
+    """
+    Menambahkan id di (start, end] yang tidak ada di seen_ids sebagai celah baru,
+    membuang celah yang sudah terisi atau kedaluwarsa. Mengembalikan dict celah baru.
+    """
+    seen_ids = set(seen_ids)
+    gaps = {gap: first_seen for gap, first_seen in gaps.items()
+            if gap not in seen_ids and now - first_seen < FACE_GALLERY_GAP_TIMEOUT}
+    missing = end - start - sum(1 for change_id in seen_ids if start < change_id <= end)
+    if missing > FACE_GALLERY_MAX_GAPS:
+        # Lompatan id yang besar (misalnya sequence di-restart) bukan transaksi yang tertunda
+        print(f"Peringatan: {missing} id change log hilang setelah {start}; celah tidak dilacak.")
+        return gaps
+    for change_id in range(start + 1, end + 1):
+        if change_id not in seen_ids:
+            gaps.setdefault(change_id, now)
+    return gaps
+
+def gaps_to_json(gaps):
+    return sorted([gap, first_seen] for gap, first_seen in gaps.items())
+
+def gaps_from_json(pairs):
+    return {int(gap): float(first_seen) for gap, first_seen in pairs or ()}
+
+def changes_since(high_water_mark, gaps=None, limit=FACE_GALLERY_PULL_LIMIT):
+    """
+    Mengembalikan (id FaceData yang berubah, high-water mark baru, celah baru) untuk change log
+    setelah high_water_mark ditambah celah yang baru terisi.
+    Perubahan beruntun pada wajah yang sama cukup diterapkan sekali dengan membaca keadaan terbarunya,
+    sehingga menerapkan ulang perubahan yang sama tidak mengubah hasil.
+    """
+    gaps = gaps or {}
+    condition = FaceDataChange.id > high_water_mark
+    if gaps:
+        condition = or_(condition, FaceDataChange.id.in_(list(gaps)))
+    changes = db.session.query(FaceDataChange.id, FaceDataChange.face_data_id) \
+        .filter(condition) \
+        .order_by(FaceDataChange.id) \
+        .limit(limit) \
+        .all()
+    change_ids = [change_id for change_id, _ in changes]
+    new_high_water_mark = max([high_water_mark] + change_ids)
+    gaps = _track_gaps(gaps, change_ids, high_water_mark, new_high_water_mark, time.time())
+    return sorted({face_id for _, face_id in changes}), new_high_water_mark, gaps
+
+def _snapshot_connection():
+    """
+    Koneksi terpisah dari session request dengan isolasi REPEATABLE READ (PostgreSQL/MySQL), agar
+    high-water mark dan isi FaceData dibaca dari SATU snapshot database.
+    """
+    connection = db.engine.connect()
+    if connection.dialect.name in ('postgresql', 'mysql', 'mariadb'):
+        connection = connection.execution_options(isolation_level='REPEATABLE READ')
+    return connection
+
+def read_gallery_snapshot():
+    """
+    Membaca semua encoding FaceData beserta high-water mark dan celah id change log pada satu snapshot.
+    Mengembalikan (rows (id, student_id, encoding) terurut id, high_water_mark, celah).
+    """
+    with _snapshot_connection() as connection, connection.begin():
+        high_water_mark = connection.execute(select(func.max(FaceDataChange.id))).scalar() or 0
+        # Id di bawah high-water mark yang belum terlihat bisa milik transaksi yang belum commit
+        recent_ids = connection.execute(select(FaceDataChange.id).where(
+            FaceDataChange.id > high_water_mark - FACE_GALLERY_MAX_GAPS)).scalars().all()
+        rows = connection.execute(select(FaceData.id, FaceData.student_id, FaceData.face_encoding)
+                                  .where(FaceData.face_encoding_format == FACE_ENCODING_FORMAT)
+                                  .order_by(FaceData.id)).all()
+    start = max(0, high_water_mark - FACE_GALLERY_MAX_GAPS)
+    return rows, high_water_mark, _track_gaps({}, recent_ids, start, high_water_mark, time.time())
+
+def current_face_rows(face_ids):
+    """
+    Baris (id, student_id, encoding) yang saat ini ada untuk face_ids; wajah yang sudah dihapus tidak muncul.
+    """
+    rows = []
+    for start in range(0, len(face_ids), 1000):
+        rows.extend(db.session.query(FaceData.id, FaceData.student_id, FaceData.face_encoding)
+                    .filter(FaceData.id.in_(face_ids[start:start + 1000]),
+                            FaceData.face_encoding_format == FACE_ENCODING_FORMAT)
+                    .all())
+    return rows
+
+def prune_change_log(days):
+    """
+    Menghapus change log yang lebih tua dari `days` hari. Galeri yang tertinggal lebih lama dari itu
+    (misalnya server yang lama mati) otomatis memuat ulang seluruh galeri saat sinkronisasi.
+    """
+    count = FaceDataChange.query.filter(FaceDataChange.created_at < datetime.utcnow() - timedelta(days=days)) \
+        .delete(synchronize_session=False)
+    db.session.commit()
+    return count
+
+def log_was_pruned(high_water_mark):
+    """
+    True jika ada change log setelah high_water_mark yang sudah dihapus oleh prune_change_log.
+    """
+    oldest = db.session.query(func.min(FaceDataChange.id)).scalar()
+    return oldest is not None and oldest > high_water_mark + 1 and high_water_mark < latest_change_id()
+
+
+# --- File galeri bersama ---
+class GalleryStore:
+    def __init__(self, directory, backend=None):
+        self.directory = directory
+        self.backend = backend or FACE_INDEX_BACKEND
+        os.makedirs(directory, exist_ok=True)
+        self._segments = {} # nama segmen -> (index, ids) yang sudah di-mmap oleh proses ini
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def read_manifest(self):
+        try:
+            with open(self._path(MANIFEST_NAME)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_manifest(self, manifest):
+        temp_path = self._path(f"{MANIFEST_NAME}.{os.getpid()}.tmp")
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(temp_path, self._path(MANIFEST_NAME)) # Pembaca melihat manifest lama atau baru, tidak pernah setengah
+
+    @contextmanager
+    def _writer_lock(self, blocking):
+        with open(self._path(LOCK_NAME), 'a+') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write_segment(self, version, face_ids, student_ids, encodings):
+        name = f"seg-{version:08d}"
+        vectors = np.ascontiguousarray(encodings, dtype=np.float32).reshape(-1, FACE_ENCODING_DIM)
+        np.save(self._path(f"{name}.vectors.npy"), vectors)
+        np.save(self._path(f"{name}.norms.npy"), np.einsum('ij,ij->i', vectors, vectors))
+        np.save(self._path(f"{name}.ids.npy"), np.stack([np.asarray(face_ids, dtype=np.int64),
+                                                         np.asarray(student_ids, dtype=np.int64)], axis=1)
+                .reshape(-1, 2))
+        return {'name': name, 'rows': len(vectors), 'tombstones': []}
+
+    def _remove_unused_segments(self, manifest):
+        used = {segment['name'] for segment in manifest['segments']}
+        for filename in os.listdir(self.directory):
+            if filename.startswith('seg-') and filename.split('.', 1)[0] not in used:
+                # Worker yang masih me-mmap segmen lama tetap bisa membacanya sampai ia beralih (POSIX)
+                os.remove(self._path(filename))
+
+    def _load_ids(self, name):
+        return np.load(self._path(f"{name}.ids.npy"), mmap_mode='r')
+
+    # --- Penulis (hanya pemegang lock) ---
+    def rebuild(self, manifest=None):
+        """
+        Menulis ulang seluruh galeri dari tabel FaceData menjadi satu segmen.
+        """
+        rows, high_water_mark, gaps = read_gallery_snapshot()
+        version = (manifest['version'] if manifest else 0) + 1
+        segment = self._write_segment(version, [row[0] for row in rows], [row[1] for row in rows],
+                                      encodings_from_bytes(row[2] for row in rows))
+        manifest = {'version': version, 'high_water_mark': high_water_mark, 'gaps': gaps_to_json(gaps),
+                    'segments': [segment]}
+        self._write_manifest(manifest)
+        self._remove_unused_segments(manifest)
+        print(f"Galeri bersama ditulis ulang: {segment['rows']} encoding (versi {version}).")
+        return manifest
+
+    def pull(self, manifest):
+        """
+        Menerapkan perubahan dari change log: baris lama setiap wajah yang berubah ditandai tombstone,
+        lalu keadaan terbarunya (jika masih ada) ditulis ke satu segmen baru.
+        """
+        previous_gaps = manifest.get('gaps', [])
+        face_ids, high_water_mark, gaps = changes_since(manifest['high_water_mark'], gaps_from_json(previous_gaps))
+        if not face_ids:
+            if gaps_to_json(gaps) != previous_gaps:
+                manifest = dict(manifest, gaps=gaps_to_json(gaps))
+                self._write_manifest(manifest)
+            return manifest
+
+        version = manifest['version'] + 1
+        segments = [dict(segment, tombstones=list(segment['tombstones'])) for segment in manifest['segments']]
+        for segment in segments:
+            ids = self._load_ids(segment['name'])[:, 0]
+            dead = set(segment['tombstones'])
+            segment['tombstones'].extend(int(face_id) for face_id in ids[np.isin(ids, face_ids)]
+                                         if int(face_id) not in dead)
+
+        rows = current_face_rows(face_ids)
+        if rows:
+            segments.append(self._write_segment(version, [row[0] for row in rows], [row[1] for row in rows],
+                                                encodings_from_bytes(row[2] for row in rows)))
+        manifest = {'version': version, 'high_water_mark': high_water_mark, 'gaps': gaps_to_json(gaps),
+                    'segments': segments}
+        self._write_manifest(manifest)
+        return manifest
+
+    def needs_compaction(self, manifest):
+        rows = sum(segment['rows'] for segment in manifest['segments'])
+        tombstones = sum(len(segment['tombstones']) for segment in manifest['segments'])
+        return (len(manifest['segments']) > FACE_GALLERY_COMPACT_SEGMENTS
+                or (rows and tombstones / rows > FACE_GALLERY_COMPACT_TOMBSTONES))
+
+    def compact(self, manifest):
+        """
+        Menggabungkan semua segmen tanpa baris tombstone menjadi satu segmen baru.
+        """
+        vectors, ids = [], []
+        for segment in manifest['segments']:
+            segment_ids = self._load_ids(segment['name'])
+            keep = ~np.isin(segment_ids[:, 0], segment['tombstones'])
+            vectors.append(np.load(self._path(f"{segment['name']}.vectors.npy"), mmap_mode='r')[keep])
+            ids.append(segment_ids[keep])
+        ids = np.concatenate(ids) if ids else np.empty((0, 2), dtype=np.int64)
+        version = manifest['version'] + 1
+        segment = self._write_segment(version, ids[:, 0], ids[:, 1],
+                                      np.concatenate(vectors) if vectors else np.empty((0, FACE_ENCODING_DIM)))
+        manifest = {'version': version, 'high_water_mark': manifest['high_water_mark'],
+                    'gaps': manifest.get('gaps', []), 'segments': [segment]}
+        self._write_manifest(manifest)
+        self._remove_unused_segments(manifest)
+        print(f"Galeri bersama dipadatkan: {segment['rows']} encoding (versi {version}).")
+        return manifest
+
+    def sync(self):
+        """
+        Dipanggil berkala oleh setiap worker. Proses yang mendapat lock menarik perubahan dari DB
+        (dan memadatkan segmen jika perlu); proses lain cukup membaca manifest terbaru.
+        Mengembalikan manifest terbaru.
+        """
+        manifest = self.read_manifest()
+        # Saat galeri belum ada, semua worker menunggu satu penulis membuatnya
+        with self._writer_lock(blocking=manifest is None) as is_writer:
+            if is_writer:
+                manifest = self.read_manifest()
+                if manifest is None or log_was_pruned(manifest['high_water_mark']):
+                    manifest = self.rebuild(manifest)
+                else:
+                    manifest = self.pull(manifest)
+                if self.needs_compaction(manifest):
+                    manifest = self.compact(manifest)
+        return self.read_manifest()
+
+    # --- Pembaca (semua worker) ---
+    def _open_segment(self, name):
+        cached = self._segments.get(name)
+        if cached is None:
+            vectors = np.load(self._path(f"{name}.vectors.npy"), mmap_mode='r')
+            ids = self._load_ids(name)
+            if self.backend == 'brute':
+                norms = np.load(self._path(f"{name}.norms.npy"), mmap_mode='r')
+                index = BruteForceIndex(vectors, norms) # Memakai mmap langsung, tanpa salinan
+            else:
+                index = make_index(vectors, self.backend)
+            cached = self._segments[name] = (index, ids)
+        return cached
+
+    def snapshot(self, manifest):
+        """
+        Snapshot (index, face_ids, student_ids, versi) untuk FaceGallery dari manifest.
+        Baris tombstone diberi student_id -1 sehingga tidak pernah masuk daftar peserta mata kuliah.
+        """
+        indexes, face_ids, student_ids, dead = [], [], [], []
+        for segment in manifest['segments']:
+            index, ids = self._open_segment(segment['name'])
+            indexes.append(index)
+            face_ids.append(ids[:, 0])
+            student_ids.append(ids[:, 1])
+            dead.append(np.isin(ids[:, 0], segment['tombstones']))
+        # Segmen yang sudah tidak dipakai dilepas agar mmap-nya ikut ditutup
+        used = {segment['name'] for segment in manifest['segments']}
+        for name in list(self._segments):
+            if name not in used:
+                del self._segments[name]
+
+        dead = np.concatenate(dead) if dead else np.empty(0, dtype=bool)
+        face_ids = np.concatenate(face_ids) if face_ids else np.empty(0, dtype=np.int64)
+        student_ids = np.concatenate(student_ids) if student_ids else np.empty(0, dtype=np.int64)
+        student_ids[dead] = -1
+        return SegmentedIndex(indexes, dead), face_ids, student_ids, manifest['version']
+
+
+_store = None
+
+def get_store():
+    """
+    Galeri bersama proses ini, atau None jika FACE_GALLERY_DIR tidak diisi (galeri di memori per proses).
+    """
+    global _store
+    if _store is None and FACE_GALLERY_DIR:
+        if fcntl is None:
+            print("Peringatan: FACE_GALLERY_DIR membutuhkan fcntl (Linux/macOS); memakai galeri di memori.")
+            return None
+        _store = GalleryStore(FACE_GALLERY_DIR)
+    return _store
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Perawatan galeri wajah bersama dan change log FaceData.")
+    parser.add_argument('--rebuild', action='store_true', help="Tulis ulang galeri bersama dari tabel FaceData")
+    parser.add_argument('--compact', action='store_true', help="Padatkan semua segmen menjadi satu")
+    parser.add_argument('--prune-days', type=int, help="Hapus change log yang lebih tua dari N hari")
+    args = parser.parse_args()
+
+    from app import app
+    with app.app_context():
+        if args.prune_days is not None:
+            print(f"{prune_change_log(args.prune_days)} baris change log dihapus.")
+        store = get_store()
+        if store is None:
+            if args.rebuild or args.compact:
+                print("FACE_GALLERY_DIR belum diisi; tidak ada galeri bersama yang bisa dirawat.")
+        else:
+            with store._writer_lock(blocking=True):
+                manifest = store.read_manifest()
+                if args.rebuild or manifest is None:
+                    manifest = store.rebuild(manifest)
+                if args.compact:
+                    manifest = store.compact(store.pull(manifest))
+            print(f"Galeri bersama versi {manifest['version']}: "
+                  f"{sum(segment['rows'] for segment in manifest['segments'])} baris, "
+                  f"{len(manifest['segments'])} segmen.")
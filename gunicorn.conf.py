@@ -0,0 +1,45 @@
+import os
+import tempfile
+
+# --- Konfigurasi gunicorn untuk produksi: gunicorn -c gunicorn.conf.py app:app ---
+# GUNICORN_BIND: alamat dan port yang didengarkan
+# WEB_CONCURRENCY: jumlah worker web
+# GUNICORN_THREADS: thread per worker web (worker_class 'gthread'). Long-poll job presensi dan
+#   request yang menunggu pool pengenalan menahan satu thread, bukan satu worker; kapasitas
+#   request bersamaan = WEB_CONCURRENCY x GUNICORN_THREADS. Jaga agar tidak melebihi
+#   DB_POOL_SIZE + DB_MAX_OVERFLOW per worker (app.py).
+# GUNICORN_PRELOAD: '1' = aplikasi di-import sekali di proses master lalu worker di-fork darinya
+# RECOGNITION_PRELOAD_MODELS: '1' = muat cv2/dlib dan modelnya di master sebelum fork, sehingga
+#   semua worker web berbagi memori model secara copy-on-write. Hanya berguna jika pengenalan
+#   berjalan di proses web (RECOGNITION_WORKERS=0); dengan pool, worker pool memuatnya sendiri.
+# METRICS_DIR: folder snapshot metrik bersama semua worker (metrics.py); default folder sementara
+#   per host agar /metrics selalu melaporkan seluruh worker, bukan worker yang kebetulan menjawab
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+# Diteruskan ke aplikasi agar default RECOGNITION_WORKERS membagi CPU ke semua worker web (recognition_pool.py)
+os.environ['WEB_CONCURRENCY'] = str(workers)
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '16'))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+RECOGNITION_PRELOAD_MODELS = os.environ.get('RECOGNITION_PRELOAD_MODELS', '0') == '1'
+os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'hadirku-metrics'))
+
+def on_starting(server):
+    # Snapshot metrik worker dari start sebelumnya dibuang (lihat METRICS_DIR di metrics.py)
+    from metrics import clear_metrics_dir
+    clear_metrics_dir()
+    if preload_app and RECOGNITION_PRELOAD_MODELS:
+        from face_utils import warm_up_models
+        warm_up_models()
+        server.log.info("Model pengenalan wajah dimuat di master sebelum fork.")
+
+def post_fork(server, worker):
+    # Koneksi DB yang sempat dibuka master tidak boleh dipakai bersama oleh beberapa worker
+    if preload_app:
+        from app import app, db
+        with app.app_context():
+            db.engine.dispose()
+    # Galeri wajah, pool pengenalan, dan worker antrean unggah disiapkan di setiap worker
+    # sebelum presensi pertama (lihat start_worker_services di app.py)
+    from app import start_worker_services
+    start_worker_services()
@@ -1,15 +1,89 @@
 # Contoh Rute Registrasi Wajah
 # Asumsi Anda mengimport db dan FaceData dari app dan models
-from flask import request, redirect, url_for, flash, Blueprint
+import os
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime, time, timedelta
+from time import monotonic, sleep, perf_counter
+import pytz
+from flask import request, redirect, url_for, flash, Blueprint, render_template, jsonify, current_app, g, Response, stream_with_context
 from flask_login import login_required, current_user # Jika menggunakan Flask-Login
 from werkzeug.utils import secure_filename # Untuk nama file yang aman
+from sqlalchemy.orm import joinedload
 from app import db # Asumsi db dari app.py
-from models import Student, FaceData # Asumsi model Anda
-from face_utils import get_face_encoding, upload_file_to_s3, save_face_encoding_file # Import fungsi S3
+from models import Student, FaceData, Course, Attendance, AttendanceJob # Asumsi model Anda
+from face_utils import verify_face, read_image_bytes, encoding_to_bytes, FACE_ENCODING_FORMAT
+from face_utils import FACE_UPLOAD_MAX_WIDTH, FACE_UPLOAD_JPEG_QUALITY
+from upload_queue import enqueue_upload, upload_queue_stats # Unggahan S3 write-behind di luar jalur request
+from thumbnails import image_url, thumbnail_url
+from pagination import keyset_page, decode_cursor
+from recognition_pool import recognition_pool, RecognitionBusy, RecognitionTimeout
+import face_gallery # Mendaftarkan sinkronisasi galeri encoding di memori
+import attendance_stats # Mendaftarkan pembaruan tabel agregat presensi
+import metrics # Histogram latensi per tahap dan endpoint /metrics
+import attendance_export # Ekspor presensi streaming (CSV/Parquet)
 
 # Ini contoh blueprint, sesuaikan dengan struktur Anda
 main = Blueprint('main', __name__) # Contoh jika ini di main.py
 
+WIB = pytz.timezone('Asia/Jakarta')
+
+# Pesan untuk kode error dari worker pengenalan wajah
+RECOGNITION_ERROR_MESSAGES = {
+    'invalid_image': 'Gambar tidak valid.',
+    'no_face': 'Wajah tidak terdeteksi. Pastikan wajah terlihat jelas di kamera.',
+    'too_dark': 'Gambar terlalu gelap. Cari tempat yang lebih terang lalu coba lagi.',
+    'too_bright': 'Gambar terlalu terang. Hindari cahaya langsung ke kamera lalu coba lagi.',
+    'face_too_small': 'Wajah terlalu jauh dari kamera. Dekatkan wajah Anda lalu coba lagi.',
+    'blurry': 'Gambar buram. Tahan kamera tetap diam lalu coba lagi.',
+}
+
+def recognition_error_message(error_code):
+    metrics.recognition_errors.inc(error_code)
+    return RECOGNITION_ERROR_MESSAGES[error_code]
+
+def busy_response(error):
+    """
+    Respons cepat saat antrean pengenalan wajah penuh, lengkap dengan header Retry-After.
+    """
+    response = jsonify({
+        'status': 'error',
+        'message': f'Server sedang sibuk, silakan coba lagi dalam {error.retry_after} detik.',
+        'retry_after': error.retry_after,
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+# --- Metrik latensi per request ---
+@main.before_app_request
+def start_request_metrics():
+    g.request_started = perf_counter()
+    metrics.start_request_timings()
+
+@main.after_app_request
+def finish_request_metrics(response):
+    timings = metrics.pop_request_timings() or []
+    started = g.pop('request_started', None)
+    if started is not None:
+        elapsed = perf_counter() - started
+        metrics.request_seconds.observe(request.endpoint or 'unknown', elapsed)
+        if metrics.METRICS_TIMING_HEADER:
+            timings.append(('total', elapsed))
+            response.headers['Server-Timing'] = metrics.server_timing_header(timings)
+    return response
+
+@main.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """
+    Metrik format teks Prometheus untuk proses ini (tanpa login; pakai METRICS_TOKEN untuk membatasi).
+    """
+    if metrics.METRICS_TOKEN and request.headers.get('Authorization') != f"Bearer {metrics.METRICS_TOKEN}":
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(metrics.render_metrics(), mimetype='text/plain; version=0.0.4')
+
+
 @main.route('/register_face', methods=['GET', 'POST'])
 @login_required # Hanya user yang login bisa register
 def register_face():
@@ -17,58 +91,510 @@ def register_face():
         if 'face_image' not in request.files:
             flash('Tidak ada file gambar yang diunggah.')
             return redirect(request.url)
-        
+
         file = request.files['face_image']
         if file.filename == '':
             flash('Tidak ada file yang dipilih.')
             return redirect(request.url)
-        
+
         if file:
-            filename = secure_filename(file.filename)
-            # --- Langkah 1: Simpan file sementara di server untuk diproses ---
-            temp_filepath = os.path.join('/tmp', filename)
-            file.save(temp_filepath)
+            # Nama objek diberi prefix unik agar dua upload 'image.jpg' tidak saling menimpa
+            filename = f"{uuid.uuid4().hex}_{secure_filename(file.filename)}"
+            # --- Langkah 1: Baca bytes gambar langsung di memori (tanpa file sementara) ---
+            image_bytes = read_image_bytes(file)
 
-            # --- Langkah 2: Dapatkan encoding wajah ---
-            face_encoding = get_face_encoding(temp_filepath)
-            
-            # Hapus file sementara setelah mendapatkan encoding
-            os.remove(temp_filepath) 
+            # --- Langkah 2: Decode dan encoding wajah di proses worker pengenalan ---
+            try:
+                face_encoding, error_code = recognition_pool.encode(image_bytes)
+            except RecognitionBusy as e:
+                flash(f'Server sedang sibuk, silakan coba lagi dalam {e.retry_after} detik.')
+                return redirect(request.url)
+            except RecognitionTimeout:
+                flash('Pengenalan wajah terlalu lama, silakan coba lagi.')
+                return redirect(request.url)
 
             if face_encoding is None:
-                flash('Tidak dapat mendeteksi wajah atau encoding.')
-                return redirect(request.url)
-            
-            # --- Langkah 3: Unggah gambar asli ke S3 ---
-            s3_object_key_image = f"student_faces/{current_user.id}/{filename}" # Path di S3
-            s3_image_url = upload_file_to_s3(temp_filepath, s3_object_key_image) # Gunakan path temp yang disimpan sebelumnya
-            
-            if not s3_image_url:
-                flash('Gagal mengunggah gambar wajah ke S3.')
+                flash(recognition_error_message(error_code))
                 return redirect(request.url)
 
-            # --- Langkah 4 (Opsional): Unggah encoding ke S3 jika Anda menyimpannya sebagai file ---
-            # Jika Anda menyimpan encoding sebagai binary/PickleType di DB (lebih disarankan):
-            # face_encoding_binary = pickle.dumps(face_encoding)
-            # Jika Anda menyimpannya di S3 sebagai file encoding:
-            encoding_filename = f"{os.path.splitext(filename)[0]}.pkl"
-            s3_object_key_encoding = f"student_face_encodings/{current_user.id}/{encoding_filename}"
-            s3_encoding_url = save_face_encoding_file(face_encoding, encoding_filename)
+            # --- Langkah 3: Encoding disimpan langsung di DB sebagai 512 byte float32 ---
+            # (Tidak lagi diunggah ke S3 sebagai file .pkl)
 
-            # --- Langkah 5: Simpan URL S3 (dan encoding jika di DB) ke database ---
+            # --- Langkah 4: Simpan encoding ke database, foto asli masuk antrean unggah S3 ---
             # Asumsi user yang login adalah Student atau kita bisa cari Student berdasarkan User ID
             student = Student.query.filter_by(student_id=current_user.username).first() # Contoh, sesuaikan
             if student:
+                s3_object_key_image = f"student_faces/{current_user.id}/{filename}" # Path di S3
+                s3_image_url = enqueue_upload(s3_object_key_image, image_bytes, file.mimetype or 'image/jpeg')
                 new_face_data = FaceData(
                     student_id=student.id,
                     face_image_s3_url=s3_image_url,
-                    # face_encoding = face_encoding_binary # Jika disimpan di DB
+                    face_image_status='pending',
+                    face_encoding=encoding_to_bytes(face_encoding),
+                    face_encoding_format=FACE_ENCODING_FORMAT,
                 )
                 db.session.add(new_face_data)
+                # Satu transaksi untuk FaceData dan antrean unggah; galeri di memori ikut diperbarui (face_gallery.py)
                 db.session.commit()
                 flash('Wajah berhasil didaftarkan!')
                 return redirect(url_for('main.dashboard')) # Atau halaman lain
             else:
                 flash('Siswa tidak ditemukan untuk pendaftaran wajah.')
 
-    return render_template('register_face.html') # Sesuaikan dengan template Anda
\ No newline at end of file
+    return render_template('register_face.html') # Sesuaikan dengan template Anda
+
+
+# Thumbnail dan gambar penuh disajikan lewat presigned URL yang di-cache (lihat thumbnails.py)
+main.add_app_template_global(thumbnail_url, 'thumbnail_url')
+main.add_app_template_global(image_url, 'image_url')
+
+RECORDS_PAGE_SIZE = 50
+
+@main.route('/records')
+@login_required
+def records():
+    """
+    Riwayat presensi mahasiswa yang sedang login. Tabel hanya memuat thumbnail kecil;
+    foto ukuran penuh baru diunduh saat thumbnail diklik.
+    """
+    student = Student.query.filter_by(student_id=current_user.username).first() # Contoh, sesuaikan
+    attendances, next_cursor = [], None
+    if student:
+        # Keyset pagination: ?cursor=<timestamp>_<id> dari baris terakhir halaman sebelumnya
+        query = Attendance.query.filter_by(student_id=student.id).options(joinedload(Attendance.course_attended))
+        attendances, next_cursor = keyset_page(query, Attendance.timestamp, Attendance.id,
+                                               decode_cursor(request.args.get('cursor')), RECORDS_PAGE_SIZE)
+    for record in attendances:
+        record.local_time = record.timestamp.replace(tzinfo=pytz.utc).astimezone(WIB)
+    return render_template('records.html', records=attendances, next_cursor=next_cursor,
+                           name=student.name if student else current_user.username)
+
+
+def start_of_today_utc():
+    """
+    Mengembalikan awal hari ini (00:00 WIB) dalam UTC naive, sesuai kolom Attendance.timestamp.
+    """
+    today_wib = datetime.now(WIB).date()
+    start_wib = WIB.localize(datetime.combine(today_wib, time.min))
+    return start_wib.astimezone(pytz.utc).replace(tzinfo=None)
+
+
+def has_attended_today(student_id, course_id):
+    """
+    Cek presensi ganda hari ini sebagai EXISTS yang dijawab langsung oleh index
+    (student_id, course_id, timestamp): satu pencarian index, tanpa memuat baris.
+    """
+    return db.session.query(
+        Attendance.query.filter(
+            Attendance.student_id == student_id,
+            Attendance.course_id == course_id,
+            Attendance.timestamp >= start_of_today_utc(),
+        ).exists()
+    ).scalar()
+
+
+# Format upload frame presensi yang diterima selain JSON base64 (lebih hemat ~33% bandwidth)
+COMPACT_UPLOAD_MIMETYPES = ('image/jpeg', 'image/webp', 'image/png')
+
+def capture_settings():
+    """
+    Ukuran dan kualitas frame yang diminta dari browser (dibaca static/js/main.js lewat atribut data-*).
+    """
+    return {'max_width': FACE_UPLOAD_MAX_WIDTH, 'jpeg_quality': FACE_UPLOAD_JPEG_QUALITY}
+
+main.add_app_template_global(capture_settings, 'capture_settings')
+
+def attendance_request_data():
+    """
+    Payload presensi dalam bentuk dict yang sama untuk tiga format upload:
+    multipart (file 'image' + field matakuliah_id/latitude/longitude), body gambar mentah
+    (field lewat query string), atau JSON lama dengan data URL base64 di 'image_data'.
+    """
+    if request.mimetype == 'multipart/form-data':
+        fields = request.form
+        data = {'image_data': request.files.get('image'), 'matakuliah_id': fields.get('matakuliah_id')}
+    elif request.mimetype in COMPACT_UPLOAD_MIMETYPES:
+        fields = request.args
+        data = {'image_data': request.get_data(), 'matakuliah_id': fields.get('matakuliah_id')}
+    else:
+        return request.get_json(silent=True) or {}
+    data['location'] = {'latitude': fields.get('latitude', type=float),
+                        'longitude': fields.get('longitude', type=float)}
+    return data
+
+def parse_attendance_request(data):
+    """
+    Memvalidasi payload presensi dari static/js/main.js (lihat attendance_request_data).
+    Mengembalikan (student, course, image_bytes, location, None) jika valid,
+    atau (None, None, None, None, (payload_error, http_status)) jika tidak.
+    """
+    image_data = data.get('image_data')
+    course_id = data.get('matakuliah_id')
+    location = data.get('location') or {}
+
+    if not image_data or not course_id:
+        return None, None, None, None, ({'status': 'error', 'message': 'Data presensi tidak lengkap.'}, 400)
+
+    student = Student.query.filter_by(student_id=current_user.username).first() # Contoh, sesuaikan
+    if not student:
+        return None, None, None, None, ({'status': 'error', 'message': 'Data mahasiswa tidak ditemukan.'}, 404)
+
+    course = Course.query.get(course_id)
+    if not course:
+        return None, None, None, None, ({'status': 'error', 'message': 'Mata kuliah tidak ditemukan.'}, 404)
+
+    # Ambil bytes gambar dari file multipart, body mentah, atau data URL (decode dilakukan sekali di worker pengenalan)
+    try:
+        image_bytes = read_image_bytes(image_data)
+    except ValueError: # base64 rusak
+        return None, None, None, None, ({'status': 'error', 'message': 'Gambar tidak valid.'}, 400)
+    if not image_bytes:
+        return None, None, None, None, ({'status': 'error', 'message': 'Data presensi tidak lengkap.'}, 400)
+    return student, course, image_bytes, location, None
+
+
+def record_attendance(student_id, course_id, face_encoding, image_bytes, location):
+    """
+    Mencocokkan encoding dengan galeri lalu mencatat presensi.
+    Dipakai oleh /mark_attendance (sinkron) dan job presensi asinkron.
+    Mengembalikan (payload, http_status).
+    """
+    course = Course.query.get(course_id)
+    # Hanya dibandingkan dengan wajah peserta mata kuliah ini (lihat Enrollment)
+    is_match, matched_student_id = verify_face(face_encoding, course_id=course_id)
+    if not is_match or matched_student_id != student_id:
+        return {'status': 'error', 'message': 'Wajah tidak cocok dengan data wajah Anda.'}, 200
+
+    # Cegah presensi ganda untuk mata kuliah yang sama di hari yang sama
+    if has_attended_today(student_id, course_id):
+        return {'status': 'warning', 'message': f'Anda sudah melakukan presensi untuk {course.name} hari ini.'}, 200
+
+    # Bytes JPEG asli yang sama masuk antrean unggah sebagai foto bukti; S3 yang lambat atau
+    # gagal tidak lagi menahan atau menggagalkan presensi
+    s3_object_key = f"attendance_captures/{student_id}/{uuid.uuid4().hex}.jpg"
+    s3_image_url = enqueue_upload(s3_object_key, image_bytes)
+
+    attendance = Attendance(
+        student_id=student_id,
+        course_id=course_id,
+        latitude=location.get('latitude'),
+        longitude=location.get('longitude'),
+        face_image_s3_url=s3_image_url,
+        face_image_status='pending',
+    )
+    db.session.add(attendance)
+    db.session.commit()
+    return {'status': 'success', 'message': f'Presensi {course.name} berhasil dicatat.'}, 200
+
+
+@main.route('/mark_attendance', methods=['POST'])
+@login_required
+def mark_attendance():
+    """
+    Menerima frame dari static/js/main.js (multipart, JPEG mentah, atau data URL base64),
+    mengenali wajah, lalu mencatat presensi.
+    Gambar di-decode SEKALI di memori; buffer yang sama dipakai untuk deteksi, encoding,
+    dan unggahan foto bukti ke S3.
+    """
+    student, course, image_bytes, location, error = parse_attendance_request(attendance_request_data())
+    if error:
+        return jsonify(error[0]), error[1]
+
+    # Decode, deteksi, dan encoding di pool proses; pencocokan dengan galeri
+    try:
+        face_encoding, error_code = recognition_pool.encode(image_bytes)
+    except RecognitionBusy as e:
+        return busy_response(e)
+    except RecognitionTimeout:
+        return jsonify({'status': 'error', 'message': 'Pengenalan wajah terlalu lama, silakan coba lagi.'}), 504
+    if face_encoding is None:
+        return jsonify({'status': 'error', 'message': recognition_error_message(error_code)})
+
+    payload, http_status = record_attendance(student.id, course.id, face_encoding, image_bytes, location)
+    return jsonify(payload), http_status
+
+
+# --- Mode Kamera Kelas: satu frame, banyak wajah ---
+@main.route('/classroom_attendance', methods=['POST'])
+@login_required
+def classroom_attendance():
+    """
+    Menerima satu frame dari kamera ruang kelas (data URL base64 + matakuliah_id) lalu
+    mencatat presensi semua mahasiswa yang wajahnya dikenali. Deteksi dan encoding dilakukan
+    dalam satu batch, pencocokan dengan satu matriks jarak, dan semua baris Attendance
+    disimpan dalam satu transaksi. Foto bukti (frame yang sama) diunggah sekali.
+    """
+    if not current_user.is_admin:
+        return admin_only_response()
+    data = request.get_json(silent=True) or {}
+    course = Course.query.get(data.get('matakuliah_id')) if data.get('matakuliah_id') else None
+    if not data.get('image_data') or not course:
+        return jsonify({'status': 'error', 'message': 'Data presensi kelas tidak lengkap.'}), 400
+    try:
+        image_bytes = read_image_bytes(data['image_data'])
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Gambar tidak valid.'}), 400
+
+    try:
+        result, error_code = recognition_pool.encode_all(image_bytes)
+    except RecognitionBusy as e:
+        return busy_response(e)
+    except RecognitionTimeout:
+        return jsonify({'status': 'error', 'message': 'Pengenalan wajah terlalu lama, silakan coba lagi.'}), 504
+    if result is None:
+        return jsonify({'status': 'error', 'message': recognition_error_message(error_code)})
+
+    face_locations, face_encodings = result
+    matches = face_gallery.get_gallery().match_many(face_encodings, course_id=course.id)
+    matched_ids = {student_id for student_id, _ in matches if student_id is not None}
+
+    # Satu query (lewat index student_id, course_id, timestamp) untuk semua yang sudah presensi hari ini
+    already_attended = {student_id for (student_id,) in db.session.query(Attendance.student_id).filter(
+        Attendance.student_id.in_(matched_ids),
+        Attendance.course_id == course.id,
+        Attendance.timestamp >= start_of_today_utc(),
+    )} if matched_ids else set()
+    new_ids = matched_ids - already_attended
+    students = {student.id: student for student in Student.query.filter(Student.id.in_(matched_ids))} if matched_ids else {}
+
+    if new_ids:
+        s3_image_url = enqueue_upload(f"classroom_captures/{course.id}/{uuid.uuid4().hex}.jpg", image_bytes)
+        db.session.add_all([Attendance(student_id=student_id, course_id=course.id, face_image_s3_url=s3_image_url,
+                                       face_image_status='pending')
+                            for student_id in sorted(new_ids)])
+        db.session.commit()
+
+    faces = []
+    for location, (student_id, distance) in zip(face_locations, matches):
+        student = students.get(student_id)
+        faces.append({
+            'box': {'top': location[0], 'right': location[1], 'bottom': location[2], 'left': location[3]},
+            'student_id': student.student_id if student else None,
+            'name': student.name if student else None,
+            'distance': round(distance, 4) if distance is not None else None,
+            'status': 'unknown' if student is None else ('already_attended' if student_id in already_attended else 'recorded'),
+        })
+    return jsonify({
+        'status': 'success',
+        'message': f'{len(new_ids)} presensi {course.name} dicatat dari {len(faces)} wajah terdeteksi.',
+        'recorded': len(new_ids),
+        'already_attended': len(already_attended),
+        'unknown': len(faces) - len(matched_ids),
+        'faces': faces,
+    })
+
+
+# --- Presensi Asinkron Berbasis Job ---
+# POST /attendance_jobs langsung mengembalikan id job setelah payload diterima dan masuk antrean
+# pengenalan. Hasilnya diambil lewat long-poll GET /attendance_jobs/<id>?wait=<detik>.
+# Status job disimpan di database sehingga polling boleh diterima worker web mana pun.
+# Setiap long-poll menahan satu thread worker web (lihat worker_class 'gthread' di gunicorn.conf.py).
+# ATTENDANCE_JOB_MAX_WAIT: detik maksimum satu long-poll ditahan server
+# ATTENDANCE_JOB_TTL_HOURS: job yang lebih tua dari ini dihapus otomatis
+ATTENDANCE_JOB_MAX_WAIT = float(os.environ.get('ATTENDANCE_JOB_MAX_WAIT', '10'))
+ATTENDANCE_JOB_TTL_HOURS = float(os.environ.get('ATTENDANCE_JOB_TTL_HOURS', '24'))
+ATTENDANCE_JOB_POLL_INTERVAL = 0.25
+ATTENDANCE_JOB_SAVE_ATTEMPTS = 3
+ATTENDANCE_JOB_PURGE_INTERVAL = 600 # Detik antar penghapusan job lama per proses
+# Satu thread per job yang bisa diterima pool pengenalan, agar tidak ada job yang menunggu thread
+job_finisher = ThreadPoolExecutor(max_workers=int(os.environ.get('ATTENDANCE_JOB_THREADS', recognition_pool.capacity)),
+                                  thread_name_prefix='attendance-job')
+
+def finish_attendance_job(app, job_id, future, student_id, course_id, image_bytes, location):
+    """
+    Menunggu hasil pengenalan wajah, mencatat presensi, lalu menyimpan hasil ke AttendanceJob.
+    Dijalankan di thread job_finisher, di luar request.
+    """
+    with app.app_context():
+        try:
+            face_encoding, error_code = future.result(timeout=recognition_pool.timeout)
+            if face_encoding is None:
+                payload = {'status': 'error', 'message': recognition_error_message(error_code)}
+            else:
+                payload, _ = record_attendance(student_id, course_id, face_encoding, image_bytes, location)
+        except FutureTimeoutError:
+            future.cancel()
+            payload = {'status': 'error', 'message': 'Pengenalan wajah terlalu lama, silakan coba lagi.'}
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error saat memproses job presensi {job_id}: {e}")
+            payload = {'status': 'error', 'message': 'Terjadi kesalahan saat memproses presensi.'}
+
+        save_attendance_job_result(job_id, payload)
+        purge_attendance_jobs()
+
+def save_attendance_job_result(job_id, payload):
+    """
+    Menyimpan hasil akhir job, diulang beberapa kali jika commit gagal (misalnya koneksi DB putus).
+    Jika tetap gagal, job yang masih 'pending' dianggap gagal oleh long-poll setelah batas waktunya.
+    """
+    for attempt in range(1, ATTENDANCE_JOB_SAVE_ATTEMPTS + 1):
+        try:
+            job = AttendanceJob.query.get(job_id)
+            job.status = 'done'
+            job.result = json.dumps(payload)
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            return True
+        except Exception as e:
+            db.session.rollback()
+            print(f"Gagal menyimpan hasil job presensi {job_id} (percobaan {attempt}): {e}")
+            sleep(0.5 * attempt)
+    return False
+
+_last_job_purge = 0.0
+
+def purge_attendance_jobs():
+    """
+    Menghapus job presensi yang lebih tua dari ATTENDANCE_JOB_TTL_HOURS, paling sering sekali
+    per ATTENDANCE_JOB_PURGE_INTERVAL detik per proses.
+    """
+    global _last_job_purge
+    if monotonic() - _last_job_purge < ATTENDANCE_JOB_PURGE_INTERVAL:
+        return
+    _last_job_purge = monotonic()
+    try:
+        cutoff = datetime.utcnow() - timedelta(hours=ATTENDANCE_JOB_TTL_HOURS)
+        count = AttendanceJob.query.filter(AttendanceJob.created_at < cutoff).delete(synchronize_session=False)
+        db.session.commit()
+        if count:
+            print(f"{count} job presensi lama dihapus.")
+    except Exception as e:
+        db.session.rollback()
+        print(f"Gagal menghapus job presensi lama: {e}")
+
+def attendance_job_expired(job):
+    """
+    True jika job masih 'pending' jauh melewati batas waktu pengenalan (hasilnya hilang,
+    misalnya proses mati atau penyimpanan hasil gagal), agar klien berhenti menunggu.
+    """
+    if job.created_at is None:
+        return False
+    return datetime.utcnow() > job.created_at + timedelta(seconds=recognition_pool.timeout * 2 + 30)
+
+
+@main.route('/attendance_jobs', methods=['POST'])
+@login_required
+def create_attendance_job():
+    student, course, image_bytes, location, error = parse_attendance_request(attendance_request_data())
+    if error:
+        return jsonify(error[0]), error[1]
+
+    try:
+        future = recognition_pool.submit(image_bytes)
+    except RecognitionBusy as e:
+        return busy_response(e)
+
+    job = AttendanceJob(id=uuid.uuid4().hex, user_id=current_user.id, status='pending')
+    db.session.add(job)
+    db.session.commit()
+
+    job_finisher.submit(finish_attendance_job, current_app._get_current_object(), job.id, future,
+                        student.id, course.id, image_bytes, location)
+    return jsonify({
+        'status': 'pending',
+        'job_id': job.id,
+        'poll_url': url_for('main.attendance_job_result', job_id=job.id),
+    }), 202
+
+
+@main.route('/attendance_jobs/<job_id>', methods=['GET'])
+@login_required
+def attendance_job_result(job_id):
+    """
+    Long-poll hasil job presensi. Request ditahan sampai job selesai atau 'wait' detik berlalu.
+    """
+    wait = min(request.args.get('wait', 0, type=float), ATTENDANCE_JOB_MAX_WAIT)
+    deadline = monotonic() + wait
+    while True:
+        job = AttendanceJob.query.filter_by(id=job_id, user_id=current_user.id).first()
+        if job is None:
+            return jsonify({'status': 'error', 'message': 'Job presensi tidak ditemukan.'}), 404
+        if job.status == 'done':
+            return jsonify(json.loads(job.result))
+        if attendance_job_expired(job):
+            return jsonify({'status': 'error', 'message': 'Terjadi kesalahan saat memproses presensi.'})
+        if monotonic() >= deadline:
+            return jsonify({'status': 'pending', 'job_id': job.id})
+        # Lepaskan koneksi DB selama menunggu agar tidak memenuhi connection pool
+        db.session.remove()
+        sleep(ATTENDANCE_JOB_POLL_INTERVAL)
+
+
+
+@main.route('/upload_queue/status', methods=['GET'])
+@login_required
+def upload_queue_status():
+    """
+    Kedalaman, lag, dan jumlah gagal antrean unggahan S3 (khusus admin).
+    """
+    if not current_user.is_admin:
+        return admin_only_response()
+    return jsonify(upload_queue_stats())
+
+
+def admin_only_response():
+    return jsonify({'status': 'error', 'message': 'Hanya admin yang dapat mengakses data ini.'}), 403
+
+# --- Ringkasan Presensi (dibaca dari tabel agregat, bukan memindai tabel Attendance) ---
+@main.route('/attendance_summary', methods=['GET'])
+@login_required
+def attendance_summary():
+    if not current_user.is_admin:
+        return admin_only_response()
+    return jsonify(attendance_stats.dashboard_summary(request.args.get('days', 7, type=int)))
+
+@main.route('/attendance_summary/date/<date_str>', methods=['GET'])
+@login_required
+def attendance_summary_for_date(date_str):
+    if not current_user.is_admin:
+        return admin_only_response()
+    try:
+        date = datetime.strptime(date_str, '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Format tanggal harus YYYY-MM-DD.'}), 400
+    return jsonify({'date': date.isoformat(), 'courses': attendance_stats.course_counts_for_date(date)})
+
+@main.route('/attendance_summary/courses/<int:course_id>', methods=['GET'])
+@login_required
+def attendance_summary_for_course(course_id):
+    """
+    Tren harian dan persentase kehadiran per mahasiswa untuk satu mata kuliah.
+    """
+    if not current_user.is_admin:
+        return admin_only_response()
+    days = min(request.args.get('days', 30, type=int), 366)
+    today = attendance_stats.today_wib()
+    summary = attendance_stats.student_attendance_rates(course_id)
+    summary['daily'] = attendance_stats.daily_totals(today - timedelta(days=days - 1), today, course_id)
+    return jsonify(summary)
+
+@main.route('/attendance_export', methods=['GET'])
+@login_required
+def export_attendance():
+    """
+    Ekspor presensi (khusus admin) sebagai CSV atau Parquet yang di-stream per batch.
+    Filter opsional: ?course=<kode>&nim=<NIM>&start=YYYY-MM-DD&end=YYYY-MM-DD&format=csv|parquet
+    """
+    if not current_user.is_admin:
+        return admin_only_response()
+    fmt = request.args.get('format', 'csv')
+    if fmt not in attendance_export.EXPORT_FORMATS:
+        return jsonify({'status': 'error', 'message': 'Format ekspor harus csv atau parquet.'}), 400
+    if fmt == 'parquet' and not attendance_export.parquet_available():
+        return jsonify({'status': 'error', 'message': 'Ekspor Parquet belum tersedia di server ini.'}), 400
+    try:
+        start_date = attendance_export.parse_date(request.args.get('start'))
+        end_date = attendance_export.parse_date(request.args.get('end'))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Format tanggal harus YYYY-MM-DD.'}), 400
+    course_code, nim = request.args.get('course') or None, request.args.get('nim') or None
+    try:
+        statement = attendance_export.export_statement(course_code, nim, start_date, end_date)
+    except attendance_export.ExportError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 404
+
+    generator, mimetype, _ = attendance_export.EXPORT_FORMATS[fmt]
+    filename = attendance_export.export_filename(fmt, course_code, nim, start_date, end_date)
+    return Response(stream_with_context(generator(statement)), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
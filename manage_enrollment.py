@@ -0,0 +1,57 @@
+from app import app, db
+from models import Course, Student, Enrollment
+import argparse
+import csv
+
+def read_nims(nims, csv_path):
+    """
+    Menggabungkan NIM dari argumen dan dari kolom pertama file CSV (opsional).
+    """
+    nims = list(nims)
+    if csv_path:
+        with open(csv_path, newline='', encoding='utf-8') as f:
+            nims.extend(row[0].strip() for row in csv.reader(f) if row and row[0].strip())
+    return nims
+
+def manage_enrollment(course_code, nims, remove=False):
+    """
+    Script command-line untuk mendaftarkan (atau mengeluarkan) mahasiswa ke sebuah mata kuliah.
+    Semua perubahan disimpan dalam satu transaksi; cache peserta di galeri wajah ikut diperbarui.
+    """
+    with app.app_context():
+        course = Course.query.filter_by(code=course_code).first()
+        if not course:
+            print(f"Mata kuliah dengan kode '{course_code}' tidak ditemukan.")
+            return
+
+        students = {student.student_id: student.id
+                    for student in Student.query.filter(Student.student_id.in_(nims))}
+        missing = sorted(set(nims) - set(students))
+        enrolled = {student_id for (student_id,) in db.session.query(Enrollment.student_id)
+                    .filter(Enrollment.course_id == course.id)}
+
+        if remove:
+            targets = [student_id for student_id in students.values() if student_id in enrolled]
+            if targets:
+                for enrollment in Enrollment.query.filter(Enrollment.course_id == course.id,
+                                                          Enrollment.student_id.in_(targets)):
+                    db.session.delete(enrollment)
+            print(f"{len(targets)} mahasiswa dikeluarkan dari {course.code} - {course.name}.")
+        else:
+            targets = sorted(set(students.values()) - enrolled)
+            db.session.add_all([Enrollment(course_id=course.id, student_id=student_id) for student_id in targets])
+            print(f"{len(targets)} mahasiswa didaftarkan ke {course.code} - {course.name} "
+                  f"({len(students) - len(targets)} sudah terdaftar sebelumnya).")
+        db.session.commit()
+
+        if missing:
+            print(f"NIM tidak ditemukan ({len(missing)}): {', '.join(missing)}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Mengatur peserta mata kuliah untuk pencocokan wajah per kelas.")
+    parser.add_argument('course_code', help="Kode mata kuliah")
+    parser.add_argument('nims', nargs='*', help="NIM mahasiswa")
+    parser.add_argument('--csv', help="CSV dengan NIM di kolom pertama")
+    parser.add_argument('--remove', action='store_true', help="Keluarkan mahasiswa dari mata kuliah")
+    args = parser.parse_args()
+    manage_enrollment(args.course_code, read_nims(args.nims, args.csv), args.remove)
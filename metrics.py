@@ -0,0 +1,314 @@
+import os
+import json
+import atexit
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from time import perf_counter, sleep, time
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# --- Metrik Latensi dan Counter (format teks Prometheus) ---
+# Setiap tahap pipeline dibungkus span('nama_tahap'): durasinya masuk histogram
+# hadirku_stage_seconds{stage=...} dan, jika ada request yang sedang berjalan di thread ini,
+# juga dicatat untuk header Server-Timing. Biayanya satu perf_counter() dan satu lock pendek
+# per span, sehingga aman dibiarkan aktif saat beban penuh.
+# Metrik dicatat di memori proses. Dengan beberapa worker gunicorn, setiap proses menulis
+# snapshot-nya ke METRICS_DIR dan /metrics menjumlahkan semua snapshot (seperti mode multiprocess
+# prometheus_client), sehingga scrape ke worker mana pun melaporkan seluruh host.
+# Snapshot worker yang sudah berhenti tetap dijumlahkan untuk counter dan histogram agar nilainya
+# tidak turun saat worker di-restart; gauge hanya diambil dari snapshot yang masih baru.
+#
+# METRICS_TIMING_HEADER: '1' = tambahkan header Server-Timing ke setiap respons
+# METRICS_TOKEN: jika diisi, /metrics hanya bisa diakses dengan header 'Authorization: Bearer <token>'
+# METRICS_DIR: folder snapshot bersama semua worker di satu host (kosong = hanya proses yang menjawab).
+#   Isinya dikosongkan gunicorn saat start (on_starting di gunicorn.conf.py).
+# METRICS_FLUSH_INTERVAL: jeda (detik) setiap proses menulis snapshot-nya ke METRICS_DIR
+METRICS_TIMING_HEADER = os.environ.get('METRICS_TIMING_HEADER', '0') == '1'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', '5'))
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Semua Histogram dan Counter mendaftarkan dirinya di sini saat dibuat, sehingga render_metrics()
+# selalu mengekspornya (sama seperti gauge di _gauges)
+_metrics = []
+
+class Histogram:
+    def __init__(self, name, help_text, label_name, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_name = label_name
+        self.buckets = buckets
+        self._series = {} # label -> [jumlah per bucket..., total count, total sum]
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def observe(self, label, seconds):
+        position = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label)
+            if series is None:
+                series = self._series[label] = [0] * (len(self.buckets) + 2)
+            if position < len(self.buckets):
+                series[position] += 1
+            series[-2] += 1
+            series[-1] += seconds
+
+    def snapshot(self):
+        with self._lock:
+            return {label: list(series) for label, series in self._series.items()}
+
+    @staticmethod
+    def merge(total, snapshot):
+        for label, series in snapshot.items():
+            current = total.get(label)
+            total[label] = list(series) if current is None else [a + b for a, b in zip(current, series)]
+
+    def render(self, snapshot):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label, series in sorted(snapshot.items()):
+            labels = f'{self.label_name}="{label}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {series[-2]}')
+            lines.append(f'{self.name}_count{{{labels}}} {series[-2]}')
+            lines.append(f'{self.name}_sum{{{labels}}} {series[-1]:.6f}')
+        return lines
+
+class Counter:
+    def __init__(self, name, help_text, label_name):
+        self.name = name
+        self.help_text = help_text
+        self.label_name = label_name
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def inc(self, label, amount=1):
+        with self._lock:
+            self._values[label] = self._values.get(label, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def merge(total, snapshot):
+        for label, value in snapshot.items():
+            total[label] = total.get(label, 0) + value
+
+    def render(self, snapshot):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label, value in sorted(snapshot.items()):
+            lines.append(f'{self.name}{{{self.label_name}="{label}"}} {value}')
+        return lines
+
+
+stage_seconds = Histogram('hadirku_stage_seconds', 'Durasi tiap tahap pipeline presensi/registrasi.', 'stage')
+request_seconds = Histogram('hadirku_request_seconds', 'Durasi request HTTP per endpoint.', 'endpoint')
+match_outcomes = Counter('hadirku_face_match_total', 'Hasil pencocokan wajah dengan galeri.', 'outcome')
+recognition_errors = Counter('hadirku_recognition_errors_total', 'Frame yang ditolak sebelum/saat pengenalan wajah.', 'reason')
+
+# Gauge dihitung saat scrape lewat fungsi yang didaftarkan modul lain: nama -> (help, fungsi, agregasi)
+# Agregasi antar proses: 'sum', 'min', atau 'max' untuk nilai per proses (misalnya kedalaman antrean
+# pool), None untuk nilai yang sama di semua proses (misalnya dari database), yang cukup dibaca
+# di proses yang menjawab scrape.
+_gauges = {}
+
+# Kelompok gauge yang nilainya berasal dari SATU pemanggilan fungsi per scrape (misalnya satu
+# ringkasan database untuk beberapa gauge): list (fungsi yang mengembalikan dict, {nama: (help, key)}, agregasi)
+_gauge_groups = []
+
+GAUGE_AGGREGATES = {'sum': sum, 'min': min, 'max': max}
+
+def register_gauge(name, help_text, function, aggregate='sum'):
+    _gauges[name] = (help_text, function, aggregate)
+
+def register_gauges(function, gauges, aggregate='sum'):
+    _gauge_groups.append((function, gauges, aggregate))
+
+
+# --- Span per tahap ---
+_local = threading.local()
+
+def start_request_timings():
+    _local.timings = []
+
+def pop_request_timings():
+    timings = getattr(_local, 'timings', None)
+    _local.timings = None
+    return timings
+
+def add_request_timings(timings):
+    """
+    Menambahkan span yang diukur di tempat lain (misalnya proses worker pengenalan)
+    ke daftar timing request di thread ini, tanpa mencatatnya ulang ke histogram.
+    """
+    current = getattr(_local, 'timings', None)
+    if current is not None:
+        current.extend(timings)
+
+def observe(stage, seconds):
+    stage_seconds.observe(stage, seconds)
+    current = getattr(_local, 'timings', None)
+    if current is not None:
+        current.append((stage, seconds))
+
+@contextmanager
+def span(stage):
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, perf_counter() - start)
+
+# Durasi commit SQLAlchemy (semua session, termasuk worker antrean unggah)
+@event.listens_for(Session, 'before_commit')
+def _start_commit_timer(session):
+    session.info['metrics_commit_started'] = perf_counter()
+
+@event.listens_for(Session, 'after_commit')
+def _stop_commit_timer(session):
+    started = session.info.pop('metrics_commit_started', None)
+    if started is not None:
+        observe('db_commit', perf_counter() - started)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_commit_timer(session):
+    session.info.pop('metrics_commit_started', None)
+
+def server_timing_header(timings):
+    """
+    Header Server-Timing: tahap yang sama dijumlahkan, durasi dalam milidetik.
+    """
+    totals = {}
+    for stage, seconds in timings:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+    return ', '.join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in totals.items())
+
+def _read_gauges():
+    """
+    Nilai semua gauge di proses ini: nama -> (help, nilai, agregasi). Gauge yang gagal dibaca dilewati.
+    """
+    values = {}
+    for name, (help_text, function, aggregate) in _gauges.items():
+        try:
+            values[name] = (help_text, function(), aggregate)
+        except Exception as e:
+            print(f"Gagal membaca gauge {name}: {e}")
+    for function, gauges, aggregate in _gauge_groups:
+        try:
+            result = function()
+        except Exception as e:
+            print(f"Gagal membaca gauge {', '.join(sorted(gauges))}: {e}")
+            continue
+        for name, (help_text, key) in gauges.items():
+            values[name] = (help_text, result.get(key), aggregate)
+    return values
+
+def _process_snapshot(gauges):
+    return {
+        'updated': time(),
+        'metrics': {metric.name: metric.snapshot() for metric in _metrics},
+        'gauges': {name: value for name, (_, value, aggregate) in gauges.items()
+                   if aggregate is not None and value is not None},
+    }
+
+def _write_snapshot(snapshot):
+    path = os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+    # Ditulis ke file sementara lalu di-rename agar proses lain tidak membaca file setengah jadi
+    temp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(temp_path, path)
+
+def _read_snapshots():
+    snapshots = []
+    for name in os.listdir(METRICS_DIR):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(METRICS_DIR, name)) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Gagal membaca snapshot metrik {name}: {e}")
+    return snapshots
+
+def flush_metrics():
+    """
+    Menulis snapshot metrik proses ini ke METRICS_DIR (tidak melakukan apa pun jika kosong).
+    """
+    if not METRICS_DIR:
+        return
+    try:
+        _write_snapshot(_process_snapshot(_read_gauges()))
+    except Exception as e:
+        print(f"Gagal menulis snapshot metrik: {e}")
+
+_flush_thread = None
+
+def start_metrics_flush(interval=METRICS_FLUSH_INTERVAL):
+    """
+    Thread latar yang menulis snapshot proses ini setiap interval detik, agar scrape yang dijawab
+    worker lain ikut menghitungnya. Dipanggil saat worker start (start_worker_services di app.py).
+    """
+    global _flush_thread
+    if not METRICS_DIR or (_flush_thread is not None and _flush_thread.is_alive()):
+        return
+    os.makedirs(METRICS_DIR, exist_ok=True)
+
+    def run():
+        while True:
+            flush_metrics()
+            sleep(interval)
+
+    _flush_thread = threading.Thread(target=run, name='metrics-flush', daemon=True)
+    _flush_thread.start()
+    atexit.register(flush_metrics) # Nilai terakhir worker yang berhenti tetap ikut dijumlahkan
+
+def clear_metrics_dir():
+    """
+    Menghapus snapshot dari proses sebelumnya (dipanggil master gunicorn sebelum worker dibuat).
+    """
+    if not METRICS_DIR or not os.path.isdir(METRICS_DIR):
+        return
+    for name in os.listdir(METRICS_DIR):
+        if name.endswith('.json') or name.endswith('.tmp'):
+            try:
+                os.remove(os.path.join(METRICS_DIR, name))
+            except FileNotFoundError:
+                pass
+
+def render_metrics():
+    gauges = _read_gauges()
+    snapshot = _process_snapshot(gauges)
+    snapshots = [snapshot]
+    if METRICS_DIR:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        _write_snapshot(snapshot)
+        snapshots = _read_snapshots()
+
+    lines = []
+    for metric in _metrics:
+        total = {}
+        for process in snapshots:
+            metric.merge(total, process['metrics'].get(metric.name, {}))
+        lines.extend(metric.render(total))
+
+    # Gauge per proses hanya diambil dari snapshot yang masih diperbarui (proses yang masih hidup)
+    fresh = [process for process in snapshots
+             if snapshot['updated'] - process['updated'] <= METRICS_FLUSH_INTERVAL * 3]
+    for name, (help_text, value, aggregate) in sorted(gauges.items()):
+        if aggregate is not None:
+            found = [process['gauges'][name] for process in fresh if name in process['gauges']]
+            value = GAUGE_AGGREGATES[aggregate](found) if found else None
+        if value is None:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return '\n'.join(lines) + '\n'
@@ -27,13 +27,36 @@ class Course(db.Model):
     code = db.Column(db.String(50), unique=True, nullable=False)
     attendances = db.relationship('Attendance', backref='course_attended', lazy=True)
 
+class Enrollment(db.Model):
+    # Mahasiswa yang terdaftar di sebuah mata kuliah. Pencocokan wajah presensi hanya
+    # membandingkan dengan wajah mahasiswa yang terdaftar (lihat face_gallery.py).
+    # Primary key diawali course_id agar daftar peserta satu mata kuliah dibaca lewat index.
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id'), primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), primary_key=True, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class Attendance(db.Model):
+    # Index komposit untuk cek presensi ganda (mahasiswa + mata kuliah + rentang waktu hari ini),
+    # riwayat per mahasiswa, rekap per mata kuliah, dan daftar admin berurutan waktu (keyset pagination)
+    __table_args__ = (
+        db.Index('ix_attendance_student_course_timestamp', 'student_id', 'course_id', 'timestamp'),
+        db.Index('ix_attendance_student_timestamp', 'student_id', 'timestamp'),
+        db.Index('ix_attendance_course_timestamp', 'course_id', 'timestamp'),
+        db.Index('ix_attendance_timestamp', 'timestamp'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
     course_id = db.Column(db.Integer, db.ForeignKey('course.id'), nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     # Anda mungkin punya status kehadiran (hadir, absen, dll)
     status = db.Column(db.String(20), default='Hadir')
+    # Lokasi saat presensi dan URL S3 foto bukti presensi
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
+    face_image_s3_url = db.Column(db.String(500), nullable=True)
+    # Status unggahan foto (lihat upload_queue.py): NULL = sudah ada di S3 (termasuk foto lama),
+    # 'pending' = masih di antrean unggah, 'failed' = gagal permanen
+    face_image_status = db.Column(db.String(20), nullable=True, index=True)
 
 class FaceData(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -41,11 +64,61 @@ class FaceData(db.Model):
     # --- PENTING: Ganti cara penyimpanan path gambar wajah ---
     # Sekarang simpan URL S3, bukan path lokal
     face_image_s3_url = db.Column(db.String(500), nullable=False) # URL S3 bisa cukup panjang
-    # Anda juga bisa menyimpan face_encoding di sini jika ukurannya tidak terlalu besar
-    # face_encoding = db.Column(db.PickleType, nullable=False) # Contoh menyimpan encoding sebagai binary/pickle
+    face_image_status = db.Column(db.String(20), nullable=True, index=True) # Sama seperti Attendance.face_image_status
+    # Encoding wajah disimpan langsung di DB sebagai bytes float32 little-endian mentah
+    # (128 x 4 = 512 byte), bukan pickle. Format dicatat agar bisa dimigrasi di masa depan.
+    face_encoding = db.Column(db.LargeBinary(512), nullable=True) # NULL = belum di-backfill dari S3
+    face_encoding_format = db.Column(db.String(20), nullable=True) # Contoh: 'f32le-v1'
     
     # Menghubungkan ke objek student untuk akses mudah
     student = db.relationship('Student', backref='face_data', uselist=False)
 
     def __repr__(self):
-        return f"<FaceData {self.face_image_s3_url}>"
\ No newline at end of file
+        return f"<FaceData {self.face_image_s3_url}>"
+
+class FaceDataChange(db.Model):
+    # Log perubahan FaceData (ditulis otomatis oleh gallery_store.py) untuk menyinkronkan galeri
+    # wajah antar proses dan antar server. id yang terus naik dipakai sebagai high-water mark:
+    # setiap galeri cukup membaca baris dengan id > id terakhir yang sudah diterapkannya.
+    id = db.Column(db.Integer, primary_key=True)
+    face_data_id = db.Column(db.Integer, nullable=False) # Tanpa foreign key: baris FaceData bisa sudah dihapus
+    action = db.Column(db.String(10), nullable=False) # 'upsert' atau 'delete'
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+class AttendanceJob(db.Model):
+    # Job presensi asinkron: POST /attendance_jobs langsung mengembalikan id job,
+    # hasil pengenalan wajah diambil klien lewat long-poll GET /attendance_jobs/<id>
+    id = db.Column(db.String(32), primary_key=True) # uuid4 hex
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending') # pending / done
+    result = db.Column(db.Text, nullable=True) # JSON respons akhir (status, message)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True) # Untuk menghapus job lama
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+class PendingUpload(db.Model):
+    # Antrean unggahan write-behind: foto disimpan di sini dalam transaksi yang sama dengan
+    # baris FaceData/Attendance, lalu diunggah ke S3 oleh worker (lihat upload_queue.py)
+    id = db.Column(db.Integer, primary_key=True)
+    s3_key = db.Column(db.String(500), unique=True, nullable=False)
+    content_type = db.Column(db.String(50), nullable=False, default='image/jpeg')
+    data = db.Column(db.LargeBinary(16 * 1024 * 1024), nullable=False) # Dihapus setelah berhasil diunggah
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True) # pending / in_progress / failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    leased_until = db.Column(db.DateTime, nullable=True) # Batas klaim worker saat status 'in_progress'
+    last_error = db.Column(db.String(500), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class CourseDailyAttendance(db.Model):
+    # Agregat jumlah presensi per mata kuliah per hari (tanggal WIB), diperbarui dalam transaksi
+    # yang sama dengan setiap insert/delete Attendance (lihat attendance_stats.py)
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id'), primary_key=True)
+    attendance_date = db.Column(db.Date, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class StudentCourseAttendance(db.Model):
+    # Agregat jumlah presensi per mahasiswa per mata kuliah
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), primary_key=True)
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id'), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    last_attended_at = db.Column(db.DateTime, nullable=True)
@@ -0,0 +1,41 @@
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+# --- Pagination keyset (cursor) untuk daftar presensi yang diurutkan dari yang terbaru ---
+# Halaman berikutnya dimulai dari (timestamp, id) baris terakhir halaman sebelumnya, sehingga
+# database langsung melompat lewat index tanpa membaca dan membuang baris seperti OFFSET.
+
+def encode_cursor(timestamp, row_id):
+    return f"{timestamp.isoformat()}_{row_id}"
+
+def decode_cursor(cursor):
+    """
+    Mengembalikan (timestamp, id) dari string cursor, atau None jika kosong/tidak valid.
+    """
+    if not cursor:
+        return None
+    try:
+        timestamp, row_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except ValueError:
+        return None
+
+def keyset_condition(timestamp_column, id_column, cursor):
+    """
+    Kondisi "lebih lama dari cursor" untuk urutan (timestamp DESC, id DESC).
+    """
+    timestamp, row_id = cursor
+    return or_(timestamp_column < timestamp, and_(timestamp_column == timestamp, id_column < row_id))
+
+def keyset_page(query, timestamp_column, id_column, cursor, page_size):
+    """
+    Mengambil satu halaman dari query yang diurutkan (timestamp DESC, id DESC).
+    Mengembalikan (baris, cursor_berikutnya atau None jika ini halaman terakhir).
+    """
+    if cursor is not None:
+        query = query.filter(keyset_condition(timestamp_column, id_column, cursor))
+    rows = query.order_by(timestamp_column.desc(), id_column.desc()).limit(page_size + 1).all()
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_cursor(rows[-1].timestamp, rows[-1].id)
@@ -0,0 +1,252 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import metrics
+
+# --- Pengaturan Pool Pengenalan Wajah (bisa diubah lewat environment variable) ---
+# RECOGNITION_WORKERS: jumlah proses worker dlib PER PROSES WEB (0 = jalankan langsung di thread request).
+#   Setiap worker gunicorn punya pool sendiri, jadi defaultnya membagi CPU ke WEB_CONCURRENCY
+#   worker web agar total proses dlib tidak melebihi jumlah core.
+# RECOGNITION_QUEUE_SIZE: jumlah job yang boleh menunggu di luar yang sedang diproses
+# RECOGNITION_TIMEOUT: batas waktu (detik) menunggu hasil satu job
+# RECOGNITION_RETRY_AFTER: saran jeda (detik) ke klien saat antrean penuh
+# RECOGNITION_START_METHOD: 'forkserver' (default jika tersedia) atau 'spawn'. Dengan forkserver,
+#   dlib dan modelnya dimuat SEKALI di proses server lalu setiap worker di-fork darinya, sehingga
+#   memori model dibagi copy-on-write; 'spawn' memuat ulang model di setiap worker.
+WEB_CONCURRENCY = max(1, int(os.environ.get('WEB_CONCURRENCY', '1')))
+RECOGNITION_WORKERS = int(os.environ.get('RECOGNITION_WORKERS', str(max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY))))
+RECOGNITION_QUEUE_SIZE = int(os.environ.get('RECOGNITION_QUEUE_SIZE', str(max(1, RECOGNITION_WORKERS) * 4)))
+RECOGNITION_TIMEOUT = float(os.environ.get('RECOGNITION_TIMEOUT', '15'))
+RECOGNITION_RETRY_AFTER = int(os.environ.get('RECOGNITION_RETRY_AFTER', '3'))
+RECOGNITION_START_METHOD = os.environ.get(
+    'RECOGNITION_START_METHOD',
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+
+class RecognitionBusy(Exception):
+    """
+    Antrean pengenalan wajah penuh; klien sebaiknya mencoba lagi setelah retry_after detik.
+    """
+    def __init__(self, retry_after):
+        super().__init__(f"Antrean pengenalan wajah penuh, coba lagi dalam {retry_after} detik.")
+        self.retry_after = retry_after
+
+class RecognitionTimeout(Exception):
+    """
+    Job pengenalan wajah tidak selesai dalam RECOGNITION_TIMEOUT detik.
+    """
+
+
+# --- Fungsi yang dijalankan di dalam proses worker ---
+def _warm_up_worker():
+    """
+    Initializer worker: memuat model deteksi dan encoding dlib SEKALI per proses,
+    sehingga job pertama tidak menanggung biaya pemuatan model.
+    """
+    from face_utils import warm_up_models
+    warm_up_models()
+
+def _encode_job(image_bytes):
+    """
+    Men-decode bytes gambar, memeriksa kualitas frame, lalu menghitung encoding wajah terbesar.
+    Mengembalikan (encoding, None) jika berhasil atau (None, kode_error) jika gagal,
+    dengan kode_error 'invalid_image', 'no_face', atau kode dari check_frame_quality.
+    """
+    from face_utils import decode_image, get_face_encoding, check_frame_quality, FACE_QUALITY_GATE
+    image = decode_image(image_bytes)
+    if image is None:
+        return None, 'invalid_image'
+    # Frame buram/gelap/tanpa wajah ditolak sebelum encoding dlib
+    if FACE_QUALITY_GATE:
+        quality_error = check_frame_quality(image)
+        if quality_error is not None:
+            return None, quality_error
+    face_encoding = get_face_encoding(image)
+    if face_encoding is None:
+        return None, 'no_face'
+    return face_encoding, None
+
+def _encode_all_job(image_bytes):
+    """
+    Mode kamera kelas: men-decode frame lalu menghitung encoding SEMUA wajah di dalamnya.
+    Mengembalikan ((lokasi_wajah, encodings), None) jika berhasil atau (None, kode_error).
+    """
+    from face_utils import decode_image, get_all_face_encodings
+    image = decode_image(image_bytes)
+    if image is None:
+        return None, 'invalid_image'
+    face_locations, face_encodings = get_all_face_encodings(image)
+    if not face_locations:
+        return None, 'no_face'
+    return (face_locations, face_encodings), None
+
+def _noop():
+    return None
+
+def _run_timed(job, image_bytes):
+    """
+    Menjalankan job di worker sambil mengumpulkan span-nya (decode, deteksi, encoding),
+    agar proses web bisa mencatatnya ke /metrics dan header Server-Timing.
+    Mengembalikan (hasil job, list (tahap, detik)).
+    """
+    metrics.start_request_timings()
+    try:
+        result = job(image_bytes)
+    finally:
+        timings = metrics.pop_request_timings()
+    return result, timings
+
+def _unwrap_timed(inner):
+    """
+    Future luar yang berisi hasil job saja; span dari worker dicatat ke histogram proses ini
+    dan disimpan di future.timings. Membatalkan future luar ikut membatalkan job di antrean.
+    """
+    outer = Future()
+    outer.timings = []
+
+    def finish(future):
+        if future.cancelled():
+            outer.cancel()
+            return
+        error = future.exception()
+        if error is None:
+            result, timings = future.result()
+            for stage, seconds in timings:
+                metrics.stage_seconds.observe(stage, seconds)
+            outer.timings = timings
+        if outer.done(): # Sudah dibatalkan karena timeout
+            return
+        if error is None:
+            outer.set_result(result)
+        else:
+            outer.set_exception(error)
+
+    inner.add_done_callback(finish)
+    outer.add_done_callback(lambda future: future.cancelled() and inner.cancel())
+    return outer
+
+
+# --- Pool proses dengan antrean terbatas dan backpressure ---
+class RecognitionPool:
+    def __init__(self, workers=RECOGNITION_WORKERS, queue_size=RECOGNITION_QUEUE_SIZE,
+                 timeout=RECOGNITION_TIMEOUT, retry_after=RECOGNITION_RETRY_AFTER):
+        self.workers = workers
+        self.capacity = max(1, workers) + queue_size # Job yang diproses + yang menunggu
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._in_flight = 0
+
+    @property
+    def queue_depth(self):
+        """
+        Jumlah job yang sedang diproses atau menunggu di antrean.
+        """
+        return self._in_flight
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # forkserver/spawn agar worker tidak mewarisi thread/koneksi DB dari proses web
+                context = multiprocessing.get_context(RECOGNITION_START_METHOD)
+                if RECOGNITION_START_METHOD == 'forkserver':
+                    context.set_forkserver_preload(['face_recognition', 'cv2', 'face_utils'])
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=context,
+                    initializer=_warm_up_worker,
+                )
+            return self._executor
+
+    def _reset_executor(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def start(self):
+        """
+        Menyalakan semua worker di muka (pre-warm) agar model dlib sudah dimuat sebelum jam sibuk.
+        """
+        if self.workers <= 0:
+            _warm_up_worker()
+            return
+        executor = self._get_executor()
+        for future in [executor.submit(_noop) for _ in range(self.workers)]:
+            future.result()
+
+    def shutdown(self):
+        self._reset_executor()
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def submit(self, image_bytes, job=_encode_job):
+        """
+        Mengirim job encoding ke pool tanpa menunggu hasilnya.
+        Langsung melempar RecognitionBusy jika antrean sudah penuh.
+        """
+        if self.workers <= 0:
+            future = Future()
+            future.set_result(job(image_bytes))
+            return future
+
+        if not self._slots.acquire(blocking=False):
+            raise RecognitionBusy(self.retry_after)
+        with self._lock:
+            self._in_flight += 1
+
+        try:
+            try:
+                future = self._get_executor().submit(_run_timed, job, bytes(image_bytes))
+            except BrokenProcessPool:
+                # Worker mati (misalnya crash di dlib); buat pool baru lalu coba sekali lagi
+                self._reset_executor()
+                future = self._get_executor().submit(_run_timed, job, bytes(image_bytes))
+        except Exception:
+            self._release()
+            raise
+        # Slot antrean baru dilepas saat job benar-benar selesai, termasuk job yang timeout
+        future.add_done_callback(self._release)
+        return _unwrap_timed(future)
+
+    def encode(self, image_bytes, job=_encode_job):
+        """
+        Menghitung encoding wajah dari bytes gambar di proses worker dan menunggu hasilnya.
+        Mengembalikan (encoding, kode_error) seperti _encode_job.
+        """
+        future = self.submit(image_bytes, job)
+        try:
+            with metrics.span('recognition'):
+                result = future.result(timeout=self.timeout)
+            metrics.add_request_timings(getattr(future, 'timings', []))
+            return result
+        except FutureTimeoutError:
+            future.cancel()
+            raise RecognitionTimeout(f"Pengenalan wajah melebihi {self.timeout} detik.")
+        except BrokenProcessPool:
+            # Worker mati di tengah job; pool dibuat ulang untuk job berikutnya
+            self._reset_executor()
+            raise RecognitionTimeout("Worker pengenalan wajah berhenti sebelum job selesai.")
+
+    def encode_all(self, image_bytes):
+        """
+        Mode kamera kelas: encoding semua wajah dalam satu frame.
+        Mengembalikan ((lokasi_wajah, encodings), kode_error) seperti _encode_all_job.
+        """
+        return self.encode(image_bytes, _encode_all_job)
+
+
+# Satu pool per proses web
+recognition_pool = RecognitionPool()
+
+# Setiap worker web punya pool sendiri; kedua gauge dijumlahkan untuk seluruh host
+metrics.register_gauge('hadirku_recognition_queue_depth', 'Job pengenalan wajah yang diproses atau menunggu.',
+                       lambda: recognition_pool.queue_depth)
+metrics.register_gauge('hadirku_recognition_queue_capacity', 'Kapasitas antrean pengenalan wajah.',
+                       lambda: recognition_pool.capacity)
@@ -1,8 +1,45 @@
+// Long-poll hasil job presensi sampai statusnya bukan lagi 'pending'
+// (setiap poll ditahan server paling lama ATTENDANCE_JOB_MAX_WAIT detik)
+function pollAttendanceJob(pollUrl) {
+    return fetch(pollUrl + '?wait=10')
+        .then(response => response.json())
+        .then(data => (data.status === 'pending' ? pollAttendanceJob(pollUrl) : data));
+}
+
+function showAttendanceResult(data) {
+    if (data.status === 'success') {
+        Swal.fire('Berhasil!', data.message, 'success')
+            .then(() => {
+                // Redirect ke halaman riwayat setelah presensi berhasil
+                window.location.href = '/records';
+            });
+    } else if (data.status === 'warning') {
+        Swal.fire('Info', data.message, 'info');
+    } else { // status === 'error'
+        Swal.fire('Gagal!', data.message, 'error');
+    }
+}
+
+// Frame kamera diperkecil ke lebar maksimum dari server (data-max-width) lalu dikompres ke JPEG
+// dengan kualitas dari server (data-jpeg-quality); frame lebih besar tidak menambah akurasi
+function captureFrame(video, canvas) {
+    const maxWidth = parseInt(canvas.dataset.maxWidth, 10) || 640;
+    const quality = parseFloat(canvas.dataset.jpegQuality) || 0.8;
+    const sourceWidth = video.videoWidth || canvas.width;
+    const sourceHeight = video.videoHeight || canvas.height;
+    const scale = Math.min(1, maxWidth / sourceWidth);
+    canvas.width = Math.round(sourceWidth * scale);
+    canvas.height = Math.round(sourceHeight * scale);
+    canvas.getContext('2d').drawImage(video, 0, 0, canvas.width, canvas.height);
+    return new Promise((resolve, reject) => {
+        canvas.toBlob(blob => (blob ? resolve(blob) : reject(new Error('Gagal mengambil gambar'))), 'image/jpeg', quality);
+    });
+}
+
 document.addEventListener('DOMContentLoaded', function() {
     const video = document.getElementById('video');
     const canvas = document.getElementById('canvas');
     const attendBtn = document.getElementById('attend-btn');
-    const context = canvas.getContext('2d');
 
     // Mengakses webcam pengguna
     if (navigator.mediaDevices && navigator.mediaDevices.getUserMedia) {
@@ -46,36 +83,26 @@ document.addEventListener('DOMContentLoaded', function() {
                     longitude: position.coords.longitude
                 };
 
-                // 2. Ambil gambar dari video
-                context.drawImage(video, 0, 0, canvas.width, canvas.height);
-                const imageData = canvas.toDataURL('image/jpeg');
-
-                // 3. Kirim data ke server
-                fetch('/mark_attendance', {
-                        method: 'POST',
-                        headers: {
-                            'Content-Type': 'application/json',
-                        },
-                        body: JSON.stringify({
-                            image_data: imageData,
-                            location: location,
-                            matakuliah_id: selectedCourseId // Kirim ID mata kuliah
-                        }),
+                // 2. Ambil gambar dari video sebagai JPEG biner dengan ukuran dan kualitas dari server
+                captureFrame(video, canvas)
+                    .then(imageBlob => {
+                        // 3. Kirim data ke server sebagai job (multipart, tanpa base64); server langsung membalas dengan id job
+                        const formData = new FormData();
+                        formData.append('image', imageBlob, 'presensi.jpg');
+                        formData.append('matakuliah_id', selectedCourseId); // Kirim ID mata kuliah
+                        formData.append('latitude', location.latitude);
+                        formData.append('longitude', location.longitude);
+                        return fetch('/attendance_jobs', { method: 'POST', body: formData });
                     })
                     .then(response => response.json())
                     .then(data => {
-                        if (data.status === 'success') {
-                            Swal.fire('Berhasil!', data.message, 'success')
-                                .then(() => {
-                                    // Redirect ke halaman riwayat setelah presensi berhasil
-                                    window.location.href = '/records';
-                                });
-                        } else if (data.status === 'warning') {
-                            Swal.fire('Info', data.message, 'info');
-                        } else { // status === 'error'
-                            Swal.fire('Gagal!', data.message, 'error');
+                        // 4. Tunggu hasil pengenalan wajah lewat long-poll
+                        if (data.status === 'pending') {
+                            return pollAttendanceJob(data.poll_url);
                         }
+                        return data;
                     })
+                    .then(showAttendanceResult)
                     .catch(error => {
                         console.error('Error:', error);
                         Swal.fire('Error', 'Terjadi kesalahan saat berkomunikasi dengan server.', 'error');
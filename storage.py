@@ -0,0 +1,379 @@
+import os
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from metrics import span, Counter
+
+# --- Pengaturan Penyimpanan Objek (bisa diubah lewat environment variable) ---
+# STORAGE_BACKEND: 's3' (produksi) atau 'local' (folder lokal, untuk pengujian offline)
+# LOCAL_STORAGE_DIR: folder untuk backend 'local'
+# STORAGE_CACHE_DIR: folder cache disk LRU (kosong = cache nonaktif)
+# STORAGE_CACHE_MAX_MB: batas ukuran cache disk
+# S3_MAX_POOL_CONNECTIONS: ukuran connection pool klien S3
+# STORAGE_THREADS: jumlah thread untuk get/put paralel
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 's3')
+LOCAL_STORAGE_DIR = os.environ.get('LOCAL_STORAGE_DIR', 'instance/storage')
+STORAGE_CACHE_DIR = os.environ.get('STORAGE_CACHE_DIR', '')
+STORAGE_CACHE_MAX_MB = int(os.environ.get('STORAGE_CACHE_MAX_MB', '512'))
+S3_MAX_POOL_CONNECTIONS = int(os.environ.get('S3_MAX_POOL_CONNECTIONS', '50'))
+STORAGE_THREADS = int(os.environ.get('STORAGE_THREADS', '16'))
+
+class StorageError(Exception):
+    """
+    Kesalahan umum saat membaca atau menulis objek.
+    """
+
+class ObjectNotFound(StorageError):
+    """
+    Objek dengan key tersebut tidak ada.
+    """
+
+class NotModified(StorageError):
+    """
+    Objek belum berubah sejak ETag yang diberikan (respons 304).
+    """
+
+
+class BaseStorage:
+    """
+    Operasi batch paralel yang sama untuk semua backend.
+    """
+    _executor = None
+    _executor_lock = threading.Lock()
+
+    @classmethod
+    def executor(cls):
+        with cls._executor_lock:
+            if BaseStorage._executor is None:
+                BaseStorage._executor = ThreadPoolExecutor(max_workers=STORAGE_THREADS, thread_name_prefix='storage')
+            return BaseStorage._executor
+
+    def get_many(self, keys):
+        """
+        Mengambil banyak objek secara paralel. Mengembalikan {key: bytes}; objek yang gagal dilewati.
+        """
+        def fetch(key):
+            try:
+                return key, self.get_bytes(key)[0]
+            except StorageError as e:
+                print(f"Gagal mengambil objek '{key}': {e}")
+                return key, None
+        return {key: data for key, data in self.executor().map(fetch, keys) if data is not None}
+
+    def put_many(self, items, content_type='application/octet-stream'):
+        """
+        Mengunggah banyak (key, bytes) secara paralel. Mengembalikan {key: url}; yang gagal dilewati.
+        """
+        def store(item):
+            key, data = item
+            try:
+                self.put_bytes(key, data, content_type)
+                return key, self.url_for(key)
+            except StorageError as e:
+                print(f"Gagal mengunggah objek '{key}': {e}")
+                return key, None
+        return {key: url for key, url in self.executor().map(store, items) if url is not None}
+
+
+# --- Backend S3 dengan connection pool yang disetel ---
+class S3Storage(BaseStorage):
+    def __init__(self, bucket, region, max_pool_connections=S3_MAX_POOL_CONNECTIONS):
+        import boto3
+        from botocore.config import Config
+        self.bucket = bucket
+        self.region = region
+        self.base_url = f"https://{bucket}.s3.{region}.amazonaws.com/"
+        # Satu klien (thread-safe) untuk seluruh proses; pool koneksi cukup besar untuk get/put paralel
+        self.client = boto3.client('s3', region_name=region, config=Config(
+            max_pool_connections=max_pool_connections,
+            retries={'max_attempts': 5, 'mode': 'adaptive'},
+            connect_timeout=5,
+            read_timeout=30,
+            tcp_keepalive=True,
+        ))
+
+    def url_for(self, key):
+        return f"{self.base_url}{key}"
+
+    def key_from_url(self, url):
+        if url.startswith(self.base_url):
+            return url[len(self.base_url):]
+        if url.startswith("https://") and ".amazonaws.com/" in url:
+            return '/'.join(url.split('/')[3:])
+        return None
+
+    def _translate(self, error, key):
+        from botocore.exceptions import ClientError
+        if isinstance(error, ClientError):
+            code = error.response['Error']['Code']
+            if code in ('404', 'NoSuchKey'):
+                return ObjectNotFound(key)
+            if code == '304':
+                return NotModified(key)
+        return StorageError(f"{key}: {error}")
+
+    def get_bytes(self, key, if_none_match=None):
+        """
+        Mengambil isi objek. Mengembalikan (bytes, etag).
+        Jika if_none_match diberikan dan objek belum berubah, melempar NotModified.
+        """
+        params = {'Bucket': self.bucket, 'Key': key}
+        if if_none_match:
+            params['IfNoneMatch'] = if_none_match
+        try:
+            with span('storage_get'):
+                response = self.client.get_object(**params)
+                return response['Body'].read(), response['ETag']
+        except Exception as e:
+            raise self._translate(e, key) from e
+
+    def put_bytes(self, key, data, content_type='application/octet-stream'):
+        try:
+            with span('storage_put'):
+                response = self.client.put_object(Bucket=self.bucket, Key=key, Body=data, ContentType=content_type)
+            return response['ETag']
+        except Exception as e:
+            raise self._translate(e, key) from e
+
+    def delete(self, key):
+        try:
+            self.client.delete_object(Bucket=self.bucket, Key=key)
+        except Exception as e:
+            raise self._translate(e, key) from e
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except Exception as e:
+            error = self._translate(e, key)
+            if isinstance(error, ObjectNotFound):
+                return False
+            raise error from e
+
+    def presigned_url(self, key, expires_in):
+        """
+        URL GET bertanda tangan yang berlaku expires_in detik (untuk bucket privat).
+        """
+        return self.client.generate_presigned_url(
+            'get_object', Params={'Bucket': self.bucket, 'Key': key}, ExpiresIn=int(expires_in))
+
+
+# --- Backend folder lokal (pengganti S3 untuk pengujian offline) ---
+class LocalStorage(BaseStorage):
+    def __init__(self, root=LOCAL_STORAGE_DIR):
+        self.root = os.path.abspath(root)
+        self.base_url = f"file://{self.root}/"
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key):
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise StorageError(f"Key tidak valid: {key}")
+        return path
+
+    def url_for(self, key):
+        return f"{self.base_url}{key}"
+
+    def key_from_url(self, url):
+        return url[len(self.base_url):] if url.startswith(self.base_url) else None
+
+    def get_bytes(self, key, if_none_match=None):
+        try:
+            with span('storage_get'), open(self._path(key), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError as e:
+            raise ObjectNotFound(key) from e
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        if if_none_match == etag:
+            raise NotModified(key)
+        return data, etag
+
+    def put_bytes(self, key, data, content_type='application/octet-stream'):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with span('storage_put'):
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        return f'"{hashlib.md5(data).hexdigest()}"'
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def presigned_url(self, key, expires_in):
+        return self.url_for(key)
+
+
+# --- Cache disk LRU di depan backend mana pun ---
+# Setiap entri disimpan sebagai file bernama hash dari key, dengan ETag di file pendamping.
+# Objek wajah dan encoding tidak pernah ditimpa (key selalu unik), sehingga secara default
+# cache dipercaya tanpa revalidasi; revalidate=True memakai GET bersyarat (If-None-Match).
+# Folder cache dipakai bersama oleh semua worker, jadi isinya (bukan catatan di memori proses)
+# yang menjadi acuan: hit ditandai dengan memperbarui mtime file, dan ukuran serta urutan
+# eviction dihitung dari folder. Folder dipindai ulang setiap proses menulis max_bytes/20 byte,
+# sehingga ukuran cache paling banyak melewati batas sebesar jumlah worker x 5%.
+cache_reads = Counter('hadirku_storage_cache_reads_total', 'Pembacaan objek lewat cache disk (hit atau miss).', 'result')
+
+class CachedStorage(BaseStorage):
+    def __init__(self, backend, cache_dir, max_bytes):
+        self.backend = backend
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._scan_every = max(1, max_bytes // 20)
+        self._written = 0 # Byte yang ditulis proses ini sejak pemindaian terakhir
+        os.makedirs(cache_dir, exist_ok=True)
+        self._evict()
+
+    def __getattr__(self, name):
+        # url_for, key_from_url, dll. diteruskan ke backend
+        if name == 'backend':
+            raise AttributeError(name)
+        return getattr(self.backend, name)
+
+    def _entry(self, key):
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def _path(self, entry, suffix):
+        return os.path.join(self.cache_dir, f"{entry}{suffix}")
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+        cache_reads.inc('hit' if name == 'hits' else 'miss')
+
+    def _read(self, entry):
+        try:
+            with open(self._path(entry, '.bin'), 'rb') as f:
+                data = f.read()
+            with open(self._path(entry, '.etag')) as f:
+                etag = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(self._path(entry, '.bin')) # Tandai baru dipakai untuk urutan LRU
+        except FileNotFoundError:
+            pass
+        return data, etag
+
+    def _remove(self, entry):
+        for suffix in ('.bin', '.etag'):
+            try:
+                os.remove(self._path(entry, suffix))
+            except FileNotFoundError:
+                pass
+
+    def _write(self, entry, data, etag):
+        base = os.path.join(self.cache_dir, entry)
+        # Nama file sementara unik per proses/thread karena cache dipakai bersama oleh semua worker
+        suffix = f"{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(f"{base}.etag.{suffix}", 'w') as f:
+            f.write(etag)
+        with open(f"{base}.bin.{suffix}", 'wb') as f:
+            f.write(data)
+        os.replace(f"{base}.etag.{suffix}", f"{base}.etag")
+        os.replace(f"{base}.bin.{suffix}", f"{base}.bin")
+        with self._lock:
+            self._written += len(data)
+            if self._written < self._scan_every:
+                return
+            self._written = 0
+        self._evict()
+
+    def _evict(self):
+        """
+        Menghitung ukuran cache dari folder lalu menghapus entri yang paling lama tidak dipakai
+        (mtime tertua) sampai ukurannya di bawah max_bytes.
+        """
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.bin'):
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except FileNotFoundError: # Baru saja dihapus worker lain
+                    continue
+                files.append((stat.st_mtime, name[:-4], stat.st_size))
+        size = sum(file_size for _, _, file_size in files)
+        files.sort()
+        # Entri terbaru selalu dipertahankan walaupun lebih besar dari batas
+        for _, entry, file_size in files[:-1]:
+            if size <= self.max_bytes:
+                break
+            self._remove(entry)
+            size -= file_size
+
+    def get_bytes(self, key, if_none_match=None, revalidate=False):
+        entry = self._entry(key)
+        cached = self._read(entry)
+        if cached is not None:
+            if revalidate:
+                try:
+                    data, etag = self.backend.get_bytes(key, if_none_match=cached[1])
+                    self._write(entry, data, etag)
+                    self._count('misses')
+                    return data, etag
+                except NotModified:
+                    pass
+            self._count('hits')
+            if if_none_match == cached[1]:
+                raise NotModified(key)
+            return cached
+
+        self._count('misses')
+        data, etag = self.backend.get_bytes(key)
+        self._write(entry, data, etag)
+        if if_none_match == etag:
+            raise NotModified(key)
+        return data, etag
+
+    def put_bytes(self, key, data, content_type='application/octet-stream'):
+        etag = self.backend.put_bytes(key, data, content_type)
+        self._write(self._entry(key), data, etag) # Write-through: bacaan berikutnya langsung dari cache
+        return etag
+
+    def exists(self, key):
+        return os.path.exists(self._path(self._entry(key), '.bin')) or self.backend.exists(key)
+
+    def delete(self, key):
+        self.backend.delete(key)
+        self._remove(self._entry(key))
+
+
+# --- Instance penyimpanan per proses ---
+_storage = None
+_storage_lock = threading.Lock()
+
+def create_storage(backend=STORAGE_BACKEND, cache_dir=STORAGE_CACHE_DIR):
+    """
+    Membuat backend penyimpanan sesuai konfigurasi, dibungkus cache disk jika cache_dir diisi.
+    """
+    if backend == 'local':
+        storage = LocalStorage()
+    elif backend == 's3':
+        storage = S3Storage(os.environ.get('S3_BUCKET_NAME'), os.environ.get('S3_REGION', 'ap-southeast-1'))
+    else:
+        raise ValueError(f"Backend penyimpanan tidak dikenal: {backend}")
+    if cache_dir:
+        storage = CachedStorage(storage, cache_dir, STORAGE_CACHE_MAX_MB * 1024 * 1024)
+    return storage
+
+def get_storage():
+    """
+    Mengembalikan instance penyimpanan proses ini (dibuat saat pertama kali dipakai).
+    """
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = create_storage()
+    return _storage
@@ -0,0 +1,46 @@
+import os
+import sys
+import pytest
+
+# Test berjalan tanpa RDS/S3: database SQLite di memori dan tanpa worker antrean unggah di latar
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('UPLOAD_QUEUE_WORKER', '0')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Modul aplikasi (gallery_store, face_gallery, ...) di-import lewat app.py, jadi app dimuat lebih dulu
+import app # noqa: E402,F401
+
+@pytest.fixture
+def db():
+    """
+    Database kosong di dalam app context untuk satu test. Cache pengguna per proses ikut
+    dikosongkan karena id User yang sama dipakai ulang di setiap database baru.
+    """
+    from app import app, db
+    import models # noqa: F401
+    from user_cache import user_cache
+    user_cache.clear()
+    with app.app_context():
+        db.create_all()
+        yield db
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(db):
+    from app import app
+    return app.test_client()
+
+def login(client, db, username='2201001', is_admin=False):
+    """
+    Membuat User (dan Student dengan NIM = username) lalu menandainya login di session test client.
+    """
+    from models import Student, User
+    user = User(username=username, password_hash='-', is_admin=is_admin)
+    student = Student(name=f"Mahasiswa {username}", student_id=username)
+    db.session.add_all([user, student])
+    db.session.commit()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+    return user, student
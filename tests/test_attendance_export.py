@@ -0,0 +1,67 @@
+import csv
+import io
+from datetime import date, datetime
+
+import pytest
+
+import attendance_export
+from attendance_export import export_statement, iter_csv, wib_day_bounds
+from conftest import login
+
+@pytest.fixture
+def attendances(db):
+    from models import Attendance, Course, Student
+    students = [Student(name='Budi', student_id='2201'), Student(name='Sari', student_id='2202')]
+    courses = [Course(name='Basis Data', code='BD'), Course(name='Jaringan', code='JK')]
+    db.session.add_all(students + courses)
+    db.session.flush()
+    for student, course, timestamp in [
+        (students[0], courses[0], datetime(2024, 3, 1, 1, 0)),
+        (students[1], courses[0], datetime(2024, 3, 1, 17, 30)), # 00:30 WIB tanggal 2
+        (students[0], courses[1], datetime(2024, 3, 2, 2, 0)),
+    ]:
+        db.session.add(Attendance(student_id=student.id, course_id=course.id, timestamp=timestamp))
+    db.session.commit()
+
+def read_csv(chunks):
+    return list(csv.DictReader(io.StringIO(''.join(chunks))))
+
+def test_wib_day_bounds():
+    assert wib_day_bounds(date(2024, 3, 2), date(2024, 3, 2)) == (datetime(2024, 3, 1, 17, 0), datetime(2024, 3, 2, 17, 0))
+    assert wib_day_bounds() == (None, None)
+
+def test_csv_streams_one_chunk_per_batch(attendances):
+    chunks = list(iter_csv(export_statement(), batch_size=2))
+    assert len(chunks) == 3 # Dua batch lalu sisa buffer
+    rows = read_csv(chunks)
+    assert [row['nim'] for row in rows] == ['2201', '2202', '2201']
+    assert rows[1]['waktu_utc'] == '2024-03-01 17:30:00' and rows[1]['waktu_wib'] == '2024-03-02 00:30:00'
+
+def test_filters_by_course_student_and_wib_date(attendances):
+    assert [row['nim'] for row in read_csv(iter_csv(export_statement(course_code='BD')))] == ['2201', '2202']
+    assert [row['kode_mk'] for row in read_csv(iter_csv(export_statement(nim='2201')))] == ['BD', 'JK']
+    rows = read_csv(iter_csv(export_statement(start_date=date(2024, 3, 2), end_date=date(2024, 3, 2))))
+    assert [(row['nim'], row['kode_mk']) for row in rows] == [('2202', 'BD'), ('2201', 'JK')]
+    with pytest.raises(attendance_export.ExportError):
+        export_statement(course_code='XX')
+
+def test_export_endpoint_is_admin_only(client, db, attendances):
+    login(client, db, username='2299')
+    assert client.get('/attendance_export').status_code == 403
+
+def test_export_endpoint_streams_csv(client, db, attendances, monkeypatch):
+    login(client, db, username='admin', is_admin=True)
+    response = client.get('/attendance_export?course=BD&start=2024-03-02')
+    assert response.status_code == 200
+    assert 'presensi_BD_2024-03-02.csv' in response.headers['Content-Disposition']
+    assert [row['nim'] for row in read_csv([response.get_data(as_text=True)])] == ['2202']
+    assert client.get('/attendance_export?course=XX').status_code == 404
+    assert client.get('/attendance_export?start=kemarin').status_code == 400
+    monkeypatch.setattr(attendance_export, 'parquet_available', lambda: False)
+    assert client.get('/attendance_export?format=parquet').status_code == 400
+
+def test_parquet_round_trip(attendances):
+    pq = pytest.importorskip('pyarrow.parquet')
+    data = b''.join(attendance_export.iter_parquet(export_statement(), batch_size=2))
+    table = pq.read_table(io.BytesIO(data))
+    assert table.num_rows == 3 and table.column('nim').to_pylist() == ['2201', '2202', '2201']
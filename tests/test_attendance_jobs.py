@@ -0,0 +1,113 @@
+import json
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+import main
+from conftest import login
+
+def resolved(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+@pytest.fixture
+def course(db):
+    from models import Course
+    course = Course(name='Basis Data', code='BD')
+    db.session.add(course)
+    db.session.commit()
+    return course
+
+@pytest.fixture
+def inline_jobs(monkeypatch):
+    # Job diselesaikan langsung di thread request agar test tidak bergantung pada thread latar
+    monkeypatch.setattr(main.job_finisher, 'submit', lambda function, *args: function(*args))
+
+def add_job(db, user, status='pending', result=None, age=timedelta(0)):
+    from models import AttendanceJob
+    job = AttendanceJob(id=f"job{AttendanceJob.query.count()}", user_id=user.id, status=status,
+                        result=json.dumps(result) if result else None, created_at=datetime.utcnow() - age)
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+def test_job_reports_recognition_error(client, db, course, inline_jobs, monkeypatch):
+    login(client, db)
+    monkeypatch.setattr(main.recognition_pool, 'submit', lambda image_bytes: resolved((None, 'blurry')))
+    response = client.post(f"/attendance_jobs?matakuliah_id={course.id}", data=b'jpeg', content_type='image/jpeg')
+    assert response.status_code == 202
+    result = client.get(response.get_json()['poll_url']).get_json()
+    assert result == {'status': 'error', 'message': main.RECOGNITION_ERROR_MESSAGES['blurry']}
+
+def test_job_records_attendance(client, db, course, inline_jobs, monkeypatch):
+    import face_gallery
+    from models import Attendance, Enrollment
+    _, student = login(client, db)
+    db.session.add(Enrollment(course_id=course.id, student_id=student.id))
+    db.session.commit()
+    encoding = np.full(128, 0.05, dtype=np.float32)
+    gallery = face_gallery.FaceGallery('brute')
+    gallery.replace([1], [student.id], encoding[None, :])
+    monkeypatch.setattr(face_gallery, 'gallery', gallery)
+    monkeypatch.setattr(main.recognition_pool, 'submit', lambda image_bytes: resolved((encoding, None)))
+
+    response = client.post(f"/attendance_jobs?matakuliah_id={course.id}", data=b'jpeg', content_type='image/jpeg')
+    result = client.get(response.get_json()['poll_url'] + '?wait=1').get_json()
+    assert result['status'] == 'success'
+    assert Attendance.query.filter_by(student_id=student.id, course_id=course.id).count() == 1
+
+def test_long_poll_returns_pending_then_result(client, db):
+    user, _ = login(client, db)
+    job_id = add_job(db, user)
+    assert client.get(f"/attendance_jobs/{job_id}?wait=0").get_json() == {'status': 'pending', 'job_id': job_id}
+    done_id = add_job(db, user, status='done', result={'status': 'success', 'message': 'ok'})
+    assert client.get(f"/attendance_jobs/{done_id}?wait=5").get_json()['status'] == 'success'
+
+def test_long_poll_gives_up_on_stuck_job(client, db):
+    user, _ = login(client, db)
+    job_id = add_job(db, user, age=timedelta(hours=1))
+    assert client.get(f"/attendance_jobs/{job_id}").get_json()['status'] == 'error'
+
+def test_job_of_other_user_is_not_found(client, db):
+    from models import User
+    other = User(username='lain', password_hash='-')
+    db.session.add(other)
+    db.session.commit()
+    job_id = add_job(db, other)
+    login(client, db)
+    assert client.get(f"/attendance_jobs/{job_id}").status_code == 404
+
+def test_save_result_retries_failed_commit(db, monkeypatch):
+    from models import AttendanceJob, User
+    user = User(username='u', password_hash='-')
+    db.session.add(user)
+    db.session.commit()
+    job_id = add_job(db, user)
+    commit = db.session.commit
+    failures = [RuntimeError('koneksi putus')]
+    def flaky_commit():
+        if failures:
+            raise failures.pop()
+        commit()
+    monkeypatch.setattr(db.session, 'commit', flaky_commit)
+    monkeypatch.setattr(main, 'sleep', lambda seconds: None)
+
+    assert main.save_attendance_job_result(job_id, {'status': 'success'})
+    monkeypatch.undo()
+    job = AttendanceJob.query.get(job_id)
+    assert job.status == 'done' and json.loads(job.result) == {'status': 'success'}
+
+def test_purge_removes_old_jobs(db, monkeypatch):
+    from models import AttendanceJob, User
+    user = User(username='u', password_hash='-')
+    db.session.add(user)
+    db.session.commit()
+    old_id = add_job(db, user, age=timedelta(hours=main.ATTENDANCE_JOB_TTL_HOURS + 1))
+    new_id = add_job(db, user)
+    monkeypatch.setattr(main, '_last_job_purge', 0.0)
+    main.purge_attendance_jobs()
+    assert [job.id for job in AttendanceJob.query.all()] == [new_id]
+    assert old_id != new_id
@@ -0,0 +1,71 @@
+from datetime import date, datetime
+
+import pytest
+
+import attendance_stats
+from attendance_stats import daily_totals, student_attendance_rates
+
+@pytest.fixture
+def course_and_students(db):
+    from models import Course, Student
+    course = Course(name='Basis Data', code='BD')
+    students = [Student(name=f"Mahasiswa {i}", student_id=f"22010{i}") for i in range(2)]
+    db.session.add_all([course] + students)
+    db.session.commit()
+    return course, students
+
+def attend(db, student, course, timestamp):
+    from models import Attendance
+    attendance = Attendance(student_id=student.id, course_id=course.id, timestamp=timestamp)
+    db.session.add(attendance)
+    db.session.commit()
+    return attendance
+
+def aggregates():
+    from models import CourseDailyAttendance, StudentCourseAttendance
+    return (sorted((row.course_id, row.attendance_date, row.count) for row in CourseDailyAttendance.query),
+            sorted((row.student_id, row.course_id, row.count, row.last_attended_at)
+                   for row in StudentCourseAttendance.query))
+
+def test_insert_counts_by_wib_date(db, course_and_students):
+    course, (first, second) = course_and_students
+    attend(db, first, course, datetime(2024, 1, 1, 18, 0)) # 01:00 WIB tanggal 2
+    attend(db, second, course, datetime(2024, 1, 2, 3, 0))
+    attend(db, first, course, datetime(2024, 1, 2, 16, 0)) # 23:00 WIB tanggal 2
+    totals = daily_totals(date(2024, 1, 1), date(2024, 1, 3), course_id=course.id)
+    assert [row['count'] for row in totals] == [0, 3, 0]
+
+def test_last_attended_keeps_latest(db, course_and_students):
+    course, (student, _) = course_and_students
+    attend(db, student, course, datetime(2024, 1, 8, 2, 0))
+    attend(db, student, course, datetime(2024, 1, 1, 2, 0)) # Presensi lama dimasukkan belakangan
+    rates = student_attendance_rates(course.id)
+    assert rates['meetings'] == 2
+    assert rates['students'][0]['count'] == 2 and rates['students'][0]['rate'] == 1.0
+    assert rates['students'][0]['last_attended_at'] == '2024-01-08T02:00:00'
+
+def test_delete_and_rollback_keep_aggregates_in_sync(db, course_and_students):
+    from models import Attendance
+    course, (student, _) = course_and_students
+    attendance = attend(db, student, course, datetime(2024, 1, 1, 2, 0))
+    db.session.add(Attendance(student_id=student.id, course_id=course.id, timestamp=datetime(2024, 1, 1, 3, 0)))
+    db.session.flush()
+    db.session.rollback()
+    assert aggregates()[0] == [(course.id, date(2024, 1, 1), 1)]
+    db.session.delete(Attendance.query.get(attendance.id))
+    db.session.commit()
+    assert aggregates()[0] == [(course.id, date(2024, 1, 1), 0)]
+
+def test_rebuild_matches_incremental_updates(db, course_and_students, capsys):
+    from models import CourseDailyAttendance, StudentCourseAttendance
+    course, (first, second) = course_and_students
+    for student, timestamp in [(first, datetime(2024, 1, 1, 2, 0)), (second, datetime(2024, 1, 1, 20, 0)),
+                               (first, datetime(2024, 1, 3, 2, 0))]:
+        attend(db, student, course, timestamp)
+    expected = aggregates()
+    CourseDailyAttendance.query.delete()
+    StudentCourseAttendance.query.update({'count': 99})
+    db.session.commit()
+    attendance_stats.rebuild_attendance_stats(batch_size=2)
+    db.session.expire_all()
+    assert aggregates() == expected
@@ -0,0 +1,135 @@
+import numpy as np
+
+from face_gallery import FaceGallery
+from face_index import ENCODING_DIM
+from face_utils import FACE_ENCODING_FORMAT, encoding_to_bytes
+
+def unit_vectors(count, seed=0, scale=0.5):
+    vectors = np.random.default_rng(seed).normal(size=(count, ENCODING_DIM))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True) * scale).astype(np.float32)
+
+def add_students(db, count):
+    from models import Student
+    students = [Student(name=f"Mahasiswa {i}", student_id=f"NIM{i}") for i in range(count)]
+    db.session.add_all(students)
+    db.session.flush()
+    return students
+
+def add_face(db, student, encoding):
+    from models import FaceData
+    face = FaceData(student_id=student.id, face_image_s3_url='https://bucket/wajah.jpg',
+                    face_encoding=encoding_to_bytes(encoding), face_encoding_format=FACE_ENCODING_FORMAT)
+    db.session.add(face)
+    return face
+
+def test_match_within_tolerance():
+    encodings = unit_vectors(3)
+    gallery = FaceGallery('brute')
+    gallery.replace([1, 2, 3], [10, 20, 30], encodings)
+    student_id, distance = gallery.match(encodings[1] + 0.01)
+    assert student_id == 20 and distance < 0.6
+    assert gallery.match(-encodings[1], tolerance=0.3)[0] is None
+
+def test_empty_gallery_returns_no_distance():
+    assert FaceGallery('brute').match(unit_vectors(1)[0]) == (None, None)
+
+def test_apply_adds_replaces_and_removes_faces():
+    encodings = unit_vectors(4)
+    gallery = FaceGallery('brute')
+    gallery.replace([1, 2], [10, 20], encodings[:2])
+    # Wajah 2 diganti encoding baru, wajah 3 ditambahkan, wajah 1 dihapus (tidak ada di rows)
+    gallery.apply([1, 2, 3], [(2, 20, encoding_to_bytes(encodings[2])), (3, 30, encoding_to_bytes(encodings[3]))])
+    assert len(gallery) == 2
+    assert gallery.match(encodings[0], tolerance=0.1)[0] is None
+    assert gallery.match(encodings[2])[0] == 20
+    assert gallery.match(encodings[3])[0] == 30
+
+def test_load_and_refresh_from_database(db):
+    encodings = unit_vectors(3)
+    students = add_students(db, 3)
+    add_face(db, students[0], encodings[0])
+    add_face(db, students[1], encodings[1])
+    db.session.commit()
+
+    gallery = FaceGallery('brute')
+    gallery.load()
+    assert gallery.loaded and len(gallery) == 2
+    assert gallery.match(encodings[1])[0] == students[1].id
+
+    # Perubahan sesudah load ditarik lewat change log, bukan dengan memuat ulang seluruh galeri
+    add_face(db, students[2], encodings[2])
+    from models import FaceData
+    db.session.delete(FaceData.query.filter_by(student_id=students[0].id).one())
+    db.session.commit()
+    gallery.refresh()
+    assert len(gallery) == 2
+    assert gallery.match(encodings[2])[0] == students[2].id
+    assert gallery.match(encodings[0], tolerance=0.1)[0] is None
+
+def test_worker_start_loads_gallery(db, monkeypatch):
+    import app as app_module
+    import face_gallery
+    students = add_students(db, 1)
+    add_face(db, students[0], unit_vectors(1)[0])
+    db.session.commit()
+    monkeypatch.setattr(face_gallery, 'gallery', FaceGallery('brute'))
+    monkeypatch.setattr(face_gallery.gallery_sync, 'start', lambda: None)
+    monkeypatch.setattr(app_module, 'WORKER_WARM_UP', True)
+    from recognition_pool import recognition_pool
+    monkeypatch.setattr(recognition_pool, 'start', lambda: None)
+
+    app_module.start_worker_services().join(timeout=30)
+    assert face_gallery.gallery.loaded and len(face_gallery.gallery) == 1
+
+def test_match_many_gives_each_student_to_one_face():
+    encodings = unit_vectors(2, seed=3)
+    gallery = FaceGallery('brute')
+    gallery.replace([1, 2], [10, 20], encodings)
+    nearer = encodings[0]
+    duplicate = encodings[0] + 0.001 # Kalah dari wajah pertama dan mahasiswa lain terlalu jauh
+    between = 0.55 * encodings[0] + 0.45 * encodings[1] # Terdekat ke 10, tetapi 20 masih dalam toleransi
+    results = gallery.match_many(np.stack([between, nearer, duplicate]), tolerance=0.6)
+    assert [student_id for student_id, _ in results] == [20, 10, None]
+    assert results[2][1] < 0.05 # Jarak terdekat tetap dilaporkan untuk wajah yang tidak mendapat mahasiswa
+
+def test_match_many_on_empty_gallery():
+    assert FaceGallery('brute').match_many(unit_vectors(2)) == [(None, None), (None, None)]
+
+def test_matching_is_limited_to_the_course_roster(db):
+    from models import Course, Enrollment
+    encodings = unit_vectors(2, seed=5)
+    students = add_students(db, 2)
+    course, empty_course = Course(name='Basis Data', code='BD'), Course(name='Jaringan', code='JK')
+    db.session.add_all([course, empty_course])
+    db.session.flush()
+    db.session.add(Enrollment(course_id=course.id, student_id=students[0].id))
+    db.session.commit()
+    gallery = FaceGallery('brute')
+    gallery.replace([1, 2], [students[0].id, students[1].id], encodings)
+
+    assert gallery.match(encodings[0], course_id=course.id, fallback=False)[0] == students[0].id
+    assert gallery.match(encodings[1], course_id=course.id, fallback=False)[0] is None
+    assert gallery.match(encodings[1], course_id=course.id, fallback=True)[0] == students[1].id
+    # Mata kuliah tanpa peserta tidak mencocokkan siapa pun, kecuali dengan fallback
+    assert gallery.match(encodings[0], course_id=empty_course.id, fallback=False) == (None, None)
+    assert gallery.match(encodings[0], course_id=empty_course.id, fallback=True)[0] == students[0].id
+
+def test_match_many_falls_back_to_whole_gallery(db):
+    from models import Course, Enrollment
+    encodings = unit_vectors(2, seed=6)
+    students = add_students(db, 2)
+    course = Course(name='Basis Data', code='BD')
+    db.session.add(course)
+    db.session.flush()
+    db.session.add(Enrollment(course_id=course.id, student_id=students[0].id))
+    db.session.commit()
+    gallery = FaceGallery('brute')
+    gallery.replace([1, 2], [students[0].id, students[1].id], encodings)
+
+    roster_only = gallery.match_many(encodings, course_id=course.id, fallback=False)
+    assert [student_id for student_id, _ in roster_only] == [students[0].id, None]
+    with_fallback = gallery.match_many(encodings, course_id=course.id, fallback=True)
+    assert [student_id for student_id, _ in with_fallback] == [students[0].id, students[1].id]
+    # Mahasiswa yang sudah cocok di daftar peserta tidak diberikan lagi ke wajah lain
+    duplicates = gallery.match_many(np.stack([encodings[0], encodings[0] + 0.001]), course_id=course.id, fallback=True)
+    assert [student_id for student_id, _ in duplicates] == [students[0].id, None]
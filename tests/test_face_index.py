@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from face_index import BruteForceIndex, IVFIndex, SegmentedIndex, make_index, ENCODING_DIM
+
+def random_vectors(count, seed=0):
+    return np.random.default_rng(seed).normal(0, 0.1, (count, ENCODING_DIM)).astype(np.float32)
+
+def exact_nearest(vectors, query, k):
+    distances = np.linalg.norm(vectors.astype(np.float64) - query, axis=1)
+    order = np.argsort(distances)[:k]
+    return order, distances[order]
+
+def test_brute_force_matches_exact_distances():
+    vectors, queries = random_vectors(500), random_vectors(5, seed=1)
+    index = BruteForceIndex(vectors)
+    for query in queries:
+        positions, distances = index.search(query, k=3)
+        expected_positions, expected_distances = exact_nearest(vectors, query, 3)
+        assert positions.tolist() == expected_positions.tolist()
+        assert np.allclose(distances, expected_distances, atol=1e-5)
+
+def test_search_many_matches_search():
+    vectors, queries = random_vectors(300), random_vectors(4, seed=2)
+    index = BruteForceIndex(vectors)
+    positions, distances = index.search_many(queries, k=2)
+    assert positions.shape == (4, 2)
+    for query, row_positions, row_distances in zip(queries, positions, distances):
+        single_positions, single_distances = index.search(query, k=2)
+        assert row_positions.tolist() == single_positions.tolist()
+        assert np.allclose(row_distances, single_distances)
+
+def test_empty_index():
+    index = BruteForceIndex()
+    positions, distances = index.search(random_vectors(1)[0])
+    assert len(index) == 0 and len(positions) == 0 and len(distances) == 0
+    positions, _ = index.search_many(random_vectors(2), k=3)
+    assert positions.shape == (2, 0)
+
+def test_added_and_filtered_return_new_index():
+    vectors = random_vectors(10)
+    index = BruteForceIndex(vectors[:8])
+    grown = index.added(vectors[8:])
+    assert len(index) == 8 and len(grown) == 10
+    keep = np.arange(10) % 2 == 0
+    shrunk = grown.filtered(keep)
+    assert np.array_equal(shrunk.take(np.arange(5)), vectors[keep])
+    assert np.allclose(shrunk.squared_norms(), (vectors[keep] ** 2).sum(axis=1))
+
+def test_ivf_with_all_clusters_probed_is_exact():
+    vectors, queries = random_vectors(IVFIndex.MIN_TRAIN_SIZE + 200), random_vectors(5, seed=3)
+    index = IVFIndex.train(vectors, nlist=8, nprobe=8)
+    assert index.trained
+    for query in queries:
+        positions, _ = index.search(query, k=1)
+        assert positions[0] == exact_nearest(vectors, query, 1)[0][0]
+
+def test_segmented_index_skips_dead_rows():
+    vectors = random_vectors(20)
+    segmented = SegmentedIndex([BruteForceIndex(vectors[:10]), BruteForceIndex(vectors[10:])])
+    assert np.array_equal(segmented.take([3, 15]), vectors[[3, 15]])
+    nearest = segmented.search(vectors[15], k=1)[0][0]
+    assert nearest == 15
+
+    dead = np.zeros(20, dtype=bool)
+    dead[15] = True
+    segmented = SegmentedIndex(segmented.segments, dead)
+    positions, _ = segmented.search(vectors[15], k=3)
+    assert 15 not in positions.tolist() and len(positions) == 3
+    positions, _ = segmented.search_many(vectors[[15]], k=3)
+    assert 15 not in positions[0].tolist()
+
+def test_make_index_rejects_unknown_backend():
+    assert make_index(random_vectors(3), 'brute').backend == 'brute'
+    with pytest.raises(ValueError):
+        make_index(random_vectors(3), 'faiss')
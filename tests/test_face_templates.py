@@ -0,0 +1,66 @@
+import numpy as np
+
+from face_index import BruteForceIndex, ENCODING_DIM
+from face_templates import TemplateSet, student_templates
+
+def unit_vectors(count, seed=0, scale=0.5):
+    vectors = np.random.default_rng(seed).normal(size=(count, ENCODING_DIM))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True) * scale).astype(np.float32)
+
+def around(center, count, seed, spread=0.02):
+    noise = np.random.default_rng(seed).normal(0, spread, (count, ENCODING_DIM))
+    return (center + noise).astype(np.float32)
+
+def test_student_templates_drop_outlier():
+    centers = unit_vectors(2)
+    encodings = np.vstack([around(centers[0], 4, seed=1), centers[1:]])
+    templates, inlier = student_templates(encodings, max_templates=3)
+    assert inlier.tolist() == [True, True, True, True, False]
+    assert len(templates) == 3
+
+def test_student_templates_keep_small_sets():
+    encodings = unit_vectors(2)
+    templates, inlier = student_templates(encodings)
+    assert inlier.all() and np.array_equal(templates, encodings)
+
+def build_gallery():
+    centers = unit_vectors(3, seed=5)
+    encodings = np.vstack([around(centers[0], 4, seed=1), around(centers[1], 2, seed=2), centers[2:]])
+    face_ids = np.arange(1, 8, dtype=np.int64)
+    student_ids = np.array([10, 10, 10, 10, 20, 20, 30], dtype=np.int64)
+    return centers, BruteForceIndex(encodings), face_ids, student_ids
+
+def test_nearest_students_finds_owner():
+    centers, index, face_ids, student_ids = build_gallery()
+    templates = TemplateSet.build(index, face_ids, student_ids)
+    results = templates.nearest_students(index, centers)
+    assert [result[0][0] for result in results] == [10, 20, 30]
+    assert results[2][0][1] < 1e-6
+
+def test_build_reuses_unchanged_students():
+    _, index, face_ids, student_ids = build_gallery()
+    templates = TemplateSet.build(index, face_ids, student_ids)
+    again = TemplateSet.build(index, face_ids, student_ids, previous=templates)
+    assert again.index is templates.index
+
+def test_build_detects_in_place_encoding_update():
+    _, index, face_ids, student_ids = build_gallery()
+    templates = TemplateSet.build(index, face_ids, student_ids)
+    # Wajah 7 (mahasiswa 30) di-encode ulang: id sama, baris lama dibuang dan baris baru ditambahkan
+    replacement = unit_vectors(1, seed=9, scale=0.6)
+    keep = face_ids != 7
+    updated_index = index.filtered(keep).added(replacement)
+    updated = TemplateSet.build(updated_index, np.append(face_ids[keep], 7),
+                                np.append(student_ids[keep], 30), previous=templates)
+    rows = np.flatnonzero(updated.template_students == 30)
+    assert np.allclose(updated.index.take(rows), replacement)
+    results = updated.nearest_students(updated_index, replacement)
+    assert results[0][0][0] == 30 and results[0][0][1] < 1e-6
+
+def test_build_removes_deleted_student():
+    _, index, face_ids, student_ids = build_gallery()
+    templates = TemplateSet.build(index, face_ids, student_ids)
+    keep = student_ids != 20
+    updated = TemplateSet.build(index.filtered(keep), face_ids[keep], student_ids[keep], previous=templates)
+    assert 20 not in updated.template_students.tolist()
+    assert set(updated.students.tolist()) == {10, 30}
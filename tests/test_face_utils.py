@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+import face_utils
+from face_utils import check_frame_quality
+
+class FakeCascade:
+    def __init__(self, faces):
+        self.faces = faces
+
+    def detectMultiScale(self, gray, scaleFactor, minNeighbors):
+        return self.faces
+
+def textured_frame(width=640, height=480, seed=0):
+    # Frame tajam dengan kecerahan sedang
+    return np.random.default_rng(seed).integers(60, 200, size=(height, width, 3), dtype=np.uint8)
+
+@pytest.fixture
+def dlib_faces(monkeypatch):
+    found = []
+    calls = []
+    def detect_faces(image):
+        calls.append(image.shape)
+        return list(found)
+    monkeypatch.setattr(face_utils, 'detect_faces', detect_faces)
+    return found, calls
+
+def test_cascade_miss_falls_back_to_dlib(monkeypatch, dlib_faces):
+    found, calls = dlib_faces
+    monkeypatch.setattr(face_utils, '_get_face_cascade', lambda: FakeCascade(()))
+    found.append((100, 400, 400, 100)) # Wajah 300 px yang dilewatkan cascade
+    assert check_frame_quality(textured_frame()) is None
+    assert calls == [(480, 640, 3)] # dlib menerima frame resolusi asli
+
+def test_no_face_only_when_dlib_agrees(monkeypatch, dlib_faces):
+    monkeypatch.setattr(face_utils, '_get_face_cascade', lambda: FakeCascade(()))
+    assert check_frame_quality(textured_frame()) == 'no_face'
+
+def test_dlib_face_is_still_checked_for_size(monkeypatch, dlib_faces):
+    found, _ = dlib_faces
+    monkeypatch.setattr(face_utils, '_get_face_cascade', lambda: FakeCascade(()))
+    found.append((100, 130, 130, 100)) # 30 px, di bawah FACE_MIN_FACE_SIZE
+    assert check_frame_quality(textured_frame()) == 'face_too_small'
+
+def test_cascade_hit_skips_dlib(monkeypatch, dlib_faces):
+    _, calls = dlib_faces
+    monkeypatch.setattr(face_utils, '_get_face_cascade', lambda: FakeCascade([(50, 50, 150, 150)]))
+    assert check_frame_quality(textured_frame()) is None
+    assert calls == []
+
+def test_dark_and_blurry_frames(monkeypatch, dlib_faces):
+    monkeypatch.setattr(face_utils, '_get_face_cascade', lambda: FakeCascade([(50, 50, 150, 150)]))
+    assert check_frame_quality(np.full((480, 640, 3), 10, dtype=np.uint8)) == 'too_dark'
+    assert check_frame_quality(np.full((480, 640, 3), 120, dtype=np.uint8)) == 'blurry'
@@ -0,0 +1,48 @@
+from datetime import datetime
+
+import gallery_store
+from gallery_store import changes_since, gaps_from_json, gaps_to_json
+
+def log_changes(db, *changes):
+    from models import FaceDataChange
+    db.session.add_all(FaceDataChange(id=change_id, face_data_id=face_id, action='upsert',
+                                      created_at=datetime.utcnow())
+                       for change_id, face_id in changes)
+    db.session.commit()
+
+def test_changes_since_deduplicates_faces(db):
+    log_changes(db, (1, 5), (2, 6), (3, 5))
+    face_ids, high_water_mark, gaps = changes_since(0)
+    assert face_ids == [5, 6]
+    assert high_water_mark == 3 and gaps == {}
+    assert changes_since(3) == ([], 3, {})
+
+def test_late_commit_below_high_water_mark_is_not_skipped(db):
+    # Id 3 sudah dibagikan ke transaksi yang belum commit saat id 4 terbaca
+    log_changes(db, (1, 10), (2, 11), (4, 13))
+    face_ids, high_water_mark, gaps = changes_since(0)
+    assert face_ids == [10, 11, 13]
+    assert high_water_mark == 4 and list(gaps) == [3]
+
+    log_changes(db, (3, 12))
+    face_ids, high_water_mark, gaps = changes_since(high_water_mark, gaps)
+    assert face_ids == [12]
+    assert high_water_mark == 4 and gaps == {}
+
+def test_expired_gap_is_dropped(db, monkeypatch):
+    log_changes(db, (1, 10), (3, 12))
+    _, high_water_mark, gaps = changes_since(0)
+    assert list(gaps) == [2]
+    monkeypatch.setattr(gallery_store, 'FACE_GALLERY_GAP_TIMEOUT', 0)
+    assert changes_since(high_water_mark, gaps) == ([], 3, {})
+
+def test_large_id_jump_is_not_tracked(db, monkeypatch):
+    monkeypatch.setattr(gallery_store, 'FACE_GALLERY_MAX_GAPS', 5)
+    log_changes(db, (1, 10), (100, 11))
+    face_ids, high_water_mark, gaps = changes_since(0)
+    assert face_ids == [10, 11] and high_water_mark == 100 and gaps == {}
+
+def test_gaps_json_round_trip():
+    gaps = {7: 1700000000.5, 3: 1700000001.0}
+    assert gaps_from_json(gaps_to_json(gaps)) == gaps
+    assert gaps_from_json(None) == {}
@@ -0,0 +1,99 @@
+import json
+import os
+from time import time
+
+import pytest
+
+import metrics
+from metrics import Counter, Histogram, render_metrics, server_timing_header
+
+@pytest.fixture(autouse=True)
+def empty_registry(monkeypatch):
+    monkeypatch.setattr(metrics, '_metrics', [])
+    monkeypatch.setattr(metrics, '_gauges', {})
+    monkeypatch.setattr(metrics, '_gauge_groups', [])
+
+def metric_lines(text):
+    return [line.split('{')[0] + ' ' + line.rsplit(' ', 1)[1] if '{' in line else line
+            for line in text.splitlines() if not line.startswith('#')]
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram('test_seconds', 'Durasi test.', 'stage', buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe('detect', seconds)
+    text = render_metrics()
+    assert 'test_seconds_bucket{stage="detect",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{stage="detect",le="1.0"} 3' in text
+    assert 'test_seconds_bucket{stage="detect",le="+Inf"} 4' in text
+    assert 'test_seconds_count{stage="detect"} 4' in text
+    assert '# TYPE test_seconds histogram' in text
+
+def test_counter_is_exported_once_created():
+    counter = Counter('test_errors_total', 'Error test.', 'reason')
+    counter.inc('blurry')
+    counter.inc('blurry')
+    counter.inc('no_face')
+    text = render_metrics()
+    assert '# TYPE test_errors_total counter' in text
+    assert 'test_errors_total{reason="blurry"} 2' in text
+    assert 'pid=' not in text
+    assert metric_lines(text) == ['test_errors_total 2', 'test_errors_total 1']
+
+def test_gauges_skip_failures_and_none():
+    def broken():
+        raise RuntimeError('db mati')
+    metrics.register_gauge('test_ok', 'Gauge normal.', lambda: 3)
+    metrics.register_gauge('test_broken', 'Gauge rusak.', broken)
+    metrics.register_gauge('test_none', 'Gauge kosong.', lambda: None)
+    assert metric_lines(render_metrics()) == ['test_ok 3']
+
+def test_gauge_group_is_read_once_per_render():
+    calls = []
+    def stats():
+        calls.append(1)
+        return {'depth': 4, 'failed': 1}
+    metrics.register_gauges(stats, {'test_depth': ('Kedalaman.', 'depth'),
+                                    'test_failed': ('Gagal.', 'failed')})
+    assert metric_lines(render_metrics()) == ['test_depth 4', 'test_failed 1']
+    assert len(calls) == 1
+
+def test_server_timing_header_sums_stages():
+    header = server_timing_header([('detect', 0.010), ('encode', 0.002), ('detect', 0.005)])
+    assert header == 'detect;dur=15.0, encode;dur=2.0'
+
+def write_process(directory, pid, updated, counters=None, gauges=None):
+    with open(os.path.join(directory, f"{pid}.json"), 'w') as f:
+        json.dump({'updated': updated, 'metrics': counters or {}, 'gauges': gauges or {}}, f)
+
+def test_metrics_dir_sums_all_processes(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_DIR', str(tmp_path))
+    counter = Counter('test_errors_total', 'Error test.', 'reason')
+    histogram = Histogram('test_seconds', 'Durasi test.', 'stage', buckets=(0.1, 1.0))
+    counter.inc('blurry')
+    histogram.observe('detect', 0.05)
+    # Worker lain yang masih hidup dan worker yang sudah berhenti
+    write_process(tmp_path, 1, time(), {'test_errors_total': {'blurry': 2, 'no_face': 1},
+                                        'test_seconds': {'detect': [0, 1, 1, 0.5]}})
+    write_process(tmp_path, 2, time() - 3600, {'test_errors_total': {'blurry': 4}})
+    text = render_metrics()
+    assert 'test_errors_total{reason="blurry"} 7' in text
+    assert 'test_errors_total{reason="no_face"} 1' in text
+    assert 'test_seconds_bucket{stage="detect",le="1.0"} 2' in text
+    assert 'test_seconds_count{stage="detect"} 2' in text
+    assert os.path.exists(tmp_path / f"{os.getpid()}.json")
+
+def test_gauges_aggregate_only_live_processes(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_DIR', str(tmp_path))
+    metrics.register_gauge('test_depth', 'Kedalaman.', lambda: 2)
+    metrics.register_gauge('test_position', 'Posisi.', lambda: 10, aggregate='min')
+    metrics.register_gauges(lambda: {'failed': 5}, {'test_failed': ('Gagal.', 'failed')}, aggregate=None)
+    write_process(tmp_path, 1, time(), gauges={'test_depth': 3, 'test_position': 7, 'test_failed': 100})
+    write_process(tmp_path, 2, time() - 3600, gauges={'test_depth': 50, 'test_position': 1})
+    assert metric_lines(render_metrics()) == ['test_depth 5', 'test_failed 5', 'test_position 7']
+
+def test_clear_metrics_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_DIR', str(tmp_path))
+    write_process(tmp_path, 1, time())
+    (tmp_path / 'lain.txt').write_text('x')
+    metrics.clear_metrics_dir()
+    assert os.listdir(tmp_path) == ['lain.txt']
@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+
+from pagination import encode_cursor, decode_cursor, keyset_page
+
+def test_cursor_round_trip():
+    timestamp = datetime(2024, 3, 1, 7, 30, 15, 123456)
+    assert decode_cursor(encode_cursor(timestamp, 42)) == (timestamp, 42)
+
+def test_decode_cursor_rejects_empty_and_invalid():
+    assert decode_cursor(None) is None
+    assert decode_cursor('') is None
+    assert decode_cursor('bukan-cursor') is None
+    assert decode_cursor('2024-03-01T07:30:15_abc') is None
+
+def test_keyset_page_walks_all_rows_once(db):
+    from models import Attendance, Course, Student
+    student = Student(name='Budi', student_id='123')
+    course = Course(name='Basis Data', code='BD')
+    db.session.add_all([student, course])
+    db.session.flush()
+    start = datetime(2024, 3, 1, 8, 0)
+    # Beberapa baris berbagi timestamp yang sama: id menjadi pemutus urutan
+    for i in range(7):
+        db.session.add(Attendance(student_id=student.id, course_id=course.id,
+                                  timestamp=start + timedelta(minutes=i // 2)))
+    db.session.commit()
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        rows, cursor = keyset_page(Attendance.query, Attendance.timestamp, Attendance.id,
+                                   decode_cursor(cursor), page_size=3)
+        seen.extend((row.timestamp, row.id) for row in rows)
+        pages += 1
+        if cursor is None:
+            break
+    assert pages == 3
+    assert len(seen) == 7 and len(set(seen)) == 7
+    assert seen == sorted(seen, reverse=True)
+
+def test_keyset_page_last_page_has_no_cursor(db):
+    from models import Attendance
+    rows, cursor = keyset_page(Attendance.query, Attendance.timestamp, Attendance.id, None, page_size=3)
+    assert rows == [] and cursor is None
@@ -0,0 +1,32 @@
+import pytest
+
+import recognition_pool
+from recognition_pool import RecognitionBusy, RecognitionPool
+
+def test_inline_pool_runs_job_in_request_thread():
+    pool = RecognitionPool(workers=0)
+    assert pool.encode(b'abc', job=len) == 3
+
+def test_full_queue_raises_busy_without_starting_workers():
+    pool = RecognitionPool(workers=1, queue_size=0, retry_after=7)
+    assert pool._slots.acquire(blocking=False)
+    with pytest.raises(RecognitionBusy) as error:
+        pool.submit(b'abc', job=len)
+    assert error.value.retry_after == 7
+    assert pool._executor is None and pool.queue_depth == 0
+
+def test_start_warms_up_models(monkeypatch):
+    calls = []
+    monkeypatch.setattr(recognition_pool, '_warm_up_worker', lambda: calls.append('warm'))
+    RecognitionPool(workers=0).start()
+    assert calls == ['warm']
+
+def test_worker_start_prewarms_pool(db, monkeypatch):
+    import app as app_module
+    import face_gallery
+    calls = []
+    monkeypatch.setattr(app_module, 'WORKER_WARM_UP', True)
+    monkeypatch.setattr(face_gallery, 'get_gallery', lambda: calls.append('gallery'))
+    monkeypatch.setattr(recognition_pool.recognition_pool, 'start', lambda: calls.append('pool'))
+    app_module.start_worker_services().join(timeout=30)
+    assert calls == ['gallery', 'pool']
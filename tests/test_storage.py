@@ -0,0 +1,61 @@
+import os
+import time
+
+import pytest
+
+from storage import CachedStorage, LocalStorage, NotModified, ObjectNotFound, StorageError
+
+@pytest.fixture
+def local(tmp_path):
+    return LocalStorage(str(tmp_path / 'objects'))
+
+def cache_files(cache):
+    return sorted(name for name in os.listdir(cache.cache_dir) if name.endswith('.bin'))
+
+def test_local_storage_round_trip(local):
+    etag = local.put_bytes('faces/1.jpg', b'wajah')
+    assert local.exists('faces/1.jpg')
+    assert local.get_bytes('faces/1.jpg') == (b'wajah', etag)
+    with pytest.raises(NotModified):
+        local.get_bytes('faces/1.jpg', if_none_match=etag)
+    assert local.key_from_url(local.url_for('faces/1.jpg')) == 'faces/1.jpg'
+    local.delete('faces/1.jpg')
+    assert not local.exists('faces/1.jpg')
+    with pytest.raises(ObjectNotFound):
+        local.get_bytes('faces/1.jpg')
+
+def test_local_storage_rejects_keys_outside_root(local):
+    with pytest.raises(StorageError):
+        local.put_bytes('../luar.jpg', b'x')
+
+def test_cache_counts_hits_and_misses(local, tmp_path):
+    local.put_bytes('a', b'aaaa')
+    cache = CachedStorage(local, str(tmp_path / 'cache'), 1024)
+    assert cache.get_bytes('a')[0] == b'aaaa'
+    assert cache.get_bytes('a')[0] == b'aaaa'
+    assert (cache.hits, cache.misses) == (1, 1)
+    local.delete('a') # Objek yang sudah di-cache tetap bisa dibaca
+    assert cache.get_bytes('a')[0] == b'aaaa'
+    assert cache.hits == 2
+
+def test_cache_size_is_shared_by_all_processes(local, tmp_path):
+    # Dua instance mewakili dua worker yang memakai folder cache yang sama
+    first = CachedStorage(local, str(tmp_path / 'cache'), 10)
+    second = CachedStorage(local, str(tmp_path / 'cache'), 10)
+    first.put_bytes('a', b'12345')
+    time.sleep(0.01)
+    second.put_bytes('b', b'12345')
+    time.sleep(0.01)
+    first.get_bytes('a') # 'a' baru dipakai, jadi 'b' yang paling lama
+    time.sleep(0.01)
+    second.put_bytes('c', b'12345')
+    assert cache_files(first) == sorted(f"{first._entry(key)}.bin" for key in ('a', 'c'))
+
+def test_cache_exists_follows_directory(local, tmp_path):
+    first = CachedStorage(local, str(tmp_path / 'cache'), 1024)
+    second = CachedStorage(local, str(tmp_path / 'cache'), 1024)
+    first.put_bytes('a', b'aaaa')
+    second.delete('a')
+    assert not first.exists('a')
+    with pytest.raises(ObjectNotFound):
+        first.get_bytes('a')
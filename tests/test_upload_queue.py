@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import upload_queue
+from storage import LocalStorage, StorageError
+
+class FailingStorage(LocalStorage):
+    def put_bytes(self, key, data, content_type='application/octet-stream'):
+        raise StorageError('S3 tidak bisa dihubungi')
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    storage = LocalStorage(str(tmp_path / 'objects'))
+    monkeypatch.setattr(upload_queue, 'get_storage', lambda: storage)
+    monkeypatch.setattr(upload_queue, 'create_thumbnail', lambda key, data, storage: True)
+    return storage
+
+def add_attendance(db, key):
+    from models import Attendance, Course, Student
+    student = Student(name='Budi', student_id=key)
+    course = Course(name='Basis Data', code=key)
+    db.session.add_all([student, course])
+    db.session.flush()
+    attendance = Attendance(student_id=student.id, course_id=course.id, face_image_status='pending',
+                            face_image_s3_url=upload_queue.enqueue_upload(f"attendance_captures/{key}.jpg", b'foto'))
+    db.session.add(attendance)
+    db.session.commit()
+    return attendance.id
+
+def test_upload_clears_image_status(db, storage):
+    from models import Attendance, PendingUpload
+    attendance_id = add_attendance(db, 'a')
+    assert upload_queue.process_batch() == (1, 0)
+    assert storage.get_bytes('attendance_captures/a.jpg')[0] == b'foto'
+    assert PendingUpload.query.count() == 0
+    assert Attendance.query.get(attendance_id).face_image_status is None
+
+def test_failed_upload_is_retried_then_marked_failed(db, storage, tmp_path, monkeypatch):
+    from models import Attendance, PendingUpload
+    attendance_id = add_attendance(db, 'a')
+    monkeypatch.setattr(upload_queue, 'get_storage', lambda: FailingStorage(str(tmp_path / 'objects')))
+    monkeypatch.setattr(upload_queue, 'UPLOAD_QUEUE_MAX_ATTEMPTS', 2)
+
+    assert upload_queue.process_batch() == (0, 1)
+    pending = PendingUpload.query.one()
+    assert (pending.status, pending.attempts) == ('pending', 1)
+    assert pending.next_attempt_at > datetime.utcnow()
+    assert upload_queue.process_batch() == (0, 0) # Masih menunggu jeda retry
+
+    pending.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    assert upload_queue.process_batch() == (0, 1)
+    assert PendingUpload.query.one().status == 'failed'
+    assert Attendance.query.get(attendance_id).face_image_status == 'failed'
+
+    assert upload_queue.retry_failed() == 1
+    assert Attendance.query.get(attendance_id).face_image_status == 'pending'
+    monkeypatch.setattr(upload_queue, 'get_storage', lambda: storage)
+    assert upload_queue.process_batch() == (1, 0)
+    assert Attendance.query.get(attendance_id).face_image_status is None
+
+def test_lease_blocks_other_workers_until_it_expires(db, storage):
+    from models import PendingUpload
+    add_attendance(db, 'a')
+    claimed = upload_queue.claim_batch()
+    assert [s3_key for _, s3_key, *_ in claimed] == ['attendance_captures/a.jpg']
+    assert upload_queue.claim_batch() == []
+
+    # Worker pertama mati: setelah lease habis unggahan diambil ulang dan diselesaikan
+    PendingUpload.query.update({'leased_until': datetime.utcnow() - timedelta(seconds=1)})
+    db.session.commit()
+    assert upload_queue.process_batch() == (1, 0)
+    assert PendingUpload.query.count() == 0
+
+def test_stale_lease_result_is_ignored(db, storage, monkeypatch):
+    from models import PendingUpload
+    add_attendance(db, 'a')
+    real_claim = upload_queue.claim_batch
+    def claim_then_lose_lease(batch_size):
+        claimed = real_claim(batch_size)
+        # Lease dianggap habis dan baris sudah diklaim worker lain dengan lease baru
+        PendingUpload.query.update({'leased_until': datetime.utcnow() + timedelta(hours=1)})
+        db.session.commit()
+        return claimed
+    monkeypatch.setattr(upload_queue, 'claim_batch', claim_then_lose_lease)
+    upload_queue.process_batch()
+    assert PendingUpload.query.one().status == 'in_progress'
+
+def test_worker_start_starts_upload_worker(monkeypatch):
+    import app
+    started = []
+    monkeypatch.setattr(app, 'WORKER_WARM_UP', False)
+    monkeypatch.setattr(upload_queue, 'UPLOAD_QUEUE_WORKER', True)
+    monkeypatch.setattr(upload_queue.upload_worker, 'start', lambda: started.append(True))
+    app.start_worker_services()
+    assert started == [True]
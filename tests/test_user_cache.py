@@ -0,0 +1,59 @@
+import pytest
+
+from user_cache import UserCache, user_cache
+
+@pytest.fixture
+def user(db):
+    from models import User
+    user = User(username='2201', password_hash='-', is_admin=False)
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+def test_second_lookup_is_served_from_cache(user):
+    cache = UserCache(ttl=60)
+    assert cache.get(user.id).username == '2201'
+    assert cache.get(user.id).username == '2201'
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.get(999) is None
+
+def test_ttl_zero_disables_cache(user):
+    cache = UserCache(ttl=0)
+    cache.get(user.id)
+    cache.get(user.id)
+    assert cache.hits == 0
+
+def test_lru_keeps_max_entries(db):
+    from models import User
+    users = [User(username=f"u{i}", password_hash='-') for i in range(3)]
+    db.session.add_all(users)
+    db.session.commit()
+    cache = UserCache(ttl=60, max_entries=2)
+    for cached_user in users:
+        cache.get(cached_user.id)
+    cache.get(users[0].id) # Entri tertua sudah dibuang
+    assert cache.hits == 0
+
+def test_update_invalidates_after_commit(db, user):
+    assert user_cache.get(user.id).is_admin is False
+    user.is_admin = True
+    db.session.flush()
+    assert user_cache.get(user.id).is_admin is False # Belum di-commit
+    db.session.commit()
+    assert user_cache.get(user.id).is_admin is True
+
+def test_rollback_keeps_cached_entry(db, user):
+    user_cache.get(user.id)
+    user.username = 'ganti'
+    db.session.flush()
+    db.session.rollback()
+    hits = user_cache.hits
+    assert user_cache.get(user.id).username == '2201'
+    assert user_cache.hits == hits + 1
+
+def test_delete_invalidates(db, user):
+    user_id = user.id
+    user_cache.get(user_id)
+    db.session.delete(user)
+    db.session.commit()
+    assert user_cache.get(user_id) is None
@@ -0,0 +1,102 @@
+import os
+import threading
+from time import monotonic
+import numpy as np
+
+from storage import get_storage, StorageError
+
+# --- Pengaturan Thumbnail dan URL Bertanda Tangan (bisa diubah lewat environment variable) ---
+# THUMBNAIL_MAX_WIDTH: lebar maksimum thumbnail (px); halaman menampilkannya di width="100"
+# THUMBNAIL_FORMAT: 'webp' atau 'jpg'
+# THUMBNAIL_QUALITY: kualitas kompresi 0-100
+# PRESIGNED_URL_TTL: masa berlaku presigned URL (detik)
+THUMBNAIL_MAX_WIDTH = int(os.environ.get('THUMBNAIL_MAX_WIDTH', '200'))
+THUMBNAIL_FORMAT = os.environ.get('THUMBNAIL_FORMAT', 'webp')
+THUMBNAIL_QUALITY = int(os.environ.get('THUMBNAIL_QUALITY', '70'))
+PRESIGNED_URL_TTL = int(os.environ.get('PRESIGNED_URL_TTL', '3600'))
+
+THUMBNAIL_PREFIX = 'thumbnails/'
+THUMBNAIL_CONTENT_TYPES = {'webp': 'image/webp', 'jpg': 'image/jpeg'}
+
+def thumbnail_key(s3_object_key):
+    """
+    Key thumbnail untuk sebuah objek: 'attendance_captures/5/ab.jpg' -> 'thumbnails/attendance_captures/5/ab.webp'.
+    """
+    return f"{THUMBNAIL_PREFIX}{os.path.splitext(s3_object_key)[0]}.{THUMBNAIL_FORMAT}"
+
+def make_thumbnail(image_bytes, max_width=THUMBNAIL_MAX_WIDTH):
+    """
+    Membuat thumbnail kecil dari bytes gambar. Mengembalikan bytes WebP/JPEG, atau None jika gambar tidak valid.
+    """
+    import cv2 # Di-import saat dipakai agar proses yang hanya menyajikan URL tidak memuat OpenCV
+    image = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+    height, width = image.shape[:2]
+    if width > max_width:
+        image = cv2.resize(image, (max_width, round(height * max_width / width)), interpolation=cv2.INTER_AREA)
+    quality_flag = cv2.IMWRITE_WEBP_QUALITY if THUMBNAIL_FORMAT == 'webp' else cv2.IMWRITE_JPEG_QUALITY
+    ok, encoded = cv2.imencode(f".{THUMBNAIL_FORMAT}", image, [quality_flag, THUMBNAIL_QUALITY])
+    return encoded.tobytes() if ok else None
+
+def create_thumbnail(s3_object_key, image_bytes, storage=None):
+    """
+    Membuat dan mengunggah thumbnail untuk objek gambar. Mengembalikan True jika berhasil.
+    """
+    thumbnail = make_thumbnail(image_bytes)
+    if thumbnail is None:
+        print(f"Thumbnail tidak dibuat untuk '{s3_object_key}': gambar tidak valid.")
+        return False
+    try:
+        (storage or get_storage()).put_bytes(thumbnail_key(s3_object_key), thumbnail,
+                                             THUMBNAIL_CONTENT_TYPES[THUMBNAIL_FORMAT])
+        return True
+    except StorageError as e:
+        print(f"Gagal mengunggah thumbnail '{s3_object_key}': {e}")
+        return False
+
+
+# --- Cache presigned URL ---
+# Menandatangani ulang URL di setiap render membuat URL selalu berbeda sehingga browser tidak
+# pernah memakai cache-nya. URL yang sama dipakai ulang sampai separuh masa berlakunya habis.
+class PresignedUrlCache:
+    def __init__(self, ttl=PRESIGNED_URL_TTL, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._urls = {} # key -> (url, waktu_kedaluwarsa_monotonic)
+        self._lock = threading.Lock()
+
+    def get(self, s3_object_key):
+        now = monotonic()
+        with self._lock:
+            cached = self._urls.get(s3_object_key)
+        if cached and cached[1] - now > self.ttl / 2:
+            return cached[0]
+
+        url = get_storage().presigned_url(s3_object_key, self.ttl)
+        with self._lock:
+            if len(self._urls) >= self.max_entries:
+                self._urls = {k: v for k, v in self._urls.items() if v[1] - now > self.ttl / 2}
+                if len(self._urls) >= self.max_entries:
+                    self._urls.clear()
+            self._urls[s3_object_key] = (url, now + self.ttl)
+        return url
+
+presigned_urls = PresignedUrlCache()
+
+def image_url(s3_url):
+    """
+    Presigned URL (dari cache) untuk gambar ukuran penuh yang disimpan sebagai URL S3 di database.
+    """
+    key = get_storage().key_from_url(s3_url) if s3_url else None
+    return presigned_urls.get(key) if key is not None else s3_url
+
+def thumbnail_url(s3_url):
+    """
+    Presigned URL (dari cache) untuk thumbnail gambar yang disimpan sebagai URL S3 di database.
+    URL ini tidak memeriksa apakah thumbnail sudah ada (foto lama sebelum backfill_thumbnails.py);
+    tag <img> di template jatuh ke gambar penuh lewat onerror. Foto yang masih di antrean unggah
+    (face_image_status 'pending') tidak diberi tag <img> sama sekali.
+    """
+    key = get_storage().key_from_url(s3_url) if s3_url else None
+    return presigned_urls.get(thumbnail_key(key)) if key is not None else s3_url
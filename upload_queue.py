@@ -0,0 +1,254 @@
+import os
+import random
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import and_, event, func, or_
+
+from app import db
+from models import Attendance, FaceData, PendingUpload
+from storage import get_storage, StorageError
+from thumbnails import create_thumbnail, THUMBNAIL_PREFIX
+from metrics import register_gauges
+
+# --- Pengaturan Antrean Unggah (bisa diubah lewat environment variable) ---
+# UPLOAD_QUEUE_WORKER: '1' = jalankan worker unggah di thread latar proses web, '0' = hanya lewat CLI
+# UPLOAD_QUEUE_BATCH: jumlah unggahan yang diambil worker sekaligus
+# UPLOAD_QUEUE_MAX_ATTEMPTS: percobaan maksimum sebelum unggahan ditandai 'failed'
+# UPLOAD_QUEUE_BACKOFF_BASE / UPLOAD_QUEUE_BACKOFF_MAX: jeda retry eksponensial (detik)
+# UPLOAD_QUEUE_POLL_INTERVAL: jeda (detik) worker memeriksa antrean saat tidak dibangunkan
+# UPLOAD_QUEUE_LEASE_SECONDS: lama (detik) unggahan yang sedang diproses dikunci untuk satu worker;
+#   jika worker mati sebelum selesai, unggahan diambil ulang setelah lease ini habis
+UPLOAD_QUEUE_WORKER = os.environ.get('UPLOAD_QUEUE_WORKER', '1') == '1'
+UPLOAD_QUEUE_BATCH = int(os.environ.get('UPLOAD_QUEUE_BATCH', '20'))
+UPLOAD_QUEUE_MAX_ATTEMPTS = int(os.environ.get('UPLOAD_QUEUE_MAX_ATTEMPTS', '8'))
+UPLOAD_QUEUE_BACKOFF_BASE = float(os.environ.get('UPLOAD_QUEUE_BACKOFF_BASE', '2'))
+UPLOAD_QUEUE_BACKOFF_MAX = float(os.environ.get('UPLOAD_QUEUE_BACKOFF_MAX', '300'))
+UPLOAD_QUEUE_POLL_INTERVAL = float(os.environ.get('UPLOAD_QUEUE_POLL_INTERVAL', '5'))
+UPLOAD_QUEUE_LEASE_SECONDS = float(os.environ.get('UPLOAD_QUEUE_LEASE_SECONDS', '300'))
+
+def enqueue_upload(s3_object_key, data, content_type='image/jpeg'):
+    """
+    Menambahkan unggahan ke antrean di sesi database yang sedang berjalan (belum di-commit),
+    sehingga baris antrean tersimpan dalam transaksi yang sama dengan baris FaceData/Attendance.
+    Mengembalikan URL akhir objek; simpan bersama face_image_status='pending' karena objeknya
+    baru ada setelah process_batch mengunggahnya (status lalu dikosongkan, atau 'failed').
+    """
+    db.session.add(PendingUpload(s3_key=s3_object_key, content_type=content_type, data=bytes(data)))
+    db.session.info['upload_queue_wake'] = True
+    return get_storage().url_for(s3_object_key)
+
+def backoff_delay(attempts):
+    """
+    Jeda retry eksponensial dengan jitter agar worker tidak menyerbu S3 bersamaan setelah gangguan.
+    """
+    delay = min(UPLOAD_QUEUE_BACKOFF_BASE * (2 ** (attempts - 1)), UPLOAD_QUEUE_BACKOFF_MAX)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def set_image_status(s3_keys, status, storage):
+    """
+    Memperbarui face_image_status baris Attendance/FaceData yang fotonya berasal dari s3_keys.
+    Hanya baris yang masih berstatus (bukan foto lama) yang disentuh, lewat index face_image_status.
+    """
+    urls = [storage.url_for(s3_key) for s3_key in s3_keys]
+    if not urls:
+        return
+    for model in (Attendance, FaceData):
+        model.query.filter(model.face_image_status.isnot(None), model.face_image_s3_url.in_(urls)) \
+            .update({'face_image_status': status}, synchronize_session=False)
+
+def claim_batch(batch_size=UPLOAD_QUEUE_BATCH):
+    """
+    Transaksi pendek pertama: mengambil unggahan yang jatuh tempo (atau yang lease-nya habis karena
+    worker sebelumnya mati), menandainya 'in_progress' dengan lease, lalu commit.
+    Mengembalikan list (id, s3_key, content_type, data, attempts, leased_until) tanpa lock yang tersisa.
+    """
+    now = datetime.utcnow()
+    # Dibulatkan ke detik agar perbandingan lease tetap cocok di kolom DATETIME tanpa mikrodetik
+    leased_until = now.replace(microsecond=0) + timedelta(seconds=UPLOAD_QUEUE_LEASE_SECONDS)
+    # SKIP LOCKED: beberapa proses web/worker boleh menguras antrean tanpa mengambil baris yang sama
+    uploads = (PendingUpload.query
+               .filter(or_(and_(PendingUpload.status == 'pending', PendingUpload.next_attempt_at <= now),
+                           and_(PendingUpload.status == 'in_progress', PendingUpload.leased_until < now)))
+               .order_by(PendingUpload.id)
+               .limit(batch_size)
+               .with_for_update(skip_locked=True)
+               .all())
+    claimed = []
+    for pending in uploads:
+        pending.status = 'in_progress'
+        pending.leased_until = leased_until
+        claimed.append((pending.id, pending.s3_key, pending.content_type, pending.data,
+                        pending.attempts, leased_until))
+    db.session.commit()
+    return claimed
+
+def process_batch(batch_size=UPLOAD_QUEUE_BATCH):
+    """
+    Mengklaim satu batch unggahan (claim_batch), mengunggahnya paralel DI LUAR transaksi database,
+    lalu dalam transaksi pendek kedua menghapus yang berhasil dan menjadwalkan ulang yang gagal,
+    sekaligus memperbarui face_image_status baris pemilik fotonya.
+    Mengembalikan (jumlah_berhasil, jumlah_gagal). Harus dipanggil di dalam app context.
+    """
+    claimed = claim_batch(batch_size)
+    if not claimed:
+        return 0, 0
+
+    storage = get_storage()
+    def upload(item):
+        _, s3_key, content_type, data, _, _ = item
+        try:
+            storage.put_bytes(s3_key, data, content_type)
+        except StorageError as e:
+            return str(e)
+        except Exception as e:
+            return f"Error tak terduga: {e}"
+        # Thumbnail dibuat di sini (bukan di request) dari bytes yang sama; jika gagal,
+        # backfill_thumbnails.py akan melengkapinya nanti
+        if content_type.startswith('image/') and not s3_key.startswith(THUMBNAIL_PREFIX):
+            try:
+                create_thumbnail(s3_key, data, storage)
+            except Exception as e:
+                print(f"Error saat membuat thumbnail '{s3_key}': {e}")
+        return None
+
+    errors = list(storage.executor().map(upload, claimed))
+
+    # Hanya baris yang masih memegang lease kita yang diubah; jika lease sudah habis dan baris
+    # diklaim worker lain, hasilnya diserahkan ke worker tersebut
+    now = datetime.utcnow()
+    uploaded = failed = 0
+    uploaded_keys, failed_keys = [], []
+    for (upload_id, s3_key, _, _, attempts, leased_until), error in zip(claimed, errors):
+        ours = PendingUpload.query.filter_by(id=upload_id, status='in_progress', leased_until=leased_until)
+        if error is None:
+            ours.delete(synchronize_session=False)
+            uploaded_keys.append(s3_key) # Objek sudah ada walaupun lease-nya sudah diambil alih
+            uploaded += 1
+            continue
+        attempts += 1
+        values = {'attempts': attempts, 'last_error': error[:500], 'leased_until': None}
+        if attempts >= UPLOAD_QUEUE_MAX_ATTEMPTS:
+            values['status'] = 'failed'
+            print(f"Unggahan {s3_key} gagal permanen setelah {attempts} percobaan: {error}")
+        else:
+            values['status'] = 'pending'
+            values['next_attempt_at'] = now + timedelta(seconds=backoff_delay(attempts))
+        if ours.update(values, synchronize_session=False) and values['status'] == 'failed':
+            failed_keys.append(s3_key)
+        failed += 1
+    set_image_status(uploaded_keys, None, storage)
+    set_image_status(failed_keys, 'failed', storage)
+    db.session.commit()
+    return uploaded, failed
+
+
+# --- Worker latar di proses web ---
+class UploadWorker:
+    def __init__(self, poll_interval=UPLOAD_QUEUE_POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self.uploaded = 0 # Total unggahan berhasil sejak proses dimulai
+        self.retries = 0 # Total percobaan gagal yang dijadwalkan ulang atau ditandai 'failed'
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='upload-queue', daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        from app import app
+        with app.app_context():
+            while True:
+                try:
+                    uploaded, failed = process_batch()
+                    self.uploaded += uploaded
+                    self.retries += failed
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Error di worker antrean unggah: {e}")
+                    uploaded = 0
+                finally:
+                    db.session.remove()
+                # Batch penuh berarti mungkin masih ada antrean; langsung lanjut tanpa menunggu
+                if uploaded < UPLOAD_QUEUE_BATCH:
+                    self._wake.wait(self.poll_interval)
+                    self._wake.clear()
+
+upload_worker = UploadWorker()
+
+@event.listens_for(db.session, 'after_commit')
+def _wake_upload_worker(session):
+    if session.info.pop('upload_queue_wake', False) and UPLOAD_QUEUE_WORKER:
+        upload_worker.start()
+        upload_worker.wake()
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_upload_wake(session):
+    session.info.pop('upload_queue_wake', None)
+
+
+def upload_queue_stats():
+    """
+    Ringkasan antrean untuk pemantauan: kedalaman, lag (umur unggahan tertua), dan jumlah gagal.
+    Unggahan 'in_progress' (sedang dikirim worker) masih dihitung dalam kedalaman antrean.
+    """
+    pending, oldest = db.session.query(func.count(PendingUpload.id), func.min(PendingUpload.created_at)) \
+        .filter(PendingUpload.status.in_(('pending', 'in_progress'))).one()
+    failed = PendingUpload.query.filter_by(status='failed').count()
+    return {
+        'depth': pending,
+        'lag_seconds': (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0,
+        'failed': failed,
+        'uploaded_by_this_process': upload_worker.uploaded,
+        'retries_by_this_process': upload_worker.retries,
+    }
+
+# Ketiga gauge dibaca dari SATU upload_queue_stats() per scrape; nilainya dari database,
+# sama untuk semua worker, jadi tidak dijumlahkan antar proses
+register_gauges(upload_queue_stats, {
+    'hadirku_upload_queue_depth': ('Unggahan yang menunggu di antrean write-behind.', 'depth'),
+    'hadirku_upload_queue_lag_seconds': ('Umur unggahan tertua yang belum terkirim.', 'lag_seconds'),
+    'hadirku_upload_queue_failed': ('Unggahan yang berhenti dicoba (status failed).', 'failed'),
+}, aggregate=None)
+
+def retry_failed():
+    """
+    Mengembalikan semua unggahan 'failed' ke antrean (misalnya setelah gangguan S3 selesai).
+    """
+    count = PendingUpload.query.filter_by(status='failed').update(
+        {'status': 'pending', 'attempts': 0, 'next_attempt_at': datetime.utcnow()})
+    for model in (Attendance, FaceData):
+        model.query.filter_by(face_image_status='failed').update({'face_image_status': 'pending'})
+    db.session.commit()
+    return count
+
+def drain_upload_queue():
+    """
+    Script command-line: menguras antrean sampai kosong (atau hanya tersisa unggahan yang menunggu jeda retry).
+    """
+    from app import app
+    with app.app_context():
+        total_uploaded = total_failed = 0
+        while True:
+            uploaded, failed = process_batch()
+            total_uploaded += uploaded
+            total_failed += failed
+            if uploaded + failed == 0:
+                break
+        print(f"{total_uploaded} unggahan berhasil, {total_failed} percobaan gagal.")
+        print(upload_queue_stats())
+
+if __name__ == '__main__':
+    import sys
+    if '--retry-failed' in sys.argv:
+        from app import app
+        with app.app_context():
+            print(f"{retry_failed()} unggahan gagal dikembalikan ke antrean.")
+    drain_upload_queue()
@@ -0,0 +1,109 @@
+import os
+import threading
+from collections import OrderedDict
+from time import monotonic
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from app import db
+from models import User
+from metrics import Counter
+
+# --- Cache Pengguna untuk Flask-Login (bisa diubah lewat environment variable) ---
+# user_loader dipanggil di SETIAP request yang login. Tanpa cache, setiap presensi memakai satu
+# query ke tabel user dari connection pool yang sama dengan penulisan presensi. Cache menyimpan
+# data ringkas pengguna (id, username, is_admin), bukan objek ORM, per proses.
+# Perubahan/penghapusan User (misalnya lewat UserAdminView) langsung menghapus entrinya setelah
+# commit di proses yang sama; proses lain memakai data lama paling lama USER_CACHE_TTL detik.
+# USER_CACHE_TTL: masa berlaku entri (detik, 0 = cache nonaktif)
+# USER_CACHE_MAX_ENTRIES: jumlah pengguna maksimum di cache (LRU)
+USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', '60'))
+USER_CACHE_MAX_ENTRIES = int(os.environ.get('USER_CACHE_MAX_ENTRIES', '10000'))
+
+class UserPrincipal(UserMixin):
+    """
+    Pengguna yang sedang login sebagai current_user: hanya kolom yang dibutuhkan request.
+    """
+    def __init__(self, id, username, is_admin):
+        self.id = id
+        self.username = username
+        self.is_admin = bool(is_admin)
+
+user_cache_lookups = Counter('hadirku_user_cache_lookups_total', 'user_loader yang dilayani cache (hit) atau query ke database (miss).', 'result')
+
+class UserCache:
+    def __init__(self, ttl=USER_CACHE_TTL, max_entries=USER_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._users = OrderedDict() # user_id -> (UserPrincipal, waktu_kedaluwarsa_monotonic)
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """
+        UserPrincipal untuk user_id dari cache, atau dari satu query kolom ringkas jika belum ada/kedaluwarsa.
+        Mengembalikan None jika pengguna tidak ditemukan (tidak di-cache).
+        """
+        now = monotonic()
+        with self._lock:
+            cached = self._users.get(user_id)
+            if cached and cached[1] > now:
+                self._users.move_to_end(user_id)
+                self.hits += 1
+                user_cache_lookups.inc('hit')
+                return cached[0]
+            self.misses += 1
+        user_cache_lookups.inc('miss')
+
+        row = (db.session.query(User.id, User.username, User.is_admin)
+               .filter(User.id == user_id).first())
+        if row is None:
+            return None
+        principal = UserPrincipal(*row)
+        if self.ttl > 0:
+            with self._lock:
+                self._users[user_id] = (principal, now + self.ttl)
+                self._users.move_to_end(user_id)
+                while len(self._users) > self.max_entries:
+                    self._users.popitem(last=False)
+        return principal
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+user_cache = UserCache()
+
+def load_user(user_id):
+    """
+    Fungsi user_loader Flask-Login (lihat app.py).
+    """
+    try:
+        return user_cache.get(int(user_id))
+    except (TypeError, ValueError):
+        return None
+
+
+# --- Invalidasi saat baris User berubah ---
+# Entri baru dihapus setelah commit agar rollback tidak membuang entri yang masih benar
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _queue_user_change(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('user_cache_changed', set()).add(target.id)
+
+@event.listens_for(Session, 'after_commit')
+def _apply_user_changes(session):
+    for user_id in session.info.pop('user_cache_changed', ()):
+        user_cache.invalidate(user_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_user_changes(session):
+    session.info.pop('user_cache_changed', None)